@@ -1,4 +1,13 @@
 from .clone import clone_voice_node
-from .llm import intro_bot, F1RacePredictor, HFEmbeddings
+from .llm import (
+    intro_bot, F1RacePredictor, HFEmbeddings, BosonChatModel,
+    commentary_llm, load_vector_store, load_driver_names,
+)
+from .context import DriverContextCache
+from .tts_cache import TTSCache
 
-__all__ = ["clone_voice_node", "intro_bot", "F1RacePredictor", "HFEmbeddings"]
\ No newline at end of file
+__all__ = [
+    "clone_voice_node", "intro_bot", "F1RacePredictor", "HFEmbeddings", "BosonChatModel",
+    "commentary_llm", "load_vector_store", "load_driver_names", "DriverContextCache",
+    "TTSCache",
+]
@@ -1,9 +1,17 @@
 import os
 import base64
 import requests
+from functools import lru_cache
 from dotenv import load_dotenv
-import json
+import io
+import time
 import wave
+import hashlib
+
+from .sse import SSEAudioDecoder
+from .tts_cache import TTSCache
+from ..scheduling import Cancelled
+from ..tracing import tracer
 
 load_dotenv()
 BOSON_API_KEY = os.getenv("BOSON_API_KEY")
@@ -17,13 +25,26 @@ reference_transcript = (
     "Stroll is on the lead taking a turn one ahead of his teammate."
 )
 
+TTS_MODEL_NAME = "higgs-audio-generation-Hackathon"
+# Sampling parameters of every synthesis; part of the TTS cache key.
+TTS_PARAMS = {"model": TTS_MODEL_NAME, "max_completion_tokens": 4096, "temperature": 0.2, "top_p": 0.95, "top_k": 50}
+
+
+@lru_cache(maxsize=8)
 def b64_encode(path: str) -> str:
     """Encode an audio file to base64."""
     with open(path, "rb") as f:
         return base64.b64encode(f.read()).decode("utf-8")
 
 
-def clone_voice_node(state):
+@lru_cache(maxsize=8)
+def voice_id(path: str = reference_path, transcript: str = reference_transcript) -> str:
+    """Identity of the cloned voice (reference audio + transcript), for cache keys."""
+    return hashlib.sha256(b64_encode(path).encode("ascii") + transcript.encode("utf-8")).hexdigest()
+
+
+def clone_voice_node(state, session: requests.Session | None = None, base_url: str | None = None,
+                     cache: TTSCache | None = None, cancel=None):
     """
     LangGraph node for Boson AI voice cloning.
     Expects the state to contain:
@@ -32,9 +53,23 @@ def clone_voice_node(state):
       - 'commentator_response': the new text to generate in the cloned voice
     Returns:
       - dict with 'output_audio_path'
+    Pass a shared `session` (e.g. via functools.partial) to reuse pooled connections,
+    and `base_url` to target another OpenAI-compatible endpoint than BASE_URL.
+    With a `cache` (see tts_cache.py), repeated lines are served from disk without a request.
+    Setting the `cancel` event (see scheduling.PriorityStage) closes the stream early;
+    the partial file is removed and Cancelled is raised.
     """
+    base_url = base_url or BASE_URL
     commentator_response = state["commentator_response"][-1]
     output_dir = state["output_dir"]
+    key = None
+    if cache is not None:
+        key = cache.key(commentator_response, voice_id(), TTS_PARAMS)
+        with tracer.span("tts.cache_lookup"):
+            hit = cache.write_wav(key, output_dir)
+        if hit:
+            print(f"♻️  Cached voice line saved to {output_dir}")
+            return state
     stream = True if "stream" not in state else state["stream"]
     messages = [
         {"role": "system", "content": "You are an AI assistant designed to convert chinese text into speech."},
@@ -55,15 +90,19 @@ def clone_voice_node(state):
     ]
     print("🎙️  Starting generating voice cloning...")
     payload = {
-        "model": "higgs-audio-generation-Hackathon",
+        "model": TTS_PARAMS["model"],
         "messages": messages,
         "modalities": ["text", "audio"],
-        "max_completion_tokens": 4096,
-        "temperature": 0.2,
-        "top_p": 0.95,
+        "max_completion_tokens": TTS_PARAMS["max_completion_tokens"],
+        "temperature": TTS_PARAMS["temperature"],
+        "top_p": TTS_PARAMS["top_p"],
         "stream": stream,
         "stop": ["<|eot_id|>", "<|end_of_text|>", "<|audio_eos|>"],
-        "extra_body": {"top_k": 50},
+        "extra_body": {"top_k": TTS_PARAMS["top_k"]},
+    }
+    headers = {
+        "Authorization": f"Bearer {BOSON_API_KEY}",
+        "Content-Type": "application/json",
     }
     if stream:
     # Open WAV file for streaming write
@@ -72,44 +111,56 @@ def clone_voice_node(state):
         wf.setsampwidth(2)        # 16-bit PCM
         wf.setframerate(24000)    # 24 kHz
 
-        headers = {
-            "Authorization": f"Bearer {BOSON_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
+        entry = cache.writer(key) if cache is not None else None
+        if entry is None:
+            sink = wf.writeframes
+        else:
+            def sink(pcm):
+                wf.writeframes(pcm)
+                entry.write(pcm)
+        decoder = SSEAudioDecoder(sink)
         try:
-            with requests.post(
-                f"{BASE_URL}/chat/completions",
-                headers=headers,
-                json=payload,
-                stream=True,
-            ) as resp:
-                resp.raise_for_status()
+            with tracer.span("tts.total"):
+                start = time.perf_counter()
+                with (session or requests).post(
+                    f"{base_url}/chat/completions",
+                    headers=headers,
+                    json=payload,
+                    stream=True,
+                ) as resp:
+                    resp.raise_for_status()
 
-                for line in resp.iter_lines(decode_unicode=True):
-                    if not line or not line.startswith("data: "):
-                        continue
-                    data_str = line[len("data: "):].strip()
-
-                    if data_str == "[DONE]":
-                        break
-                    try:
-                        chunk = json.loads(data_str)
-                        delta = chunk["choices"][0].get("delta", {})
-                        audio = delta.get("audio")
-                        if audio and "data" in audio:
-                            wf.writeframes(base64.b64decode(audio["data"]))
-                    except Exception as e:
-                        continue
+                    # Raw bytes as they arrive; the decoder does its own line framing.
+                    first = True
+                    for raw in resp.iter_content(chunk_size=None):
+                        if first:
+                            tracer.observe("tts.ttfb", time.perf_counter() - start)
+                            first = False
+                        if not decoder.feed(raw) or (cancel is not None and cancel.is_set()):
+                            break
+                decoder.close()
+        except BaseException:
+            if entry is not None:
+                entry.abort()
+            raise
         finally:
             wf.close()
+        if entry is not None:
+            # A truncated stream would poison the cache; only keep clean ones.
+            entry.commit() if decoder.done and not decoder.errors else entry.abort()
+        if cancel is not None and cancel.is_set() and not decoder.done:
+            os.remove(output_dir)
+            raise Cancelled(output_dir)
+        if decoder.errors:
+            print(f"⚠️  Skipped {decoder.errors} malformed audio chunks out of {decoder.events} events")
     else:
         # Non-stream, don't forget to turn off stream=True.
-        response = requests.post(
-            f"{BASE_URL}/chat/completions",
-            headers=headers,
-            json=payload,
-        )
+        with tracer.span("tts.total"):
+            response = (session or requests).post(
+                f"{base_url}/chat/completions",
+                headers=headers,
+                json=payload,
+            )
         response.raise_for_status()
         data = response.json()
 
@@ -117,8 +168,12 @@ def clone_voice_node(state):
         audio_b64 = data["choices"][0]["message"]["audio"]["data"]
 
         # Save as WAV file
+        audio = base64.b64decode(audio_b64)
         with open(output_dir, "wb") as f:
-            f.write(base64.b64decode(audio_b64))
+            f.write(audio)
+        if cache is not None:
+            with wave.open(io.BytesIO(audio), "rb") as wf:
+                cache.put(key, wf.readframes(wf.getnframes()))
 
     print(f"✅ Voice cloned and saved to {output_dir}")
     return state
\ No newline at end of file
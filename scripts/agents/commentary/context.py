@@ -0,0 +1,167 @@
+"""
+Per-driver and per-driver-pair background for in-race commentary.
+
+Built once before the race from the RAG vector store: every query is embedded
+in one batch and searched by vector, and the top-k snippets plus a short
+summary are stored under plain keys. During the race `F1RacePredictor` looks
+up the drivers in a bucket with dict lookups, with no embedding call and no search.
+
+    python -m scripts.agents.commentary.context            # build the cache
+    python -m scripts.agents.commentary.context --pairs 0  # drivers only
+"""
+import os
+import re
+import json
+import argparse
+from itertools import combinations
+from concurrent.futures import ThreadPoolExecutor
+
+from ..tracing import tracer
+
+CONTEXT_CACHE_PATH = "data/commentary/context_cache.json"
+DRIVER_QUERY = "{name} ({team}) career, recent form, results and milestones"
+PAIR_QUERY = "{a} and {b} rivalry, wheel-to-wheel battles and head-to-head record"
+SNIPPET_CHARS = 400
+SUMMARY_CHARS = 240
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def pair_key(a: int, b: int) -> str:
+    return f"{min(a, b)}-{max(a, b)}"
+
+
+def extractive_summary(snippets: list[str], max_chars: int = SUMMARY_CHARS) -> str:
+    """Leading sentence of each snippet, in rank order, up to `max_chars`."""
+    out, used = [], 0
+    for snippet in snippets:
+        sentence = _SENTENCE_END.split(snippet.strip(), maxsplit=1)[0]
+        if not sentence or sentence in out:
+            continue
+        if used + len(sentence) > max_chars:
+            if not out:
+                out.append(sentence[:max_chars].rstrip() + "…")
+            break
+        out.append(sentence)
+        used += len(sentence) + 1
+    return " ".join(out)
+
+
+class DriverContextCache:
+    """
+    {driver_number: entry} and {"a-b": entry} maps, where an entry is
+    {"name": str, "summary": str, "snippets": [str, ...]}.
+    """
+
+    def __init__(self, drivers: dict | None = None, pairs: dict | None = None):
+        self.drivers = drivers or {}
+        self.pairs = pairs or {}
+
+    # --------------------- Build ---------------------
+    @classmethod
+    def build(cls, vector_store, drivers: list[dict], pairs: list[tuple[int, int]] | None = None,
+              k: int = 3, summarise=None, workers: int = 8) -> "DriverContextCache":
+        """
+        drivers: OpenF1 driver dicts
+        pairs: driver-number pairs to precompute (default: every pair)
+        summarise: optional fn(name, snippets) -> str (e.g. an LLM call); defaults to
+                   an extractive summary so the build needs no model calls
+        """
+        by_number = {int(d["driver_number"]): d for d in drivers}
+        if pairs is None:
+            pairs = list(combinations(sorted(by_number), 2))
+
+        keys, labels, queries = [], [], []
+        for num, d in by_number.items():
+            keys.append(("driver", num))
+            labels.append(d["full_name"])
+            queries.append(DRIVER_QUERY.format(name=d["full_name"], team=d.get("team_name", "")))
+        for a, b in pairs:
+            keys.append(("pair", pair_key(a, b)))
+            labels.append(f"{by_number[a]['full_name']} vs {by_number[b]['full_name']}")
+            queries.append(PAIR_QUERY.format(a=by_number[a]["full_name"], b=by_number[b]["full_name"]))
+
+        with tracer.span("context.embed"):
+            vectors = vector_store.embedding.embed_documents(queries)
+        with tracer.span("context.search"):
+            hits = [[doc.page_content[:SNIPPET_CHARS] for doc in vector_store.similarity_search_by_vector(v, k=k)]
+                    for v in vectors]
+
+        summarise = summarise or (lambda _label, snippets: extractive_summary(snippets))
+        with tracer.span("context.summarise"), ThreadPoolExecutor(max_workers=workers) as pool:
+            summaries = list(pool.map(summarise, labels, hits))
+
+        cache = cls()
+        for (kind, key), label, snippets, summary in zip(keys, labels, hits, summaries):
+            entry = {"name": label, "summary": summary, "snippets": snippets}
+            if kind == "driver":
+                cache.drivers[key] = entry
+            else:
+                cache.pairs[key] = entry
+        return cache
+
+    # --------------------- Lookup ---------------------
+    def driver(self, number: int) -> dict | None:
+        return self.drivers.get(number)
+
+    def pair(self, a: int, b: int) -> dict | None:
+        return self.pairs.get(pair_key(a, b))
+
+    def background(self, drivers: list[int], pairs: list[tuple[int, int]] = (),
+                   max_drivers: int = 4, max_pairs: int = 2) -> list[str]:
+        """Summary lines for the drivers and pairs in a bucket, capped to keep prompts short."""
+        keys = list(dict.fromkeys(pair_key(a, b) for a, b in pairs))[:max_pairs]
+        entries = [self.pairs.get(key) for key in keys]
+        entries += [self.driver(num) for num in list(dict.fromkeys(drivers))[:max_drivers]]
+        return [f"{e['name']}: {e['summary']}" for e in entries if e and e["summary"]]
+
+    # --------------------- Persistence ---------------------
+    def save(self, path: str = CONTEXT_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"drivers": {str(n): e for n, e in self.drivers.items()}, "pairs": self.pairs},
+                      f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path: str = CONTEXT_CACHE_PATH) -> "DriverContextCache":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls({int(n): e for n, e in data["drivers"].items()}, data["pairs"])
+
+
+def bucket_drivers(events: list[dict]) -> tuple[list[int], list[tuple[int, int]]]:
+    """
+    Overtake pairs and driver numbers in one bucket of events, in order of appearance,
+    with drivers involved in overtakes listed first.
+    """
+    pairs, drivers, others = {}, {}, {}
+    for event in events:
+        if event.get("event_type") == "overtake":
+            a, b = event.get("overtaking_driver_number"), event.get("overtaken_driver_number")
+            if a is not None and b is not None:
+                pairs[(a, b)] = None
+                drivers[a] = drivers[b] = None
+        elif event.get("driver_number") is not None:
+            others[event["driver_number"]] = None
+    drivers.update(others)
+    return list(drivers), list(pairs)
+
+
+if __name__ == "__main__":
+    from .llm import load_vector_store, VECTOR_STORE_PATH, DRIVERS_PATH
+
+    ap = argparse.ArgumentParser(description="Precompute driver / driver-pair background from the vector store.")
+    ap.add_argument("--vector-store", default=VECTOR_STORE_PATH)
+    ap.add_argument("--drivers", default=DRIVERS_PATH)
+    ap.add_argument("--output", default=CONTEXT_CACHE_PATH)
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--pairs", type=int, default=1, help="1 = every driver pair, 0 = drivers only")
+    args = ap.parse_args()
+
+    with open(args.drivers, "r", encoding="utf-8") as f:
+        drivers = json.load(f)
+    cache = DriverContextCache.build(load_vector_store(args.vector_store), drivers,
+                                     pairs=None if args.pairs else [], k=args.k)
+    cache.save(args.output)
+    print(f"Saved {len(cache.drivers)} drivers and {len(cache.pairs)} pairs to {args.output}")
+    print(tracer.report())
@@ -12,6 +12,8 @@ from pathlib import Path
 from typing import List, TypedDict
 import pickle
 import openai
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
@@ -20,12 +22,21 @@ from langchain_core.vectorstores import InMemoryVectorStore
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import START, StateGraph
 
+from ..rag.hybrid import HybridRetriever
+from ..rag.quantized import QuantizedVectorStore
+from ..tracing import tracer
+
 load_dotenv(override=True)
 BOSON_API_KEY = os.getenv("BOSON_API_KEY")
 BOSON_BASE_URL = "https://hackathon.boson.ai/v1"
 BASE_URL = BOSON_BASE_URL
 LLM_MODEL = os.getenv("LLM_MODEL")
 
+# What rag/create_vector_store.py and preprocess/build.py write; the pickle is the older format.
+VECTOR_STORE_PATH = "data/commentary/vector_store_q"
+VECTOR_STORE_PICKLE = "data/commentary/vector_store.pkl"
+DRIVERS_PATH = "data/open_f1/drivers.json"
+
 # RAG knobs
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
@@ -73,9 +84,17 @@ class State(TypedDict):
     context: List[Document]
     answer: str
 
-def make_rag_app(vector_store: InMemoryVectorStore, llm: BosonChatModel):
+@lru_cache(maxsize=4)
+def hybrid_retriever(vector_store: InMemoryVectorStore, k: int = TOP_K) -> HybridRetriever:
+    """BM25 + dense retriever over the store's chunks, indexed once per store."""
+    return HybridRetriever.from_vector_store(vector_store, k=k)
+
+def make_rag_app(vector_store: InMemoryVectorStore, llm: BosonChatModel, retriever=None):
+    retriever = retriever or hybrid_retriever(vector_store)
+
     def retrieve(state: State):
-        retrieved = vector_store.similarity_search(state["question"], k=TOP_K)
+        with tracer.span("rag.retrieve"):
+            retrieved = retriever.invoke(state["question"])
         return {"context": retrieved}
 
     def generate(state: State):
@@ -87,7 +106,8 @@ def make_rag_app(vector_store: InMemoryVectorStore, llm: BosonChatModel):
             f"{doc.page_content}\n(Citation: {cite(doc)})" for doc in state["context"]
         )
         messages = PROMPT.format_messages(question=state["question"], context=ctx)
-        response = llm.invoke(messages)
+        with tracer.span("rag.generate"):
+            response = llm.invoke(messages)
         return {"answer": response.content}
 
     g = StateGraph(State)
@@ -107,34 +127,107 @@ class HFEmbeddings(Embeddings):
     def embed_query(self, text: str) -> List[float]:
         return self.model.encode([text], convert_to_numpy=True)[0].tolist()
 
-def intro_bot():
-    drivers_path = "data/open_f1/drivers.json"
-
-    # Save to disk
-    with open("data/commentary/vector_store.pkl", "rb") as f:
-        vector_store = pickle.load(f)
+def commentary_llm(temperature: float = 0.8, max_tokens: int | None = None) -> ChatOpenAI:
+    """ChatOpenAI client for commentary; share one instance to reuse its connection pool."""
+    return ChatOpenAI(
+        model=LLM_MODEL,
+        api_key=BOSON_API_KEY,
+        base_url=BASE_URL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
 
-    # Build RAG pipeline
-    llm = BosonChatModel(apikey=BOSON_API_KEY)
-    graph = make_rag_app(vector_store, llm)
+@lru_cache(maxsize=None)
+def load_vector_store(path: str = VECTOR_STORE_PATH) -> InMemoryVectorStore:
+    """
+    Load the store once per process; later calls share the same instance. A directory
+    is a QuantizedVectorStore (see rag/quantized.py), anything else the original pickle.
+    Without a built directory at the default path, the pickle is used if there is one.
+    """
+    if path == VECTOR_STORE_PATH and not os.path.exists(path) and os.path.exists(VECTOR_STORE_PICKLE):
+        path = VECTOR_STORE_PICKLE
+    if os.path.isdir(path):
+        return QuantizedVectorStore.load(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+@lru_cache(maxsize=None)
+def _driver_names(path: str) -> tuple:
+    with open(path, "r") as f:
+        return tuple(d['full_name'] for d in json.load(f))
+
+def load_driver_names(path: str = DRIVERS_PATH) -> List[str]:
+    return list(_driver_names(path))
+
+# One retrieval per topic, run in parallel; {race_name} and {drivers} are filled in.
+INTRO_QUERIES = {
+    "drivers": "Recent form, results and career milestones of {drivers}",
+    "teams": "Team and constructor performance, car upgrades and championship standings",
+    "circuit": "{race_name} circuit layout, history, past winners and notable moments",
+}
+GREETING = ("Welcome to the {race_name}. The cars are lined up on the grid "
+            "and we are only moments away from lights out.")
+
+def _retrieve(retriever, topic: str, query: str) -> List[Document]:
+    with tracer.span(f"rag.retrieve.{topic}"):
+        return retriever.invoke(query)
+
+def _speak(tts, text: str, path: str):
+    # Same state shape the commentary graph hands to its TTS node.
+    return tts({"commentator_response": [text], "output_dir": path})
+
+def intro_bot(meeting: dict | None = None, vector_store: InMemoryVectorStore | None = None,
+              drivers: List[str] | None = None, llm: ChatOpenAI | None = None,
+              tts=None, output_dir: str | None = None, retriever=None):
+    """
+    Generate the opening remarks as a small concurrent DAG:
+
+        greeting TTS ──────────────────────────────┐
+        retrieve drivers ─┐                        ├─> done
+        retrieve teams   ─┼─> remarks LLM ─> body TTS
+        retrieve circuit ─┘
+
+    The templated greeting is synthesised while retrieval and the LLM run, and the
+    retrieved passages go straight into the remarks prompt, so race start waits on
+    one LLM round trip. Audio is only produced when `output_dir` is given (written
+    there as intro_greeting.wav and intro_body.wav). Retrieval defaults to the
+    hybrid BM25 + dense retriever. Anything not passed in is loaded once per
+    process, so callers running several races share it.
+    """
+    if vector_store is None:
+        vector_store = load_vector_store()
+    if retriever is None:
+        retriever = hybrid_retriever(vector_store)
+    if drivers is None:
+        drivers = load_driver_names()
+    if llm is None:
+        llm = commentary_llm()
+    if tts is None and output_dir is not None:
+        from .clone import clone_voice_node
+        tts = clone_voice_node
+
+    race_name = meeting["meeting_name"].title() if meeting else "2024 Singapore Grand Prix"
+    greeting = GREETING.format(race_name=race_name)
+    with tracer.span("intro.total"), ThreadPoolExecutor(max_workers=len(INTRO_QUERIES) + 2) as pool:
+        speaking = []
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            speaking.append(pool.submit(_speak, tts, greeting, os.path.join(output_dir, "intro_greeting.wav")))
+        retrievals = [
+            pool.submit(_retrieve, retriever, topic, query.format(race_name=race_name, drivers=", ".join(drivers)))
+            for topic, query in INTRO_QUERIES.items()
+        ]
 
-    # Query
-    q = """You are delivering the opening remarks for the 2024 Singapore Grand Prix. 
-    Using the corpus, extract key insights on: top drivers, team performance, recent milestones, and notable Singapore circuit context. 
-    Summarize as a concise introduction."""
-    result = graph.invoke({"question": q})
-    historical_data = result['answer']
+        seen, passages = set(), []
+        for future in retrievals:
+            for doc in future.result():
+                if doc.page_content not in seen:
+                    seen.add(doc.page_content)
+                    passages.append(doc.page_content)
+        historical_data = "\n\n".join(passages)
 
-    drivers = []
-    with open(drivers_path, "r") as f:
-        drivers_data = json.load(f)
-    
-    for d in drivers_data:
-        drivers.append(d['full_name'])
-    
-
-    system_prompt = """
-        You are an expert Formula-1 race commentator providing predictive live commentary for the {self.meeting_name}.
+        system_prompt = f"""
+        You are an expert Formula-1 race commentator providing predictive live commentary for the {race_name}.
         Based on the driver participants, position and historical facts, provide a starting live commentary in about 
         50 to 100 words.
 
@@ -150,44 +243,41 @@ def intro_bot():
         - Do not return nothing.
         - Avoid punctuations other than ',' and '.'
         - Assume that this is the start of the commentary and will have follow up commentary after.
-    """
-    human_prompt = f"""
+        - The broadcast has already opened with: "{greeting}" Continue from it without welcoming again.
+        - Use only the historical data given, ignore anything before August 2024 and do not cite sources.
+        """
+        human_prompt = f"""
         Driver participants:
         {drivers}
 
         Historical data:
         {historical_data}
-    """
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=human_prompt),
-    ]
-    llm = ChatOpenAI(
-        model=LLM_MODEL,
-        api_key=BOSON_API_KEY,
-        base_url=BASE_URL,
-        temperature=0.8
-    )
-    response = llm.invoke(messages)
-    # print(response)
+        """
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=human_prompt),
+        ]
+        with tracer.span("llm.intro"):
+            response = llm.invoke(messages)
+
+        if output_dir is not None:
+            speaking.append(pool.submit(_speak, tts, response.content, os.path.join(output_dir, "intro_body.wav")))
+        for future in speaking:
+            future.result()
 
     # Return as a dict for LangGraph state flow
-    return {"commentator_response": [response.content]}
+    return {"commentator_response": [greeting, response.content]}
 
 
 # if __name__ == "__main__":
 #     intro_bot()
 
 class F1RacePredictor:
-    def __init__(self, meeting: dict):
+    def __init__(self, meeting: dict, llm: ChatOpenAI | None = None, context=None):
         # Use LangChain's ChatOpenAI wrapper (not openai.Client)
-        self.llm = ChatOpenAI(
-            model=LLM_MODEL,
-            api_key=BOSON_API_KEY,
-            base_url=BASE_URL,
-            temperature=0.8,
-            max_tokens=256,
-        )
+        self.llm = llm or commentary_llm(max_tokens=256)
+        # Optional DriverContextCache: background on the drivers in each bucket, by lookup.
+        self.context = context
         self.starting_time = meeting['starting_time']
         self.meeting_name = meeting['meeting_name']
         self.system_prompt = self._init_system_prompt()
@@ -213,8 +303,16 @@ class F1RacePredictor:
         """
 
     def event_prompt(self, state) -> str:
+        standings = ""
+        if state.get("race_summary"):
+            standings = f"Current standings:\n{chr(10).join(state['race_summary'])}\n"
+        if self.context is not None and state.get("bucket_drivers"):
+            with tracer.span("context.lookup"):
+                background = self.context.background(state["bucket_drivers"], state.get("bucket_pairs", ()))
+            if background:
+                standings += f"Background:\n{chr(10).join(background)}\n"
         return f"""
-            Latest race events:\n{chr(10).join(state["latest_events"])}
+            {standings}Latest race events:\n{chr(10).join(state["latest_events"])}
             Continue the commentary below in 20 to 50 words.
             {state['commentator_response']}
             """
@@ -226,7 +324,8 @@ class F1RacePredictor:
         ]
 
         # Invoke the LangChain LLM (synchronous call)
-        response = self.llm.invoke(messages)
+        with tracer.span("llm.predict"):
+            response = self.llm.invoke(messages)
         # state['commentator_response'] = [HumanMessage(content=response.content)]
         state['commentator_response'].append(response.content)
         # Return as a dict for LangGraph state flow
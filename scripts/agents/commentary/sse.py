@@ -0,0 +1,136 @@
+import re
+import json
+import binascii
+
+# Locates the start of the base64 payload of `choices[0].delta.audio.data` without
+# parsing the whole event. `[^{}]*?` keeps the match inside the audio object; the
+# payload then runs to the next quote, since base64 never contains one.
+AUDIO_DATA_RE = re.compile(rb'"audio"\s*:\s*\{[^{}]*?"data"\s*:\s*"')
+AUDIO_KEY_RE = re.compile(rb'"audio"')
+DATA_PREFIX = b"data:"
+DONE = b"[DONE]"
+
+# 64 KiB of PCM16 @ 24 kHz mono is ~1.3 s of audio.
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+class SSEAudioDecoder:
+    """
+    Incrementally decode audio chunks from a chat-completions SSE stream.
+
+    Works on raw response bytes (e.g. `resp.iter_content(chunk_size=None)`):
+      - the audio `data` field is located with a bytes regex, falling back to
+        `json.loads` only when the fast path can't find it
+      - unpadded base64 chunks are concatenated and decoded in one call
+      - decoded PCM is coalesced and handed to `sink` in `block_size` blocks
+
+    `sink` must consume the buffer before returning (e.g. `wave.Wave_write.writeframes`),
+    since the same bytearray is reused for the next block.
+
+    Malformed events are counted in `errors` instead of being dropped silently.
+    """
+
+    def __init__(self, sink, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.sink = sink
+        self.block_size = block_size
+        self.done = False
+        self.events = 0
+        self.errors = 0
+        self.bytes_out = 0
+        self._buf = bytearray()   # undecoded SSE bytes
+        self._b64 = bytearray()   # pending base64 text
+        self._pcm = bytearray()   # decoded PCM waiting to be written
+
+    def feed(self, raw: bytes) -> bool:
+        """Consume a chunk of response bytes. Returns False once [DONE] is seen."""
+        if self.done:
+            return False
+        buf = self._buf
+        buf += raw
+        start = 0
+        with memoryview(buf) as view:
+            while True:
+                end = buf.find(b"\n", start)
+                if end < 0:
+                    break
+                done = self._handle_line(view, start, end)
+                start = end + 1
+                if done:
+                    self.done = True
+                    break
+        del buf[:start]
+        if len(self._pcm) >= self.block_size:
+            self._write_pcm()
+        return not self.done
+
+    def close(self):
+        """Decode and write anything still buffered."""
+        if not self.done and self._buf:
+            with memoryview(self._buf) as view:
+                self._handle_line(view, 0, len(view))
+            self._buf.clear()
+        self._decode_b64()
+        self._write_pcm()
+
+    def _handle_line(self, view: memoryview, start: int, end: int) -> bool:
+        # `view` wraps the receive buffer; slices of it must not outlive this call.
+        buf = view.obj
+        if end > start and buf[end - 1] == 0x0D:  # \r
+            end -= 1
+        if not buf.startswith(DATA_PREFIX, start, end):
+            return False
+        start += len(DATA_PREFIX)
+        if end - start <= 16 and bytes(view[start:end]).strip() == DONE:
+            return True
+        self.events += 1
+
+        match = AUDIO_DATA_RE.search(buf, start, end)
+        if match is not None:
+            b64_start = match.end()
+            b64_end = buf.find(b'"', b64_start, end)
+            if b64_end >= 0 and buf.find(b"\\", b64_start, b64_end) < 0:
+                self._add_b64(view, b64_start, b64_end)
+                return False
+        elif AUDIO_KEY_RE.search(buf, start, end) is None:
+            return False
+
+        # Slow path: unusual formatting or escaping, parse the full event.
+        try:
+            chunk = json.loads(bytes(view[start:end]))
+            audio = chunk["choices"][0].get("delta", {}).get("audio") or {}
+            encoded = (audio.get("data") or "").encode("ascii")
+        except (ValueError, KeyError, IndexError, AttributeError):
+            self.errors += 1
+            return False
+        if encoded:
+            self._add_b64(memoryview(encoded), 0, len(encoded))
+        return False
+
+    def _add_b64(self, src, start: int, end: int):
+        # Base64 chunks can only be joined while none of them carries padding,
+        # so a padded (or odd-length) chunk forces a decode of everything pending.
+        if end <= start:
+            return
+        self._b64 += src[start:end]
+        if (end - start) % 4 or src[end - 1] == 0x3D:  # "="
+            self._decode_b64()
+        elif len(self._b64) >= self.block_size:
+            self._decode_b64()
+
+    def _decode_b64(self):
+        if not self._b64:
+            return
+        try:
+            self._pcm += binascii.a2b_base64(self._b64)
+        except binascii.Error:
+            self.errors += 1
+        self._b64.clear()
+        if len(self._pcm) >= self.block_size:
+            self._write_pcm()
+
+    def _write_pcm(self):
+        if not self._pcm:
+            return
+        self.sink(self._pcm)
+        self.bytes_out += len(self._pcm)
+        self._pcm.clear()
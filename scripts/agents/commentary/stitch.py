@@ -0,0 +1,243 @@
+"""
+Template callouts stitched from pre-synthesized audio units.
+
+Driver and team names recur in almost every line, and overtakes, pit stops and
+top-3 position changes follow a handful of fixed shapes ("Leclerc goes past
+Tsunoda for P8"). Before the race every unit (surnames, team names, phrases,
+"for P2".."for P20") is synthesized once in the cloned voice and trimmed of edge
+silence. At runtime a callout is rendered by concatenating the units with short
+equal-power crossfades, which takes well under a millisecond and needs no model call.
+Free-form commentary still goes through the LLM -> TTS graph.
+
+    python -m scripts.agents.commentary.stitch                       # build the unit bank
+    python -m scripts.agents.commentary.stitch --say "Leclerc" "goes past" "Tsunoda"
+"""
+import os
+import json
+import wave
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .tts_cache import write_wav, SAMPLE_RATE
+from ..tracing import tracer
+
+PHRASE_UNITS_DIR = "data/commentary/phrase_units"
+PHRASES = ("goes past", "takes the lead from", "bring in", "is up to")
+MAX_POSITION = 20
+LEAD_POSITIONS = 3  # position updates only get a callout inside the top 3
+
+
+def position_unit(position: int) -> str:
+    return f"P{position}"
+
+
+def driver_unit(driver: dict) -> str:
+    return driver["last_name"]
+
+
+def unit_texts(drivers: list[dict]) -> list[str]:
+    """Every unit a callout can use for this grid, in build order."""
+    units = {driver_unit(d): None for d in drivers}
+    units.update({d["team_name"]: None for d in drivers if d.get("team_name")})
+    units.update({p: None for p in PHRASES})
+    units.update({f"for {position_unit(n)}": None for n in range(2, MAX_POSITION + 1)})
+    units.update({position_unit(n): None for n in range(2, LEAD_POSITIONS + 1)})
+    return list(units)
+
+
+def callout_units(event: dict, drivers: dict, previous: int | None = None) -> list[str] | None:
+    """
+    Units for one event (drivers keyed by number), or None when it gets no callout.
+    Position updates are only called out as gains: `previous` is the driver's last known
+    position for a `position` event, and a `position_change` carries its own from / to.
+    """
+    kind = event.get("event_type")
+    if kind == "overtake":
+        a, b = drivers.get(event.get("overtaking_driver_number")), drivers.get(event.get("overtaken_driver_number"))
+        if a is None or b is None:
+            return None
+        if event.get("position") == 1:
+            return [driver_unit(a), "takes the lead from", driver_unit(b)]
+        units = [driver_unit(a), "goes past", driver_unit(b)]
+        return units + [f"for {position_unit(event['position'])}"] if event.get("position") else units
+    number, position = event.get("driver_number"), event.get("position")
+    if kind == "position_change":
+        # Linked changes are left to the overtake's own callout.
+        change = next((c for c in event.get("changes", ()) if not c[4]), None)
+        if change is None:
+            return None
+        number, previous, position = change[0], change[1], change[2]
+    driver = drivers.get(number)
+    if driver is None:
+        return None
+    if kind in ("pit", "pit_stop") and driver.get("team_name"):
+        return [driver["team_name"], "bring in", driver_unit(driver)]
+    if kind in ("position", "position_change") and 1 < (position or 99) <= LEAD_POSITIONS \
+            and previous and position < previous:
+        return [driver_unit(driver), "is up to", position_unit(position)]
+    return None
+
+
+def trim_silence(pcm: np.ndarray, threshold: int = 500, pad_ms: int = 30,
+                 sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Drop leading/trailing samples below `threshold`, keeping `pad_ms` of margin."""
+    loud = np.flatnonzero(np.abs(pcm.astype(np.int32)) >= threshold)
+    if not len(loud):
+        return pcm[:0]
+    pad = sample_rate * pad_ms // 1000
+    return pcm[max(loud[0] - pad, 0):loud[-1] + pad + 1]
+
+
+def crossfade_concat(units: list[np.ndarray], fade_ms: int = 20, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Concatenate int16 clips, overlapping each join by `fade_ms` with an equal-power fade."""
+    fade = sample_rate * fade_ms // 1000
+    out = np.zeros(0, dtype=np.float32)
+    for unit in units:
+        x = unit.astype(np.float32)
+        n = min(fade, len(out), len(x))
+        if n:
+            t = np.linspace(0, np.pi / 2, n, dtype=np.float32)
+            x[:n] = out[-n:] * np.cos(t) + x[:n] * np.sin(t)
+            out = out[:-n]
+        out = np.concatenate([out, x])
+    return np.clip(out, -32768, 32767).astype(np.int16)
+
+
+class PhraseBank:
+    """{unit text: int16 PCM} plus rendering; units are memory-mapped when loaded from disk."""
+
+    def __init__(self, units: dict | None = None, fade_ms: int = 20):
+        self.units = units or {}
+        self.fade_ms = fade_ms
+
+    @staticmethod
+    def _file(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16] + ".pcm"
+
+    @classmethod
+    def build(cls, texts: list[str], synthesize, directory: str = PHRASE_UNITS_DIR,
+              workers: int = 4) -> "PhraseBank":
+        """
+        synthesize: fn(text) -> int16 PCM (see `clone_voice_pcm`). Units already in
+        `directory` are kept, so adding a driver only synthesizes the new names.
+        """
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, "index.json")
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        todo = [t for t in texts if t not in index or not os.path.exists(os.path.join(directory, index[t]))]
+
+        def run(text):
+            pcm = trim_silence(np.asarray(synthesize(text), dtype=np.int16))
+            pcm.tofile(os.path.join(directory, cls._file(text)))
+            return text
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for text in pool.map(run, todo):
+                index[text] = cls._file(text)
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory: str = PHRASE_UNITS_DIR, **kwargs) -> "PhraseBank":
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        units = {}
+        for text, name in index.items():
+            path = os.path.join(directory, name)
+            if os.path.getsize(path):
+                units[text] = np.memmap(path, dtype=np.int16, mode="r")
+        return cls(units, **kwargs)
+
+    def render(self, texts: list[str]) -> np.ndarray | None:
+        """Stitched PCM for the units, or None if any of them is missing."""
+        try:
+            parts = [self.units[t] for t in texts]
+        except KeyError:
+            return None
+        return crossfade_concat(parts, self.fade_ms)
+
+
+class Callouts:
+    """
+    Per-bucket callout renderer for `run_commentary(callouts=...)`: writes one WAV
+    per templated event and returns the paths.
+    """
+
+    def __init__(self, bank: PhraseBank, drivers: list[dict], max_per_bucket: int = 2):
+        self.bank = bank
+        self.drivers = {int(d["driver_number"]): d for d in drivers}
+        self.max_per_bucket = max_per_bucket
+        self.positions = {}  # driver number -> last known position, to tell gains from drops
+
+    def _track(self, event: dict):
+        kind = event.get("event_type")
+        if kind == "position":
+            self.positions[event.get("driver_number")] = event.get("position")
+        elif kind == "position_change":
+            moves = event.get("moves", ())
+            self.positions.update(zip(moves[::2], moves[1::2]))
+        elif kind == "classification":
+            self.positions = {n: p for p, n in enumerate(event["order"], start=1) if n}
+
+    def __call__(self, events: list[dict], prefix: str) -> list[str]:
+        paths = []
+        with tracer.span("tts.stitch"):
+            for event in events:
+                previous = self.positions.get(event.get("driver_number"))
+                self._track(event)
+                if len(paths) >= self.max_per_bucket:
+                    continue
+                units = callout_units(event, self.drivers, previous)
+                pcm = self.bank.render(units) if units else None
+                if pcm is None:
+                    continue
+                path = f"{prefix}_{len(paths)}.wav"
+                write_wav(path, pcm.tobytes())
+                paths.append(path)
+        return paths
+
+
+def clone_voice_pcm(text: str, tts=None) -> np.ndarray:
+    """Synthesize `text` with the clone voice node (or any node with its interface) as int16 PCM."""
+    if tts is None:
+        from .clone import clone_voice_node as tts
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        tts({"commentator_response": [text], "output_dir": path})
+        with wave.open(path, "rb") as wf:
+            return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    from .llm import DRIVERS_PATH
+
+    ap = argparse.ArgumentParser(description="Pre-synthesize callout units for the grid, or render one.")
+    ap.add_argument("--drivers", default=DRIVERS_PATH)
+    ap.add_argument("--directory", default=PHRASE_UNITS_DIR)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--say", nargs="+", help="render these units to callout.wav instead of building")
+    args = ap.parse_args()
+
+    if args.say:
+        pcm = PhraseBank.load(args.directory).render(args.say)
+        if pcm is None:
+            raise SystemExit("Missing units; build the bank first")
+        write_wav("callout.wav", pcm.tobytes())
+        print(f"Wrote callout.wav ({len(pcm) / SAMPLE_RATE:.2f}s)")
+    else:
+        with open(args.drivers, "r", encoding="utf-8") as f:
+            drivers = json.load(f)
+        bank = PhraseBank.build(unit_texts(drivers), clone_voice_pcm, args.directory, args.workers)
+        print(f"{len(bank.units)} units in {args.directory}")
+        print(tracer.report())
@@ -0,0 +1,175 @@
+"""
+On-disk cache of synthesized commentary audio.
+
+Stock lines ("lights out and away we go", pit-stop calls, filler predictions)
+come back often, and each one would otherwise be a full Higgs round trip.
+Entries are keyed by the normalized text, the voice profile (reference audio
++ transcript) and the sampling parameters, and stored as raw PCM16 files that
+are memory-mapped on a hit, so a hit never touches the network.
+
+The cache is size-bounded: when it grows past `max_bytes`, the least recently
+used entries are evicted. Recency is kept in file mtimes, so it survives restarts.
+
+    cache = TTSCache("data/commentary/tts_cache", max_bytes=512 * 2**20)
+    tts = partial(clone_voice_node, cache=cache)
+    ...
+    cache.stats()  # {"hits", "misses", "hit_rate", ...}
+"""
+import os
+import re
+import mmap
+import json
+import uuid
+import wave
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+TTS_CACHE_DIR = "data/commentary/tts_cache"
+SAMPLE_RATE = 24000
+
+_WS = re.compile(r"\s+")
+_PUNCT = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-", "…": "..."})
+
+
+def normalize_text(text: str) -> str:
+    """Case, whitespace and typographic variants of a line map to the same key."""
+    text = unicodedata.normalize("NFKC", text).translate(_PUNCT)
+    return _WS.sub(" ", text).strip().casefold()
+
+
+def write_wav(path: str, pcm, sample_rate: int = SAMPLE_RATE):
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+
+
+class _Entry:
+    """Streams PCM into a temp file; `commit` publishes it under the key atomically."""
+
+    def __init__(self, cache: "TTSCache", key: str):
+        self.cache = cache
+        self.key = key
+        self.tmp = os.path.join(cache.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        self._f = open(self.tmp, "wb")
+
+    def write(self, pcm):
+        self._f.write(pcm)
+
+    def commit(self):
+        self._f.close()
+        self.cache._publish(self.key, self.tmp)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class TTSCache:
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = 512 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # oldest first
+        self._bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".pcm"):
+                st = os.stat(path)
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+            elif name.endswith(".tmp"):
+                os.remove(path)  # left behind by an interrupted synthesis
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._bytes += size
+
+    @staticmethod
+    def key(text: str, voice: str, params: dict) -> str:
+        blob = json.dumps({"text": normalize_text(text), "voice": voice, "params": params}, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, key: str) -> mmap.mmap | None:
+        """Memory-mapped PCM16 for `key` (close it when done), or None on a miss."""
+        with self._lock:
+            if key not in self._sizes:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._sizes.move_to_end(key)
+        path = self._path(key)
+        try:
+            os.utime(path)
+            with open(path, "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # Removed behind our back; count it as a miss after all.
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+                self._bytes -= self._sizes.pop(key, 0)
+            return None
+
+    def write_wav(self, key: str, path: str) -> bool:
+        """Write the cached audio for `key` as a WAV file; False on a miss."""
+        pcm = self.get(key)
+        if pcm is None:
+            return False
+        with pcm:
+            write_wav(path, pcm)
+        return True
+
+    def writer(self, key: str) -> _Entry:
+        return _Entry(self, key)
+
+    def put(self, key: str, pcm: bytes):
+        with self.writer(key) as entry:
+            entry.write(pcm)
+
+    def _publish(self, key: str, tmp: str):
+        size = os.path.getsize(tmp)
+        if not size or size > self.max_bytes:
+            os.remove(tmp)
+            return
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            self._bytes += size - self._sizes.pop(key, 0)
+            self._sizes[key] = size
+            while self._bytes > self.max_bytes:
+                old, old_size = self._sizes.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._sizes),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+            }
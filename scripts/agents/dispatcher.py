@@ -0,0 +1,227 @@
+import time
+import random
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+import openai
+from langchain_core.messages import AIMessage, BaseMessage
+
+from .tracing import tracer
+
+ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+def to_openai_messages(messages: list[BaseMessage]) -> list[dict]:
+    return [{"role": ROLES.get(m.type, "user"), "content": m.content} for m in messages]
+
+
+class LLMDispatcher:
+    """
+    Runs many in-flight chat calls over one pooled `AsyncOpenAI` client.
+
+    Drop-in for the `llm` argument of `F1RacePredictor` / `intro_bot`: `invoke`
+    takes LangChain messages and returns an AIMessage, blocking the calling
+    thread while the request runs on the dispatcher's own event loop, so race
+    threads don't each hold a connection for a full round trip.
+
+    Concurrency adapts with AIMD: the limit grows by about one per window of
+    on-target responses and is cut by `backoff` when a response is slower than
+    `target_latency` or the endpoint answers 429 (at most once per round trip,
+    so a burst of slow replies counts as one signal). Queued requests are
+    granted round-robin per `key` (race id), like `FairLimiter`.
+
+    Requests still running after the recent `hedge_quantile` latency get a
+    duplicate ("hedge") if there is spare capacity and the hedge budget allows;
+    whichever answers first wins and the other is cancelled.
+    """
+
+    def __init__(self, model: str, api_key: str, base_url: str, temperature: float = 0.8,
+                 max_tokens: int | None = None, min_concurrency: int = 1, max_concurrency: int = 32,
+                 initial_concurrency: int = 4, target_latency: float = 3.0, backoff: float = 0.7,
+                 hedge_quantile: float | None = 0.95, hedge_after: float = 2.0,
+                 hedge_budget: float = 0.1, max_retries: int = 3, window: int = 200):
+        self.model = model
+        self.params = {"temperature": temperature}
+        if max_tokens is not None:
+            self.params["max_tokens"] = max_tokens
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(initial_concurrency)
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.hedge_quantile = hedge_quantile
+        self.hedge_after = hedge_after
+        self.hedge_budget = hedge_budget
+        self.max_retries = max_retries
+
+        self.in_flight = 0
+        self._latencies = deque(maxlen=window)
+        self._last_decrease = 0.0
+        self._waiters: "OrderedDict[str, deque[asyncio.Future]]" = OrderedDict()
+        self.counters = {"requests": 0, "hedges": 0, "hedge_wins": 0, "throttled": 0, "errors": 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="llm-dispatcher")
+        self._thread.start()
+        # Retries are handled here so 429s feed the AIMD limit. The client's connection
+        # pool is bound to the dispatcher loop on first use.
+        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+    # --------------------- Public API ---------------------
+    def invoke(self, messages, key: str = "", timeout: float | None = None, **params) -> AIMessage:
+        """Blocking call; `params` override the default completion parameters."""
+        return self.submit(messages, key, timeout, **params).result()
+
+    def submit(self, messages, key: str = "", timeout: float | None = None, **params):
+        """Schedule a call from any thread; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self.acall(messages, key, timeout, **params), self._loop)
+
+    async def acall(self, messages, key: str = "", timeout: float | None = None, **params) -> AIMessage:
+        """Coroutine form, for callers already running on the dispatcher loop."""
+        self.counters["requests"] += 1
+        request = {"model": self.model, "messages": to_openai_messages(messages), **self.params, **params}
+        start = time.perf_counter()
+        try:
+            if timeout is None:
+                return await self._call(request, key)
+            return await asyncio.wait_for(self._call(request, key), timeout)
+        finally:
+            tracer.observe("llm.dispatch", time.perf_counter() - start)
+
+    def for_key(self, key: str, timeout: float | None = None, **params) -> "_KeyedDispatcher":
+        """View whose `invoke(messages)` tags every call with `key` (e.g. a race id)."""
+        return _KeyedDispatcher(self, key, timeout, params)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(len(q) for q in self._waiters.values()),
+            "hedge_delay": self._hedge_delay(),
+            **self.counters,
+        }
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    # --------------------- Admission ---------------------
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def _acquire(self, key: str):
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            return
+        ready = self._loop.create_future()
+        self._waiters.setdefault(key, deque()).append(ready)
+        try:
+            await ready
+        except asyncio.CancelledError:
+            # Cancelled (e.g. a losing hedge) after being granted but before resuming.
+            if ready.done() and not ready.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._grant()
+
+    def _grant(self):
+        # Hand freed capacity to queued keys round-robin.
+        while self._waiters and self._has_capacity():
+            key, queue = self._waiters.popitem(last=False)
+            ready = queue.popleft()
+            if queue:
+                self._waiters[key] = queue
+            if not ready.done():
+                self.in_flight += 1
+                ready.set_result(None)
+
+    # --------------------- AIMD ---------------------
+    def _on_latency(self, seconds: float):
+        self._latencies.append(seconds)
+        if seconds > self.target_latency:
+            self._decrease()
+        elif self.in_flight + 1 >= int(self.limit) or self._waiters:
+            # Only grow while the limit is what's holding requests back.
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self._grant()
+
+    def _decrease(self):
+        now = time.perf_counter()
+        rtt = self._latencies[-1] if self._latencies else self.target_latency
+        if now - self._last_decrease < rtt:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * self.backoff)
+
+    # --------------------- Calls ---------------------
+    async def _attempt(self, request: dict, key: str) -> AIMessage:
+        """One request holding one unit of concurrency; retries 429s with backoff."""
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(key)
+            start = time.perf_counter()
+            try:
+                response = await self.client.chat.completions.create(**request)
+            except openai.RateLimitError as e:
+                self.counters["throttled"] += 1
+                self._decrease()
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                delay = float(retry_after) if retry_after else 0.25 * 2 ** attempt
+                await asyncio.sleep(delay * (0.5 + random.random()))
+                continue
+            finally:
+                self._release()
+            self._on_latency(time.perf_counter() - start)
+            return AIMessage(content=response.choices[0].message.content or "")
+
+    def _hedge_delay(self) -> float | None:
+        if self.hedge_quantile is None:
+            return None
+        if len(self._latencies) < 20:
+            return self.hedge_after
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))]
+
+    def _may_hedge(self) -> bool:
+        budget_ok = self.counters["hedges"] < self.hedge_budget * self.counters["requests"]
+        return budget_ok and self._has_capacity() and not self._waiters
+
+    async def _call(self, request: dict, key: str) -> AIMessage:
+        tasks = [asyncio.ensure_future(self._attempt(request, key))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay())
+            if not done and self._may_hedge():
+                self.counters["hedges"] += 1
+                tasks.append(asyncio.ensure_future(self._attempt(request, key)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+            # Every attempt failed: surface the primary's error.
+            self.counters["errors"] += 1
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+class _KeyedDispatcher:
+    def __init__(self, dispatcher: LLMDispatcher, key: str, timeout: float | None, params: dict):
+        self.dispatcher = dispatcher
+        self.key = key
+        self.timeout = timeout
+        self.params = params
+
+    def invoke(self, messages) -> AIMessage:
+        return self.dispatcher.invoke(messages, self.key, self.timeout, **self.params)
@@ -0,0 +1,415 @@
+"""
+Compact binary encoding of bucketed race events (`events_5s_indexed.json`).
+
+The JSON repeats `session_key`, `meeting_key`, driver names and full ISO
+timestamps in every event. The `.evb` format stores
+
+  - a header with one string table (every string interned once) and one
+    schema per distinct event shape (its keys, in order, and a struct type per key);
+  - one length-prefixed frame per bucket: the bucket time as a microsecond
+    offset from the first bucket, then each event as a schema id plus one
+    `struct` record. Timestamps inside events are microsecond offsets from
+    their bucket, and values that don't fit the schema's fixed layout
+    (lists, None, mixed types) follow as a small tagged tail.
+
+Decoding gives back exactly the JSON's dicts: the same key order, types and
+timestamp strings. Frames are independent, so consumers can stream buckets
+one at a time (`iter_buckets`) or seek to one (`BucketFile`).
+
+    python -m scripts.agents.event_codec encode data/open_f1/events_5s_indexed.json
+    python -m scripts.agents.event_codec decode data/open_f1/events_5s_indexed.evb out.json
+
+Layout (little-endian):
+
+    b"F1EVB\\x01"  u32 header length  header (JSON: strings, schemas, base, count)
+    per bucket:    u32 frame length   i64 bucket offset (us)  u16 events  events...
+    per event:     u16 schema id      fixed record            tail values
+"""
+import io
+import os
+import json
+import struct
+import argparse
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+MAGIC = b"F1EVB\x01"
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_FRAME = struct.Struct("<qH")  # bucket offset, event count
+
+# Fixed-layout field codes -> struct format. A trailing "?" marks a nullable
+# field, with None stored as the code's sentinel (never a real value).
+FIXED = {"b": "?", "i": "i", "q": "q", "d": "d", "s": "I", "t": "i"}
+NULLS = {"i": -2**31, "q": -2**63, "d": float("nan"), "s": 2**32 - 1, "t": -2**31}
+# Tail value tags.
+T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_TIME, T_LIST, T_SHORTS, T_JSON = range(10)
+_I32 = (-2**31 + 1, 2**31 - 1)
+_I64 = (-2**63 + 1, 2**63 - 1)  # wider ints go to the tail as JSON
+
+
+def _as_time(value: str):
+    """The datetime for an ISO timestamp that formats back to exactly `value`, else None."""
+    if len(value) < 19 or value[4] != "-" or value[10] != "T":
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return dt if dt.tzinfo is not None and dt.isoformat() == value else None
+
+
+def _us(delta: timedelta) -> int:
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _kind(value, bucket_dt):
+    """Fixed-layout code for one value, "n" for None, or "x" when it needs the tagged tail."""
+    if value is None:
+        return "n"
+    if isinstance(value, bool):
+        return "b"
+    if isinstance(value, int):
+        return "i" if _I32[0] <= value <= _I32[1] else "q" if _I64[0] <= value <= _I64[1] else "x"
+    if isinstance(value, float):
+        return "d" if value == value else "x"
+    if isinstance(value, str):
+        dt = _as_time(value)
+        if dt is not None and dt.utcoffset() == bucket_dt.utcoffset():
+            off = _us(dt - bucket_dt)
+            if _I32[0] <= off <= _I32[1]:
+                return "t"
+        return "s"
+    return "x"
+
+
+def _merge(a: str, b: str) -> str:
+    """The code that holds values of both codes: widen i -> q and t -> s, add "?" for None."""
+    if a == b:
+        return a
+    nullable = "n" in (a, b) or a.endswith("?") or b.endswith("?")
+    a, b = a.rstrip("?"), b.rstrip("?")
+    pair = {a, b} - {"n"}
+    if len(pair) == 1:
+        base = pair.pop()
+    else:
+        base = "q" if pair == {"i", "q"} else "s" if pair == {"s", "t"} else "x"
+    if base in ("x", "b", "n"):
+        return "x"
+    return base + "?" if nullable else base
+
+
+def _fmt(codes) -> str:
+    return "<" + "".join(FIXED[c.rstrip("?")] for c in codes if c != "x")
+
+
+# --------------------- Encoding ---------------------
+class _Encoder:
+    def __init__(self, buckets: dict):
+        self.strings: dict[str, int] = {}
+        self.schemas: dict[tuple, int] = {}
+        self.codes: list[list[str]] = []
+        items = list(buckets.items())
+        self.base = datetime.fromisoformat(items[0][0]) if items else None
+        self.count = len(items)
+
+        # Pass 1: intern strings and settle each schema's per-field code.
+        for key, events in items:
+            bucket_dt = self._bucket_time(key)
+            for event in events:
+                keys = tuple(event)
+                sid = self.schemas.get(keys)
+                kinds = [_kind(v, bucket_dt) for v in event.values()]
+                if sid is None:
+                    sid = self.schemas[keys] = len(self.codes)
+                    self.codes.append(kinds)
+                else:
+                    codes = self.codes[sid]
+                    for i, k in enumerate(kinds):
+                        codes[i] = _merge(codes[i], k)
+                self._intern_values(event.values())
+        # A field that was only ever None has no fixed layout.
+        self.codes = [[c if c != "n" else "x" for c in codes] for codes in self.codes]
+        self.structs = [struct.Struct(_fmt(codes)) for codes in self.codes]
+
+    def _bucket_time(self, key: str) -> datetime:
+        dt = _as_time(key)
+        if dt is None:
+            raise ValueError(f"Bucket key is not an ISO timestamp: {key!r}")
+        return dt
+
+    def _intern(self, s: str) -> int:
+        i = self.strings.get(s)
+        if i is None:
+            i = self.strings[s] = len(self.strings)
+        return i
+
+    def _intern_values(self, values):
+        for v in values:
+            if isinstance(v, str):
+                self._intern(v)
+            elif isinstance(v, list):
+                self._intern_values(v)
+            elif isinstance(v, dict) or (type(v) is int and not _I64[0] <= v <= _I64[1]):
+                self._intern(json.dumps(v, ensure_ascii=False))
+
+    def header(self) -> bytes:
+        schemas = [[[k, c] for k, c in zip(keys, self.codes[sid])] for keys, sid in self.schemas.items()]
+        header = {"version": 1, "base": self.base.isoformat() if self.base else None, "count": self.count,
+                  "strings": list(self.strings), "schemas": schemas}
+        return json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _tail(self, value, bucket_dt, out: bytearray):
+        if value is None:
+            out.append(T_NONE)
+        elif isinstance(value, bool):
+            out.append(T_TRUE if value else T_FALSE)
+        elif isinstance(value, int) and _I64[0] <= value <= _I64[1]:
+            out.append(T_INT)
+            out += struct.pack("<q", value)
+        elif isinstance(value, float):
+            out.append(T_FLOAT)
+            out += struct.pack("<d", value)
+        elif isinstance(value, str):
+            if _kind(value, bucket_dt) == "t":
+                out.append(T_TIME)
+                out += struct.pack("<i", _us(_as_time(value) - bucket_dt))
+            else:
+                out.append(T_STR)
+                out += _U32.pack(self.strings[value])
+        elif isinstance(value, list):
+            if value and all(type(v) is int and -32768 <= v <= 32767 for v in value) and len(value) < 65536:
+                out.append(T_SHORTS)
+                out += _U16.pack(len(value)) + struct.pack(f"<{len(value)}h", *value)
+            else:
+                out.append(T_LIST)
+                out += _U32.pack(len(value))
+                for v in value:
+                    self._tail(v, bucket_dt, out)
+        else:
+            out.append(T_JSON)
+            out += _U32.pack(self.strings[json.dumps(value, ensure_ascii=False)])
+
+    def frame(self, key: str, events: list[dict]) -> bytes:
+        bucket_dt = self._bucket_time(key)
+        out = bytearray(_FRAME.pack(_us(bucket_dt - self.base), len(events)))
+        for event in events:
+            sid = self.schemas[tuple(event)]
+            codes = self.codes[sid]
+            fixed, tail = [], []
+            for code, value in zip(codes, event.values()):
+                if code == "x":
+                    tail.append(value)
+                    continue
+                code = code.rstrip("?")
+                if value is None:
+                    fixed.append(NULLS[code])
+                elif code == "s":
+                    fixed.append(self.strings[value])
+                elif code == "t":
+                    fixed.append(_us(_as_time(value) - bucket_dt))
+                else:
+                    fixed.append(value)
+            out += _U16.pack(sid) + self.structs[sid].pack(*fixed)
+            for value in tail:
+                self._tail(value, bucket_dt, out)
+        return _U32.pack(len(out)) + bytes(out)
+
+
+def write_buckets(buckets: dict, fileobj):
+    """Encode `{bucket_time: [event, ...]}` to a binary file object."""
+    enc = _Encoder(buckets)
+    header = enc.header()
+    fileobj.write(MAGIC + _U32.pack(len(header)) + header)
+    for key, events in buckets.items():
+        fileobj.write(enc.frame(key, events))
+
+
+def encode(buckets: dict) -> bytes:
+    buf = io.BytesIO()
+    write_buckets(buckets, buf)
+    return buf.getvalue()
+
+
+# --------------------- Decoding ---------------------
+class _Decoder:
+    def __init__(self, header: dict):
+        self.strings = header["strings"]
+        self.base = datetime.fromisoformat(header["base"]) if header["base"] else None
+        self.count = header["count"]
+        self.schemas = []
+        for fields in header["schemas"]:
+            keys = tuple(k for k, _ in fields)
+            codes = [c for _, c in fields]
+            plain = all(c in ("b", "i", "q", "d") for c in codes)
+            self.schemas.append((keys, codes, struct.Struct(_fmt(codes)), plain))
+
+    def key_at(self, offset_us: int) -> tuple[str, datetime]:
+        dt = self.base + timedelta(microseconds=offset_us)
+        return dt.isoformat(), dt
+
+    def _tail(self, buf, pos, bucket_dt):
+        tag = buf[pos]
+        pos += 1
+        if tag == T_NONE:
+            return None, pos
+        if tag == T_FALSE:
+            return False, pos
+        if tag == T_TRUE:
+            return True, pos
+        if tag == T_INT:
+            return struct.unpack_from("<q", buf, pos)[0], pos + 8
+        if tag == T_FLOAT:
+            return struct.unpack_from("<d", buf, pos)[0], pos + 8
+        if tag == T_STR:
+            return self.strings[_U32.unpack_from(buf, pos)[0]], pos + 4
+        if tag == T_TIME:
+            off = struct.unpack_from("<i", buf, pos)[0]
+            return (bucket_dt + timedelta(microseconds=off)).isoformat(), pos + 4
+        if tag == T_SHORTS:
+            n = _U16.unpack_from(buf, pos)[0]
+            return list(struct.unpack_from(f"<{n}h", buf, pos + 2)), pos + 2 + 2 * n
+        if tag == T_LIST:
+            n = _U32.unpack_from(buf, pos)[0]
+            pos += 4
+            items = []
+            for _ in range(n):
+                v, pos = self._tail(buf, pos, bucket_dt)
+                items.append(v)
+            return items, pos
+        if tag == T_JSON:
+            return json.loads(self.strings[_U32.unpack_from(buf, pos)[0]]), pos + 4
+        raise ValueError(f"Unknown tag {tag}")
+
+    def frame(self, payload: bytes) -> tuple[str, list[dict]]:
+        offset, n = _FRAME.unpack_from(payload, 0)
+        key, bucket_dt = self.key_at(offset)
+        pos = _FRAME.size
+        strings = self.strings
+        events = []
+        for _ in range(n):
+            sid = _U16.unpack_from(payload, pos)[0]
+            keys, codes, st, plain = self.schemas[sid]
+            values = st.unpack_from(payload, pos + 2)
+            pos += 2 + st.size
+            if plain:
+                events.append(dict(zip(keys, values)))
+                continue
+            it = iter(values)
+            out = {}
+            for k, code in zip(keys, codes):
+                if code == "x":
+                    out[k], pos = self._tail(payload, pos, bucket_dt)
+                    continue
+                v = next(it)
+                if code[-1] == "?":
+                    code = code[0]
+                    if v != v if code == "d" else v == NULLS[code]:
+                        out[k] = None
+                        continue
+                if code == "s":
+                    out[k] = strings[v]
+                elif code == "t":
+                    out[k] = (bucket_dt + timedelta(microseconds=v)).isoformat()
+                else:
+                    out[k] = v
+            events.append(out)
+        return key, events
+
+
+def _read_exact(fileobj, n: int) -> bytes:
+    data = fileobj.read(n)
+    if len(data) != n:
+        raise EOFError("Truncated event file")
+    return data
+
+
+def _open_stream(fileobj) -> _Decoder:
+    if _read_exact(fileobj, len(MAGIC)) != MAGIC:
+        raise ValueError("Not an .evb event file")
+    (n,) = _U32.unpack(_read_exact(fileobj, 4))
+    return _Decoder(json.loads(_read_exact(fileobj, n)))
+
+
+def iter_buckets(fileobj):
+    """Yield (bucket_time, events) one frame at a time from a binary stream."""
+    dec = _open_stream(fileobj)
+    while True:
+        head = fileobj.read(4)
+        if not head:
+            return
+        (n,) = _U32.unpack(head)
+        yield dec.frame(_read_exact(fileobj, n))
+
+
+def decode(data: bytes) -> dict:
+    return dict(iter_buckets(io.BytesIO(data)))
+
+
+class BucketFile(Mapping):
+    """
+    Read-only {bucket_time: events} view of an .evb file. Iterating `items()`
+    streams frames in order; key lookups seek to a frame through an offset
+    index built (from the frame headers only) on first use.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._decoder = _open_stream(f)
+            self._data_start = f.tell()
+        self._index: dict[str, tuple[int, int]] | None = None
+
+    def _build_index(self):
+        index = {}
+        with open(self.path, "rb") as f:
+            pos = self._data_start
+            size = os.fstat(f.fileno()).st_size
+            while pos < size:
+                f.seek(pos)
+                (n,) = _U32.unpack(_read_exact(f, 4))
+                (offset,) = struct.unpack("<q", _read_exact(f, 8))
+                index[self._decoder.key_at(offset)[0]] = (pos + 4, n)
+                pos += 4 + n
+        self._index = index
+
+    def __len__(self):
+        return self._decoder.count
+
+    def __iter__(self):
+        if self._index is None:
+            self._build_index()
+        return iter(self._index)
+
+    def __getitem__(self, key):
+        if self._index is None:
+            self._build_index()
+        pos, n = self._index[key]
+        with open(self.path, "rb") as f:
+            f.seek(pos)
+            return self._decoder.frame(_read_exact(f, n))[1]
+
+    def items(self):
+        with open(self.path, "rb") as f:
+            yield from iter_buckets(f)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Convert bucketed events between JSON and .evb.")
+    ap.add_argument("command", choices=["encode", "decode"])
+    ap.add_argument("input")
+    ap.add_argument("output", nargs="?")
+    args = ap.parse_args()
+
+    if args.command == "encode":
+        output = args.output or os.path.splitext(args.input)[0] + ".evb"
+        with open(args.input, "r", encoding="utf-8") as f:
+            buckets = json.load(f)
+        with open(output, "wb") as f:
+            write_buckets(buckets, f)
+    else:
+        output = args.output or os.path.splitext(args.input)[0] + ".json"
+        with open(args.input, "rb") as f, open(output, "w", encoding="utf-8") as out:
+            json.dump(dict(iter_buckets(f)), out, indent=2)
+    print(f"{args.input} ({os.path.getsize(args.input) / 1e3:.0f} kB) -> {output} "
+          f"({os.path.getsize(output) / 1e3:.0f} kB)")
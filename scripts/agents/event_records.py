@@ -0,0 +1,147 @@
+"""
+Compact event records and per-driver string tables for event descriptions.
+
+`generate_event_buckets.stream_indexed` used to copy every event dict, look the
+driver up in `driver_map` several times and attach a freshly formatted
+`driver_name` and `event_description` to each one. Here drivers get dense
+integer ids with every name-dependent fragment formatted once per driver
+(`DriverTable`), and events are `__slots__` records that keep a reference to
+the source row. Dicts are built and descriptions rendered only when a record
+is serialised, or, for buckets written with `describe=False`, only when a
+consumer asks for them (`event_descriptions`), i.e. for buckets that actually
+reach a prompt.
+"""
+from datetime import datetime
+
+UNKNOWN_DRIVER = "Unknown Driver"
+
+# Event kinds as small ints; anything else is KIND_OTHER and gets no description.
+KIND_OTHER, KIND_POSITION, KIND_LAP, KIND_PIT, KIND_OVERTAKE, KIND_POSITION_CHANGE = range(6)
+KINDS = {"position": KIND_POSITION, "lap": KIND_LAP, "pit": KIND_PIT, "pit_stop": KIND_PIT,
+         "overtake": KIND_OVERTAKE, "position_change": KIND_POSITION_CHANGE}
+
+
+class DriverTable:
+    """Driver number -> dense id (0 = unknown), with preformatted description fragments per id."""
+
+    def __init__(self, drivers: list[dict]):
+        self.numbers = [None] + [d["driver_number"] for d in drivers]
+        self.names = [UNKNOWN_DRIVER] + [d["full_name"] for d in drivers]
+        self.ids = {number: i for i, number in enumerate(self.numbers) if i}
+        self.lap = [f"Lap event: {n} completed a lap in " for n in self.names]
+        self.position = [f"Position update: {n} is now P" for n in self.names]
+        self.pit = [f"Pit stop: {n}" for n in self.names]
+        self.overtake = [f"Overtake event: {n} overtook " for n in self.names]
+        self.change = [f"Position change: {n} " for n in self.names]
+
+    @classmethod
+    def from_names(cls, names: dict) -> "DriverTable":
+        """From {driver_number: full_name}, e.g. RaceState.names."""
+        return cls([{"driver_number": n, "full_name": name} for n, name in names.items()])
+
+    def id(self, number) -> int:
+        return self.ids.get(number, 0)
+
+    def name(self, number) -> str:
+        return self.names[self.ids.get(number, 0)]
+
+    def render(self, kind: int, driver: int, other: int, row: dict) -> str | None:
+        if kind == KIND_LAP:
+            return f"{self.lap[driver]}{row['lap_duration']} seconds"
+        if kind == KIND_POSITION:
+            return f"{self.position[driver]}{row['position']}"
+        if kind == KIND_PIT:
+            return self.pit[driver]
+        if kind == KIND_OVERTAKE:
+            return self.overtake[driver] + self.names[other]
+        if kind == KIND_POSITION_CHANGE:
+            return self.render_changes(row["changes"])
+        return None
+
+    def render_changes(self, changes: list) -> str | None:
+        """
+        One line for a compacted position update (scripts/preprocess/positions.py).
+        Changes linked to an overtake are left to the overtake's own line.
+        """
+        parts = []
+        for number, frm, to, others, linked in changes:
+            if linked:
+                continue
+            driver = self.id(number)
+            if not frm:
+                parts.append(f"{self.position[driver]}{to}")
+            elif len(others) == 1:
+                verb = "passes" if to < frm else "drops behind"
+                parts.append(f"{self.change[driver]}{verb} {self.name(others[0])} for P{to}")
+            else:
+                places = abs(frm - to)
+                parts.append(f"{self.change[driver]}{'up' if to < frm else 'down'} {places} "
+                             f"place{'s' if places > 1 else ''} to P{to}")
+        return "; ".join(parts) or None
+
+    def describe(self, event: dict) -> str | None:
+        """Description for an event dict (as stored in the buckets), or None for kinds without one."""
+        kind = KINDS.get(event.get("event_type"), KIND_OTHER)
+        if kind == KIND_OVERTAKE:
+            return self.render(kind, self.id(event.get("overtaking_driver_number")),
+                               self.id(event.get("overtaken_driver_number")), event)
+        return self.render(kind, self.id(event.get("driver_number")), 0, event)
+
+
+class EventRecord:
+    """One merged event: kind and driver ids, its time, and the untouched source row."""
+
+    __slots__ = ("kind", "time", "driver", "other", "row")
+
+    def __init__(self, kind: int, time: datetime, driver: int, other: int, row: dict):
+        self.kind = kind
+        self.time = time
+        self.driver = driver
+        self.other = other
+        self.row = row
+
+    @classmethod
+    def from_row(cls, row: dict, table: DriverTable) -> "EventRecord":
+        """From a labelled row (with `event_type` and a datetime `event_time`)."""
+        kind = KINDS.get(row["event_type"], KIND_OTHER)
+        if kind == KIND_OVERTAKE:
+            return cls(kind, row["event_time"], table.id(row.get("overtaking_driver_number")),
+                       table.id(row.get("overtaken_driver_number")), row)
+        return cls(kind, row["event_time"], table.id(row.get("driver_number")), 0, row)
+
+    def description(self, table: DriverTable) -> str | None:
+        return table.render(self.kind, self.driver, self.other, self.row)
+
+    def to_dict(self, table: DriverTable, describe: bool = True) -> dict:
+        """
+        The bucket dict: the row with an ISO `event_time`, plus driver names and the
+        description when `describe` (the layout generate_event_buckets has always written).
+        """
+        out = dict(self.row)
+        out["event_time"] = self.time.isoformat()
+        if not describe or self.kind == KIND_OTHER:
+            return out
+        if self.kind == KIND_OVERTAKE:
+            out["overtaking_driver_name"] = table.names[self.driver]
+            out["overtaken_driver_name"] = table.names[self.other]
+        else:
+            out["driver_name"] = table.names[self.driver]
+        description = self.description(table)
+        if description is not None:
+            out["event_description"] = description
+        return out
+
+
+def event_descriptions(events: list[dict], table: DriverTable | None = None) -> list[str]:
+    """
+    Prompt lines for one bucket: the stored description, or one rendered from `table`
+    for buckets written without them. Events without a description (e.g. intervals) are skipped.
+    """
+    lines = []
+    for event in events:
+        text = event.get("event_description")
+        if text is None and table is not None:
+            text = table.describe(event)
+        if text is not None:
+            lines.append(text)
+    return lines
@@ -1,55 +1,169 @@
 from dotenv import load_dotenv
 import os
 import time
-import base64
-import requests
+import openai
 from langgraph.graph import StateGraph, END
 import json
 
 from .commentary import clone_voice_node, intro_bot, F1RacePredictor, HFEmbeddings
+from .commentary.context import DriverContextCache, CONTEXT_CACHE_PATH, bucket_drivers
+from .event_codec import BucketFile
+from .event_records import DriverTable, event_descriptions
+from .journal import CommentaryJournal
+from .race_state import RaceState
+from .tracing import tracer
 
-
-start = time.time()
 load_dotenv()
 
-meeting = {
-    "meeting_name": "FORMULA 1 SINGAPORE AIRLINES SINGAPORE GRAND PRIX 2024",
-    "starting_time": "12:00:00"
-}
+EVENTS_PATH = "data/open_f1/events_5s_indexed.json"
+DRIVERS_PATH = "data/open_f1/drivers.json"
+STATE_DIR = "data/commentary/state"
+OUTPUT_DIR = "scripts/agents/output"
+MAX_BUCKETS = 12
+
+
+# A timed-out or failed LLM call (e.g. LLMDispatcher with a timeout) costs one line, not the race.
+LLM_ERRORS = (TimeoutError, openai.APIError)
+
+
+def skip_failed_lines(llm_node):
+    """
+    Wrap an llm node so LLM_ERRORS skip the bucket's line instead of raising:
+    state["line_skipped"] is set (the graph then ends without TTS) and
+    state["llm_failures"] counts the skipped lines.
+    """
+    def node(state: dict) -> dict:
+        try:
+            state = llm_node(state)
+        except LLM_ERRORS as exc:
+            state["llm_failures"] = state.get("llm_failures", 0) + 1
+            state["line_skipped"] = True
+            print(f"⚠️  LLM call failed, skipping this line: {exc!r}")
+            return state
+        state["line_skipped"] = False
+        return state
+    return node
+
+
+def build_app(llm_node, tts_node=clone_voice_node):
+    """Compile the llm -> tts commentary graph for one race; buckets whose LLM call fails get no line."""
+    graph = StateGraph(dict)
+    graph.add_node("tts", tts_node)
+    graph.add_node("llm", skip_failed_lines(llm_node))
+    graph.add_conditional_edges("llm", lambda state: END if state.get("line_skipped") else "tts")
+    graph.add_edge("tts", END)
+    graph.set_entry_point("llm")
+    return graph.compile()
+
+
+def load_buckets(path: str = EVENTS_PATH):
+    """
+    {bucket_time: events} from the JSON, or a BucketFile for an `.evb` file
+    (see event_codec), whose buckets are decoded one at a time as they are iterated.
+    """
+    with tracer.span("events.load"):
+        if path.endswith(".evb"):
+            return BucketFile(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
 
-# Create graph
-llm_predictor = F1RacePredictor(meeting)
 
-graph = StateGraph(dict)
-graph.add_node("tts", clone_voice_node)
-graph.add_node("llm", llm_predictor.invoke)
-graph.add_edge("llm", "tts")
-graph.add_edge("tts", END)
-graph.add_edge("llm", END)
-graph.set_entry_point("llm")
+def load_drivers(path: str = DRIVERS_PATH) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_commentary(app, state: dict, buckets: dict, journal: CommentaryJournal,
+                   race_state: RaceState | None = None, output_dir: str = OUTPUT_DIR,
+                   max_buckets: int = MAX_BUCKETS, label: str = "",
+                   before_bucket=None, after_bucket=None, callouts=None, driver_table: DriverTable | None = None):
+    """
+    Feed each 5 s event bucket through `app`, journaling the state after every bucket.
+    Buckets up to `state["last_bucket"]` (set when resuming from the journal) are skipped,
+    but still applied to `race_state` so its standings are current.
+    `before_bucket(time_stamp)` / `after_bucket(time_stamp, state)` are called around each
+    processed bucket (used by the benchmarks for pacing and lag measurement).
+    `callouts(events, prefix)` (e.g. commentary.stitch.Callouts) renders stitched template
+    audio for the bucket before the graph runs; the paths go to state["callout_audio"].
+    Buckets written without descriptions get them rendered from `driver_table`
+    (default: built from `race_state`'s drivers) as they are processed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if driver_table is None and race_state is not None:
+        driver_table = DriverTable.from_names(race_state.names)
+    last_bucket = state.get("last_bucket")
+    for i, (time_stamp, driver_data) in enumerate(buckets.items()):
+        if i % 3 == 0:
+            print(f"{label}{time_stamp}")
+        if i >= max_buckets:
+            break
+        with tracer.span("bucket.prepare"):
+            if race_state is not None:
+                race_state.apply_many(driver_data)
+            if last_bucket is not None and time_stamp <= last_bucket:
+                continue
+            # Events without a description (e.g. intervals) only feed the race state.
+            state['latest_events'] = event_descriptions(driver_data, driver_table)
+            state['bucket_drivers'], state['bucket_pairs'] = bucket_drivers(driver_data)
+            if race_state is not None:
+                state['race_summary'] = race_state.summary_lines()
+            state['output_dir'] = os.path.join(output_dir, f"audio_{time_stamp}.wav")
+        if before_bucket is not None:
+            before_bucket(time_stamp)
+        if callouts is not None:
+            state['callout_audio'] = callouts(driver_data, os.path.join(output_dir, f"callout_{time_stamp}"))
+        with tracer.span("bucket.graph"):
+            state = app.invoke(state)
+        state['last_bucket'] = time_stamp
+        with tracer.span("state.persist"):
+            journal.record(state)
+        if after_bucket is not None:
+            after_bucket(time_stamp, state)
+    with tracer.span("state.persist"):
+        journal.flush()
+    return state
 
-app = graph.compile()
 
 # --------------------- Run ---------------------
-state_store_path = "data/commentary/input/state_store.json"
-state = intro_bot()
-with open("data/open_f1/events_5s_indexed.json", "r", encoding="utf-8") as f:
-    drivers = json.load(f)
-for i, (time_stamp, driver_data) in enumerate(drivers.items()):
-    if i % 3 == 0:
-        print(time_stamp)
-    if i > 11:
-        break
-    try:
-        with open(state_store_path, "r", encoding="utf-8") as f:
-            state = json.load(f)
-    except:
-        pass    
-    state['latest_events'] = [event['event_description'] for event in driver_data]
-    state['output_dir'] = f"scripts/agents/output/audio_{time_stamp}.wav"
-    state = app.invoke(state)
-    with open(state_store_path, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=4, ensure_ascii=False)
-
-end = time.time()
-print(f"Execution time: {end - start:.2f} seconds")
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+    from .priority import PriorityCommentary, run_prioritised
+
+    ap = argparse.ArgumentParser(description="Run live commentary for one race.")
+    ap.add_argument("--priority", action="store_true",
+                    help="prioritised, deadline-aware pipeline (priority.py) instead of one bucket at a time")
+    ap.add_argument("--speedup", type=float, default=1.0, help="race clock for --priority (0 = as fast as possible)")
+    ap.add_argument("--max-lag", type=float, default=10.0, help="drop --priority lines later than this (s)")
+    args = ap.parse_args()
+
+    start = time.time()
+    if os.getenv("METRICS_PORT"):
+        tracer.serve(int(os.getenv("METRICS_PORT")))
+
+    meeting = {
+        "meeting_name": "FORMULA 1 SINGAPORE AIRLINES SINGAPORE GRAND PRIX 2024",
+        "starting_time": "12:00:00"
+    }
+
+    # Create graph
+    context = DriverContextCache.load(CONTEXT_CACHE_PATH) if os.path.exists(CONTEXT_CACHE_PATH) else None
+    llm_predictor = F1RacePredictor(meeting, context=context)
+
+    with CommentaryJournal(STATE_DIR) as journal:
+        state = journal.recover() or intro_bot(meeting, output_dir=OUTPUT_DIR)
+        if args.priority:
+            commentary = PriorityCommentary(llm_predictor.invoke, clone_voice_node, max_lag=args.max_lag)
+            try:
+                records = run_prioritised(commentary, state, load_buckets(), journal,
+                                          race_state=RaceState(load_drivers()), output_dir=OUTPUT_DIR,
+                                          max_buckets=MAX_BUCKETS, speedup=args.speedup)
+            finally:
+                commentary.close()
+            print(f"Bucket outcomes: {[(r['bucket'], r['priority'], r['outcome']) for r in records]}")
+        else:
+            app = build_app(llm_predictor.invoke)
+            run_commentary(app, state, load_buckets(), journal, race_state=RaceState(load_drivers()))
+
+    end = time.time()
+    print(tracer.report())
+    print(f"Execution time: {end - start:.2f} seconds")
@@ -0,0 +1,185 @@
+import os
+import copy
+import json
+import time
+
+SNAPSHOT_FILE = "snapshot.json"
+JOURNAL_FILE = "journal.jsonl"
+
+
+class CommentaryJournal:
+    """
+    Append-only persistence for the commentary state.
+
+    Each `record(state)` appends one JSON line holding only what changed since
+    the previous record: new items at the end of list fields (e.g.
+    `commentator_response`) go under "append", replaced values under "set".
+    Lines are buffered and written + fsynced every `batch_size` records or
+    `flush_interval` seconds. Every `snapshot_every` records the full state is
+    written atomically to `snapshot.json` and the journal is truncated, so the
+    per-tick cost stays constant and recovery replays a bounded tail.
+
+    Layout of `directory`:
+      - snapshot.json  {"seq": n, "state": {...}}
+      - journal.jsonl  {"seq": n, "set": {...}, "append": {...}} per line
+    """
+
+    def __init__(self, directory: str, batch_size: int = 4, flush_interval: float = 5.0,
+                 snapshot_every: int = 100, fsync: bool = True):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+
+        self.seq = 0
+        self._state = {}
+        self._pending = []
+        self._since_snapshot = 0
+        self._last_flush = time.monotonic()
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+
+    # --------------------- Recovery ---------------------
+    def recover(self) -> dict | None:
+        """Rebuild state from the latest snapshot plus the journal tail. None if empty."""
+        state, snap_seq = {}, 0
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            state, snap_seq = snap["state"], snap["seq"]
+        except FileNotFoundError:
+            pass
+
+        seq = snap_seq
+        replayed = 0
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash: everything after it is unusable.
+                        break
+                    if rec["seq"] <= seq:
+                        continue
+                    self._apply(state, rec)
+                    seq = rec["seq"]
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+
+        self.seq = seq
+        self._state = state
+        self._since_snapshot = replayed
+        # Drop stale or torn lines so new records append after a clean one.
+        if os.path.exists(self.journal_path):
+            self._rewrite_journal_tail(snap_seq)
+        # The caller mutates its state in place; keep our copy separate.
+        return copy.deepcopy(state) or None
+
+    @staticmethod
+    def _apply(state: dict, rec: dict):
+        for key, value in rec.get("set", {}).items():
+            state[key] = value
+        for key, items in rec.get("append", {}).items():
+            state.setdefault(key, []).extend(items)
+
+    def _rewrite_journal_tail(self, after_seq: int):
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as out:
+            try:
+                with open(self.journal_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            rec = json.loads(line)
+                        except ValueError:
+                            break
+                        if after_seq < rec["seq"] <= self.seq:
+                            out.write(line)
+            except FileNotFoundError:
+                pass
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.journal_path)
+
+    # --------------------- Writing ---------------------
+    def record(self, state: dict):
+        """Append the delta between `state` and the last recorded state."""
+        rec = {"seq": self.seq + 1}
+        sets, appends = {}, {}
+        for key, value in state.items():
+            old = self._state.get(key)
+            if isinstance(value, list) and isinstance(old, list) and self._extends(old, value):
+                if len(value) > len(old):
+                    new_items = value[len(old):]
+                    appends[key] = new_items
+                    old.extend(new_items)
+            elif key not in self._state or value != old:
+                sets[key] = value
+                self._state[key] = list(value) if isinstance(value, list) else value
+        if not sets and not appends:
+            return
+        if sets:
+            rec["set"] = sets
+        if appends:
+            rec["append"] = appends
+
+        self.seq += 1
+        self._pending.append(json.dumps(rec, ensure_ascii=False))
+        self._since_snapshot += 1
+
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+        elif (len(self._pending) >= self.batch_size
+              or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    @staticmethod
+    def _extends(old: list, new: list) -> bool:
+        # The whole old list must be a prefix: lists that are replaced every bucket
+        # (latest_events, bucket_drivers, ...) often repeat values at the same index.
+        return len(new) >= len(old) and new[:len(old)] == old
+
+    def flush(self):
+        """Write buffered records and fsync (if enabled)."""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        if self._file is None:
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._file.write("\n".join(self._pending) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._pending.clear()
+
+    def snapshot(self):
+        """Atomically persist the full state, then start an empty journal."""
+        self.flush()
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"seq": self.seq, "state": self._state}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        # Records up to `seq` are now in the snapshot; a crash before the
+        # truncate below is harmless because recovery skips them.
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, "w", encoding="utf-8")
+        self._since_snapshot = 0
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,242 @@
+"""
+Prioritised, deadline-aware commentary across the LLM, TTS and playout stages.
+
+`run_commentary` handles buckets strictly one after another, so an overtake
+for the lead waits behind whatever filler line is being generated or played.
+Here every bucket gets a priority from its events (`bucket_priority`) and a
+deadline (its race time plus `max_lag`), and flows through three
+scheduling.PriorityStage pools:
+
+    llm (F1RacePredictor.invoke) -> tts (clone_voice_node) -> playout
+
+Each stage runs the highest-priority live work first and drops work whose
+deadline has passed. A sufficiently higher-priority arrival preempts
+lower-priority work in flight: the TTS stream is closed mid-response, and
+playback is stopped. LLM calls are not interrupted, but a preempted line is
+discarded when it comes back.
+
+    python -m scripts.benchmarks.pipeline --priority
+"""
+import os
+import time
+import wave
+import shutil
+import threading
+import subprocess
+from datetime import datetime
+
+from .commentary.context import bucket_drivers
+from .event_records import DriverTable, event_descriptions
+from .scheduling import PriorityStage, Cancelled, Expired
+from .tracing import tracer
+
+BUCKET_SECONDS = 5.0
+
+# Base priority per event type; overtakes and position changes near the front rank higher.
+TYPE_PRIORITY = {"overtake": 50, "pit": 40, "pit_stop": 40, "video": 30, "position": 20, "position_change": 20,
+                 "lap": 10}
+FILLER_PRIORITY = 0
+
+
+def event_priority(event: dict) -> int:
+    base = TYPE_PRIORITY.get(event.get("event_type"), 5)
+    position = event.get("position")
+    if event.get("event_type") in ("overtake", "position", "position_change") and position:
+        if position == 1:
+            base += 50
+        elif position <= 3:
+            base += 30
+        elif position <= 10:
+            base += 10
+    return base
+
+
+def bucket_priority(events: list[dict]) -> int:
+    return max((event_priority(e) for e in events), default=FILLER_PRIORITY)
+
+
+def wav_seconds(path: str) -> float:
+    with wave.open(path, "rb") as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+def play_wav(path: str, cancel: threading.Event, realtime: bool = True):
+    """
+    Play through ffplay when it is installed, else just hold the playout slot for
+    the clip's duration (`realtime=False` skips the wait). Stopping early on `cancel`
+    raises Cancelled.
+    """
+    if realtime and shutil.which("ffplay"):
+        proc = subprocess.Popen(["ffplay", "-nodisp", "-autoexit", "-loglevel", "error", path])
+        try:
+            while proc.poll() is None:
+                if cancel.wait(0.02):
+                    proc.terminate()
+                    raise Cancelled(path)
+        finally:
+            proc.wait()
+    elif realtime and cancel.wait(wav_seconds(path)):
+        raise Cancelled(path)
+
+
+class PriorityCommentary:
+    """
+    Runs buckets through the three stages concurrently. `llm_node(state)` and
+    `tts_node(state, cancel=...)` are the same callables the LangGraph app uses.
+    `driver_table` renders descriptions for buckets written without them.
+    """
+
+    def __init__(self, llm_node, tts_node, play=play_wav, llm_workers: int = 2, tts_workers: int = 2,
+                 max_lag: float = 10.0, preempt_margin: int = 30, driver_table: DriverTable | None = None):
+        self.llm_node = llm_node
+        self.driver_table = driver_table
+        self.tts_node = tts_node
+        self.play = play
+        self.max_lag = max_lag
+        # LLM calls can't be interrupted: a preempted one is discarded when it returns.
+        self.llm = PriorityStage("priority.llm", llm_workers, preempt_margin, discard_cancelled=True)
+        self.tts = PriorityStage("priority.tts", tts_workers, preempt_margin)
+        self.playout = PriorityStage("priority.playout", 1, preempt_margin)
+        self._done = threading.Condition()
+        self.results: list[dict] = []
+
+    def submit(self, state: dict, time_stamp: str, events: list[dict], ready: float, output_path: str,
+               on_line=None):
+        """
+        Queue one bucket. `state` is the shared commentary state (read for the prompt, and
+        updated via `on_line(time_stamp, line)` when the LLM answers); `ready` is the
+        monotonic time its events were complete.
+        """
+        priority = bucket_priority(events)
+        deadline = ready + self.max_lag
+        bucket_state = dict(state)
+        bucket_state["commentator_response"] = list(state.get("commentator_response", []))
+        bucket_state["latest_events"] = event_descriptions(events, self.driver_table)
+        bucket_state["bucket_drivers"], bucket_state["bucket_pairs"] = bucket_drivers(events)
+        record = {"bucket": time_stamp, "priority": priority, "ready": ready, "outcome": None}
+        label = f"{time_stamp} (p{priority})"
+
+        def llm_job(cancel):
+            return self.llm_node(bucket_state)["commentator_response"][-1]
+
+        def tts_job(line, cancel):
+            self.tts_node({"commentator_response": [line], "output_dir": output_path}, cancel=cancel)
+            return output_path
+
+        def play_job(path, cancel):
+            record["play_start"] = time.monotonic()
+            self.play(path, cancel)
+            return path
+
+        def finish(outcome):
+            record["outcome"] = outcome
+            record["done"] = time.monotonic()
+            with self._done:
+                self.results.append(record)
+                self._done.notify_all()
+
+        def after_play(future):
+            exc = future.exception()
+            finish("played" if exc is None else _outcome(exc))
+
+        # The callbacks run on stage threads, where an exception would be swallowed and the
+        # bucket never finished (so `wait` would hang): anything they raise is its outcome.
+        def after_tts(future):
+            exc = future.exception()
+            if exc is not None:
+                return finish(_outcome(exc))
+            record["audio_ready"] = time.monotonic()
+            try:
+                self.playout.submit(lambda cancel: play_job(future.result(), cancel),
+                                    priority, deadline, label).add_done_callback(after_play)
+            except Exception as exc:
+                finish(_outcome(exc))
+
+        def after_llm(future):
+            exc = future.exception()
+            if exc is not None:
+                return finish(_outcome(exc))
+            line = future.result()
+            try:
+                if on_line is not None:
+                    on_line(time_stamp, line)
+                self.tts.submit(lambda cancel: tts_job(line, cancel),
+                                priority, deadline, label).add_done_callback(after_tts)
+            except Exception as exc:
+                finish(_outcome(exc))
+
+        future = self.llm.submit(llm_job, priority, deadline, label)
+        future.add_done_callback(after_llm)
+        return record
+
+    def wait(self, expected: int, timeout: float | None = None):
+        """Block until `expected` buckets have reached a final outcome."""
+        with self._done:
+            if not self._done.wait_for(lambda: len(self.results) >= expected, timeout):
+                raise TimeoutError(f"{len(self.results)}/{expected} buckets finished")
+            return list(self.results)
+
+    def stats(self) -> dict:
+        return {stage.name: stage.stats() for stage in (self.llm, self.tts, self.playout)}
+
+    def close(self):
+        for stage in (self.llm, self.tts, self.playout):
+            stage.close()
+
+
+def _outcome(exc: BaseException) -> str:
+    if isinstance(exc, Expired):
+        return "expired"
+    if isinstance(exc, Cancelled):
+        return "preempted"
+    return f"failed: {exc!r}"
+
+
+def run_prioritised(commentary: PriorityCommentary, state: dict, buckets: dict, journal, race_state=None,
+                    output_dir: str = "scripts/agents/output", max_buckets: int = 12, speedup: float = 1.0):
+    """
+    Replay buckets on the race clock (`speedup` x real time; 0 = as fast as possible)
+    into `commentary`, journaling each line as it arrives. Returns the per-bucket
+    records: priority, outcome and timings (monotonic seconds).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if commentary.driver_table is None and race_state is not None:
+        commentary.driver_table = DriverTable.from_names(race_state.names)
+    lock = threading.Lock()
+    first = None
+    start = time.monotonic()
+    submitted = 0
+
+    def on_line(time_stamp, line):
+        with lock:
+            state["commentator_response"].append(line)
+            state["last_bucket"] = max(state.get("last_bucket") or time_stamp, time_stamp)
+            with tracer.span("state.persist"):
+                journal.record(state)
+
+    last_bucket = state.get("last_bucket")
+    for i, (time_stamp, events) in enumerate(buckets.items()):
+        if i >= max_buckets:
+            break
+        race_t = _race_seconds(time_stamp)
+        first = race_t if first is None else first
+        ready = start + (race_t - first + BUCKET_SECONDS) / speedup if speedup else time.monotonic()
+        if speedup and ready > time.monotonic():
+            time.sleep(ready - time.monotonic())
+        with lock:
+            if race_state is not None:
+                race_state.apply_many(events)
+                state["race_summary"] = race_state.summary_lines()
+            if last_bucket is not None and time_stamp <= last_bucket:
+                continue
+            commentary.submit(state, time_stamp, events, ready,
+                              os.path.join(output_dir, f"audio_{time_stamp}.wav"), on_line)
+        submitted += 1
+    results = commentary.wait(submitted)
+    with lock, tracer.span("state.persist"):
+        journal.flush()
+    return results
+
+
+def _race_seconds(time_stamp: str) -> float:
+    return datetime.fromisoformat(time_stamp).timestamp()
@@ -0,0 +1,224 @@
+import math
+from array import array
+
+NAN = float("nan")
+INF = float("inf")
+
+
+def _fmt_lap(seconds: float) -> str:
+    minutes, secs = divmod(seconds, 60)
+    return f"{int(minutes)}:{secs:06.3f}"
+
+
+class RaceState:
+    """
+    Running race state built incrementally from the merged event stream.
+
+    Every aggregate lives in a compact array indexed by a per-driver slot, so
+    `apply(event)` is O(1) and snapshot queries never rescan past events.
+
+    Handles the event types produced by `generate_event_buckets.py`:
+      - position   running order
+      - position_change / classification   compacted position feed (preprocess/positions.py)
+      - overtake   overtakes made / lost
+      - lap        current lap, last/personal-best/fastest lap
+      - pit        pit count, last pit duration, current stint
+      - interval   gap to leader and to the car ahead (OpenF1 intervals)
+    """
+
+    def __init__(self, drivers: list[dict]):
+        self.numbers = sorted(int(d["driver_number"]) for d in drivers)
+        self.names = {int(d["driver_number"]): d["full_name"] for d in drivers}
+        self._slot = {num: i for i, num in enumerate(self.numbers)}
+        n = len(self.numbers)
+
+        self.position = array("h", [0] * n)          # 0 = unknown
+        self.order = array("h", [-1] * (n + 1))      # position -> slot
+        self.lap = array("h", [0] * n)
+        self.last_lap = array("d", [NAN] * n)
+        self.best_lap = array("d", [INF] * n)
+        self.best_lap_number = array("h", [0] * n)
+        self.pit_count = array("h", [0] * n)
+        self.last_pit_duration = array("d", [NAN] * n)
+        self.stint_start_lap = array("h", [1] * n)
+        self.gap_to_leader = array("d", [NAN] * n)
+        self.interval = array("d", [NAN] * n)
+        self.laps_down = array("h", [0] * n)
+        self.overtakes_made = array("h", [0] * n)
+        self.overtakes_lost = array("h", [0] * n)
+
+        self.fastest_lap = INF
+        self.fastest_lap_slot = -1
+        self.clock = None
+        self.events_applied = 0
+
+        self._handlers = {
+            "position": self._on_position,
+            "overtake": self._on_overtake,
+            "lap": self._on_lap,
+            "pit": self._on_pit,
+            "pit_stop": self._on_pit,
+            "interval": self._on_interval,
+            "position_change": self._on_position_change,
+            "classification": self._on_classification,
+        }
+
+    # --------------------- Updates ---------------------
+    def apply(self, event: dict):
+        handler = self._handlers.get(event.get("event_type"))
+        if handler is None:
+            return
+        handler(event)
+        self.clock = event.get("event_time", self.clock)
+        self.events_applied += 1
+
+    def apply_many(self, events):
+        for event in events:
+            self.apply(event)
+
+    def _slot_of(self, number):
+        return self._slot.get(number)
+
+    def _on_position(self, e):
+        self._set_position(e.get("driver_number"), e.get("position"))
+
+    def _on_position_change(self, e):
+        # Compacted feed (scripts/preprocess/positions.py): replay the raw rows of the update.
+        moves = e.get("moves", ())
+        for number, pos in zip(moves[::2], moves[1::2]):
+            self._set_position(number, pos)
+
+    def _on_classification(self, e):
+        for i in range(len(self.position)):
+            self.position[i] = 0
+        for p in range(len(self.order)):
+            self.order[p] = -1
+        for pos, number in enumerate(e.get("order", ()), start=1):
+            if number:
+                self._set_position(number, pos)
+
+    def _set_position(self, number, pos):
+        i = self._slot_of(number)
+        if i is None or not pos or pos >= len(self.order):
+            return
+        old = self.position[i]
+        if old and self.order[old] == i:
+            self.order[old] = -1
+        self.position[i] = pos
+        self.order[pos] = i
+
+    def _on_overtake(self, e):
+        made = self._slot_of(e.get("overtaking_driver_number"))
+        lost = self._slot_of(e.get("overtaken_driver_number"))
+        if made is not None:
+            self.overtakes_made[made] += 1
+        if lost is not None:
+            self.overtakes_lost[lost] += 1
+
+    def _on_lap(self, e):
+        i = self._slot_of(e.get("driver_number"))
+        if i is None:
+            return
+        lap_number = e.get("lap_number") or 0
+        if lap_number > self.lap[i]:
+            self.lap[i] = lap_number
+        duration = e.get("lap_duration")
+        if duration is None:
+            return
+        # OpenF1 stamps a lap at its start, so the duration belongs to `lap_number`.
+        self.last_lap[i] = duration
+        if duration < self.best_lap[i]:
+            self.best_lap[i] = duration
+            self.best_lap_number[i] = lap_number
+        if duration < self.fastest_lap:
+            self.fastest_lap = duration
+            self.fastest_lap_slot = i
+
+    def _on_pit(self, e):
+        i = self._slot_of(e.get("driver_number"))
+        if i is None:
+            return
+        self.pit_count[i] += 1
+        if e.get("pit_duration") is not None:
+            self.last_pit_duration[i] = e["pit_duration"]
+        self.stint_start_lap[i] = (e.get("lap_number") or self.lap[i]) + 1
+
+    def _on_interval(self, e):
+        i = self._slot_of(e.get("driver_number"))
+        if i is None:
+            return
+        gap = e.get("gap_to_leader")
+        if isinstance(gap, str):
+            # e.g. "+1 LAP"
+            digits = "".join(ch for ch in gap if ch.isdigit())
+            self.laps_down[i] = int(digits) if digits else 0
+            self.gap_to_leader[i] = NAN
+        elif gap is not None:
+            self.laps_down[i] = 0
+            self.gap_to_leader[i] = gap
+        interval = e.get("interval")
+        self.interval[i] = interval if isinstance(interval, (int, float)) else NAN
+
+    # --------------------- Queries ---------------------
+    def driver(self, number: int) -> dict | None:
+        i = self._slot_of(number)
+        if i is None:
+            return None
+        return {
+            "driver_number": number,
+            "name": self.names[number],
+            "position": self.position[i] or None,
+            "lap": self.lap[i],
+            "last_lap": None if math.isnan(self.last_lap[i]) else self.last_lap[i],
+            "best_lap": None if self.best_lap[i] == INF else self.best_lap[i],
+            "best_lap_number": self.best_lap_number[i] or None,
+            "pit_count": self.pit_count[i],
+            "last_pit_duration": None if math.isnan(self.last_pit_duration[i]) else self.last_pit_duration[i],
+            "stint": self.pit_count[i] + 1,
+            "stint_laps": max(0, self.lap[i] - self.stint_start_lap[i] + 1),
+            "gap_to_leader": None if math.isnan(self.gap_to_leader[i]) else self.gap_to_leader[i],
+            "interval": None if math.isnan(self.interval[i]) else self.interval[i],
+            "laps_down": self.laps_down[i],
+            "overtakes_made": self.overtakes_made[i],
+            "overtakes_lost": self.overtakes_lost[i],
+        }
+
+    def running_order(self) -> list[int]:
+        """Driver numbers in classification order (only positions seen so far)."""
+        self._fill_single_gap()
+        return [self.numbers[i] for i in self.order[1:] if i >= 0]
+
+    def _fill_single_gap(self):
+        # The feed only reports changes, so a driver who never moved (often the
+        # leader) has no position. With one hole and one unplaced driver the
+        # answer is unambiguous.
+        holes = [p for p in range(1, len(self.order)) if self.order[p] < 0]
+        if len(holes) != 1:
+            return
+        unplaced = [i for i in range(len(self.numbers)) if not self.position[i]]
+        if len(unplaced) == 1:
+            self.position[unplaced[0]] = holes[0]
+            self.order[holes[0]] = unplaced[0]
+
+    def snapshot(self, top: int | None = None) -> list[dict]:
+        """Per-driver state in running order, for prompts and the visualiser."""
+        order = self.running_order()
+        return [self.driver(num) for num in (order[:top] if top else order)]
+
+    def summary_lines(self, top: int = 10) -> list[str]:
+        """Compact text lines describing the front of the field."""
+        lines = []
+        for d in self.snapshot(top):
+            parts = [f"P{d['position']} {d['name']}"]
+            if d["laps_down"]:
+                parts.append(f"+{d['laps_down']} lap{'s' if d['laps_down'] > 1 else ''}")
+            elif d["gap_to_leader"] is not None and d["position"] != 1:
+                parts.append(f"+{d['gap_to_leader']:.1f}s")
+            if d["best_lap"] is not None:
+                parts.append(f"best {_fmt_lap(d['best_lap'])}")
+            parts.append(f"{d['pit_count']} stop{'s' if d['pit_count'] != 1 else ''}")
+            lines.append(", ".join(parts))
+        if self.fastest_lap_slot >= 0:
+            num = self.numbers[self.fastest_lap_slot]
+            lines.append(f"Fastest lap: {self.names[num]} {_fmt_lap(self.fastest_lap)}")
+        return lines
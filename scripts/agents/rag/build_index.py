@@ -0,0 +1,235 @@
+"""
+Streaming build of the RAG index from local JSON documents.
+
+`create_vector_store.build_vector_store` loads every document, splits them
+all and embeds everything in one call, so peak memory grows with the corpus
+and only the embedder uses more than one core. Here every stage streams:
+
+    documents        read lazily, one file (or JSONL line) at a time
+      -> chunking    RecursiveCharacterTextSplitter in a process pool, with a
+                     bounded number of document batches in flight
+      -> embedding   embed_documents on batches of `embed_batch` chunks
+      -> shards      float32 .npy + JSONL written every `shard_size` chunks
+      -> merge       shards streamed into one QuantizedVectorStore directory
+
+At most one shard of vectors and a few batches of text are held at a time.
+The quantiser's per-dimension statistics are accumulated while writing the
+shards, so the merge reads each shard once and writes the memory-mapped
+outputs block by block.
+
+    python -m scripts.agents.rag.create_vector_store --workers 8
+"""
+import os
+import json
+import uuid
+import shutil
+import time
+from pathlib import Path
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ..tracing import tracer
+from .quantized import QuantizedVectorStore, OVERSAMPLE, quantiser_scale, quantise_block
+
+SHARD_FORMAT = "shard-{:05d}"
+
+_splitters: dict = {}
+
+
+# --------------------- Documents ---------------------
+def iter_documents(path: Path):
+    """
+    Yield (text, metadata) per JSON object, with the same metadata as
+    `create_vector_store.load_json_docs`. `.jsonl` files are read line by line.
+    """
+    path = Path(path)
+    if path.is_dir():
+        files = sorted(p for p in path.rglob("*") if p.suffix.lower() in (".json", ".jsonl"))
+    elif path.is_file() and path.suffix.lower() in (".json", ".jsonl"):
+        files = [path]
+    else:
+        raise FileNotFoundError(f"No JSON found at {path}")
+
+    for fp in files:
+        with open(fp, "r", encoding="utf-8") as f:
+            if fp.suffix.lower() == ".jsonl":
+                items = (json.loads(line) for line in f if line.strip())
+            else:
+                data = json.load(f)
+                items = data if isinstance(data, list) else [data]
+            for i, item in enumerate(items):
+                text = item.get("text") or item.get("content") or json.dumps(item, ensure_ascii=False)
+                yield text, {"source_file": str(fp), "idx": i, "id": item.get("id"), "title": item.get("title")}
+
+
+def _batched(iterable, n: int):
+    it = iter(iterable)
+    while batch := list(islice(it, n)):
+        yield batch
+
+
+# --------------------- Chunking ---------------------
+def split_batch(docs: list[tuple[str, dict]], chunk_size: int, chunk_overlap: int) -> list[tuple[str, str, dict]]:
+    """(id, text, metadata) chunks for a batch of documents; runs in pool workers."""
+    key = (chunk_size, chunk_overlap)
+    splitter = _splitters.get(key)
+    if splitter is None:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        splitter = _splitters[key] = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = []
+    for text, meta in docs:
+        for n, piece in enumerate(splitter.split_text(text)):
+            # Stable ids, so rebuilding an unchanged corpus gives the same index.
+            doc_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{meta['source_file']}#{meta['idx']}.{n}"))
+            chunks.append((doc_id, piece, meta))
+    return chunks
+
+
+def _bounded_map(pool, fn, items, max_pending: int, *args):
+    """Ordered pool.map that only submits `max_pending` items ahead of the consumer."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_chunks(docs, chunk_size: int, chunk_overlap: int, workers: int | None = None, docs_per_task: int = 64):
+    """Chunks of a document stream, split in `workers` processes (0 = in this process)."""
+    batches = _batched(docs, docs_per_task)
+    if workers == 0:
+        for batch in batches:
+            yield from split_batch(batch, chunk_size, chunk_overlap)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        ahead = 2 * (workers or os.cpu_count() or 1)
+        for chunks in _bounded_map(pool, split_batch, batches, ahead, chunk_size, chunk_overlap):
+            yield from chunks
+
+
+# --------------------- Shards ---------------------
+class ShardWriter:
+    """Buffers embedded chunks and writes a shard every `shard_size` rows."""
+
+    def __init__(self, directory: str, shard_size: int):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.shards: list[str] = []
+        self.rows = 0
+        self.absmax = self.total = None
+        self._vectors, self._chunks = [], []
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, vectors: np.ndarray, chunks: list[tuple[str, str, dict]]):
+        if self.absmax is None:
+            self.absmax = np.zeros(vectors.shape[1], dtype=np.float32)
+            self.total = np.zeros(vectors.shape[1], dtype=np.float64)
+        np.maximum(self.absmax, np.abs(vectors).max(axis=0), out=self.absmax)
+        self.total += vectors.sum(axis=0)
+        self.rows += len(vectors)
+        self._vectors.append(vectors)
+        self._chunks += chunks
+        if len(self._chunks) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self._chunks:
+            return
+        base = os.path.join(self.directory, SHARD_FORMAT.format(len(self.shards)))
+        np.save(base + ".npy", np.concatenate(self._vectors))
+        with open(base + ".jsonl", "w", encoding="utf-8") as f:
+            for doc_id, text, meta in self._chunks:
+                f.write(json.dumps([doc_id, text, meta], ensure_ascii=False) + "\n")
+        self.shards.append(base)
+        self._vectors, self._chunks = [], []
+
+
+def _write_json_list(f, shards: list[str], field: int):
+    f.write("[")
+    first = True
+    for base in shards:
+        with open(base + ".jsonl", "r", encoding="utf-8") as src:
+            for line in src:
+                f.write(("" if first else ",") + json.dumps(json.loads(line)[field], ensure_ascii=False))
+                first = False
+    f.write("]")
+
+
+def merge_shards(writer: ShardWriter, directory: str, mode: str = "int8", embedding=None):
+    """Write the shards as a QuantizedVectorStore directory (see QuantizedVectorStore.load)."""
+    os.makedirs(directory, exist_ok=True)
+    dim = len(writer.absmax)
+    vectors = np.lib.format.open_memmap(os.path.join(directory, "vectors.f32.npy"), mode="w+",
+                                        dtype=np.float32, shape=(writer.rows, dim))
+    scale = quantiser_scale(mode, writer.absmax, writer.total / max(writer.rows, 1))
+    codes = None
+    if scale is not None:
+        width = dim if mode == "int8" else (dim + 7) // 8
+        codes = np.lib.format.open_memmap(os.path.join(directory, f"codes.{mode}.npy"), mode="w+",
+                                          dtype=np.int8 if mode == "int8" else np.uint8, shape=(writer.rows, width))
+        np.save(os.path.join(directory, "scale.npy"), scale)
+
+    start = 0
+    for base in writer.shards:
+        block = np.load(base + ".npy")
+        vectors[start:start + len(block)] = block
+        if codes is not None:
+            codes[start:start + len(block)] = quantise_block(block, mode, scale)
+        start += len(block)
+    vectors.flush()
+    if codes is not None:
+        codes.flush()
+    del vectors, codes
+
+    with open(os.path.join(directory, "docs.json"), "w", encoding="utf-8") as f:
+        f.write(json.dumps({"mode": mode, "oversample": OVERSAMPLE[mode]})[:-1])
+        for field, name in enumerate(("ids", "texts", "metadatas")):
+            f.write(f', "{name}": ')
+            _write_json_list(f, writer.shards, field)
+        f.write("}")
+    if embedding is not None:
+        QuantizedVectorStore.save_embedding(directory, embedding)
+
+
+# --------------------- Build ---------------------
+def build_index(data_path, output_dir: str, embeddings, chunk_size: int = 1000, chunk_overlap: int = 200,
+                workers: int | None = None, docs_per_task: int = 64, embed_batch: int = 256,
+                shard_size: int = 20_000, mode: str = "int8", keep_shards: bool = False) -> dict:
+    """
+    Stream documents under `data_path` into a QuantizedVectorStore at `output_dir`.
+    Shards go to `<output_dir>.shards/` and are removed after the merge unless
+    `keep_shards`. Returns counts and timings.
+    """
+    t0 = time.perf_counter()
+    shard_dir = output_dir.rstrip("/") + ".shards"
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    writer = ShardWriter(shard_dir, shard_size)
+    n_docs = 0
+
+    def counted(docs):
+        nonlocal n_docs
+        for doc in docs:
+            n_docs += 1
+            yield doc
+
+    chunks = iter_chunks(counted(iter_documents(data_path)), chunk_size, chunk_overlap, workers, docs_per_task)
+    for batch in _batched(chunks, embed_batch):
+        with tracer.span("index.embed"):
+            vectors = np.asarray(embeddings.embed_documents([text for _, text, _ in batch]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        writer.add(vectors, batch)
+    writer.flush()
+    if not writer.rows:
+        raise ValueError(f"No chunks produced from {data_path}")
+
+    with tracer.span("index.merge"):
+        merge_shards(writer, output_dir, mode, embeddings)
+    if not keep_shards:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    return {"documents": n_docs, "chunks": writer.rows, "shards": len(writer.shards),
+            "seconds": time.perf_counter() - t0}
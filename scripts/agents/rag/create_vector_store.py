@@ -99,14 +99,35 @@ class HFEmbeddings(Embeddings):
 # Main
 # =======================
 if __name__ == "__main__":
-    embeddings = HFEmbeddings()
-
-    # Load local JSON and build index
-    base_docs = load_json_docs(DATA_PATH)
-    vector_store = build_vector_store(base_docs, embeddings)
-
-    # Save to disk
-    with open("data/commentary/vector_store.pkl", "wb") as f:
-        pickle.dump(vector_store, f)
-    print("Vector store saved!")
+    # Run as a module: python -m scripts.agents.rag.create_vector_store
+    import argparse
+    from .build_index import build_index
+    from .quantized import QuantizedVectorStore
+
+    ap = argparse.ArgumentParser(description="Build the RAG vector store from local JSON documents.")
+    ap.add_argument("--data", default=str(DATA_PATH), help="JSON / JSONL file or directory")
+    ap.add_argument("--output", default="data/commentary/vector_store_q", help="QuantizedVectorStore directory")
+    ap.add_argument("--pickle", help="also write an InMemoryVectorStore pickle here (loads it all into memory)")
+    ap.add_argument("--mode", default="int8", choices=["int8", "binary", "float32"])
+    ap.add_argument("--workers", type=int, help="chunking processes (default: CPU count, 0 = in-process)")
+    ap.add_argument("--embed-batch", type=int, default=256)
+    ap.add_argument("--shard-size", type=int, default=20_000)
+    ap.add_argument("--one-shot", action="store_true", help="original in-memory build straight to --pickle")
+    args = ap.parse_args()
 
+    embeddings = HFEmbeddings()
+    if args.one_shot:
+        vector_store = build_vector_store(load_json_docs(Path(args.data)), embeddings)
+        with open(args.pickle or "data/commentary/vector_store.pkl", "wb") as f:
+            pickle.dump(vector_store, f)
+        print("Vector store saved!")
+    else:
+        stats = build_index(Path(args.data), args.output, embeddings, chunk_size=CHUNK_SIZE,
+                            chunk_overlap=CHUNK_OVERLAP, workers=args.workers, embed_batch=args.embed_batch,
+                            shard_size=args.shard_size, mode=args.mode)
+        print(f"Indexed {stats['documents']} documents as {stats['chunks']} chunks "
+              f"({stats['shards']} shards) in {stats['seconds']:.1f}s -> {args.output}")
+        if args.pickle:
+            with open(args.pickle, "wb") as f:
+                pickle.dump(QuantizedVectorStore.load(args.output, embedding=embeddings).to_in_memory(), f)
+            print(f"Vector store saved to {args.pickle}")
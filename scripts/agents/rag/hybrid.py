@@ -0,0 +1,172 @@
+"""
+Hybrid BM25 + dense retrieval over the chunks of an InMemoryVectorStore.
+
+MiniLM embeddings handle paraphrase well but rank rare proper nouns
+("TSUNODA", "Marina Bay") poorly. BM25 handles exactly those, so both rankings
+are fused with reciprocal rank fusion (RRF):
+
+    score(d) = sum over rankers of 1 / (rrf_k + rank(d))
+
+The BM25 index keeps its postings compressed: per term, the delta-encoded doc
+ids followed by the term frequencies, both as LEB128 varints in one shared
+byte buffer, decoded with NumPy at query time.
+
+    retriever = HybridRetriever.from_vector_store(vector_store, k=4)
+    docs = retriever.invoke("Tsunoda at Marina Bay")
+"""
+import re
+import unicodedata
+
+import numpy as np
+from pydantic import ConfigDict
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from ..tracing import tracer
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased, accent-stripped word tokens ("Pérez" -> "perez")."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN.findall(text.lower())
+
+
+# --------------------- Varint coding ---------------------
+def encode_varints(values, out: bytearray):
+    for v in values:
+        while v >= 0x80:
+            out.append((v & 0x7F) | 0x80)
+            v >>= 7
+        out.append(v)
+
+
+def decode_varints(buf: np.ndarray) -> np.ndarray:
+    """Vectorised LEB128 decode of a uint8 array holding whole varints."""
+    last = buf < 0x80
+    ends = np.flatnonzero(last)
+    group = np.concatenate(([0], np.cumsum(last[:-1])))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = 7 * (np.arange(len(buf)) - starts[group])
+    parts = (buf & 0x7F).astype(np.int64) << shift
+    return np.bincount(group, weights=parts, minlength=len(ends)).astype(np.int64)
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts, with varint-compressed postings."""
+
+    def __init__(self, texts: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        postings: dict[str, dict[int, int]] = {}
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[doc_id] = len(tokens)
+            for tok in tokens:
+                tf = postings.setdefault(tok, {})
+                tf[doc_id] = tf.get(doc_id, 0) + 1
+
+        self.n_docs = len(texts)
+        self.doc_len = doc_len
+        self.avg_len = float(doc_len.mean()) if len(texts) else 0.0
+        self.vocab = {term: i for i, term in enumerate(sorted(postings))}
+        self.df = np.zeros(len(self.vocab), dtype=np.int32)
+        self.offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        buf = bytearray()
+        for term, i in self.vocab.items():
+            docs = sorted(postings[term])
+            deltas = np.diff(np.asarray(docs), prepend=0)
+            encode_varints(deltas.tolist(), buf)
+            encode_varints((postings[term][d] for d in docs), buf)
+            self.df[i] = len(docs)
+            self.offsets[i + 1] = len(buf)
+        self.postings = np.frombuffer(bytes(buf), dtype=np.uint8)
+        self.idf = np.log1p((self.n_docs - self.df + 0.5) / (self.df + 0.5)).astype(np.float32)
+        # Length normalisation is per doc, so precompute it once.
+        self._norm = (k1 * (1 - b + b * doc_len / max(self.avg_len, 1e-9))).astype(np.float32)
+
+    def postings_for(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        i = self.vocab.get(term)
+        if i is None:
+            return None
+        values = decode_varints(self.postings[self.offsets[i]:self.offsets[i + 1]])
+        n = self.df[i]
+        return np.cumsum(values[:n]), values[n:]
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            hit = self.postings_for(term)
+            if hit is None:
+                continue
+            docs, tf = hit
+            tf = tf.astype(np.float32)
+            scores[docs] += self.idf[self.vocab[term]] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return scores
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        scores = self.scores(query)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+    @property
+    def nbytes(self) -> int:
+        return self.postings.nbytes + self.offsets.nbytes + self.df.nbytes + self.doc_len.nbytes
+
+
+def reciprocal_rank_fusion(rankings: list[list], rrf_k: int = 60, weights: list[float] | None = None) -> list:
+    """Fuse ranked lists of ids; returns ids by descending fused score."""
+    weights = weights or [1.0] * len(rankings)
+    fused: dict = {}
+    for ranking, w in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + w / (rrf_k + rank)
+    return sorted(fused, key=fused.__getitem__, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """LangChain retriever fusing BM25 and dense similarity over the same chunks."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: object
+    bm25: BM25Index
+    ids: list
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    sparse_weight: float = 1.0
+
+    @classmethod
+    def from_vector_store(cls, vector_store, **kwargs) -> "HybridRetriever":
+        """Index the store's chunks (InMemoryVectorStore.store) for BM25."""
+        with tracer.span("rag.bm25_build"):
+            ids = list(vector_store.store)
+            bm25 = BM25Index([vector_store.store[i]["text"] for i in ids])
+        return cls(vector_store=vector_store, bm25=bm25, ids=ids, **kwargs)
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        with tracer.span("rag.retrieve.dense"):
+            dense = self.vector_store.similarity_search_with_score(query, k=self.fetch_k)
+        with tracer.span("rag.retrieve.bm25"):
+            sparse = self.bm25.search(query, self.fetch_k)
+
+        docs = {doc.id: doc for doc, _ in dense}
+        for i, _ in sparse:
+            doc_id = self.ids[i]
+            if doc_id not in docs:
+                item = self.vector_store.store[doc_id]
+                docs[doc_id] = Document(id=doc_id, page_content=item["text"], metadata=item["metadata"])
+        fused = reciprocal_rank_fusion(
+            [[doc.id for doc, _ in dense], [self.ids[i] for i, _ in sparse]],
+            rrf_k=self.rrf_k, weights=[self.dense_weight, self.sparse_weight],
+        )
+        return [docs[doc_id] for doc_id in fused[:self.k]]
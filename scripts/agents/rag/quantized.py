@@ -0,0 +1,244 @@
+"""
+Vector store with int8 / binary quantised embeddings and exact re-ranking.
+
+The pickled InMemoryVectorStore keeps each embedding as a Python list of
+floats (~32 bytes per dimension once boxed). Here the searchable copy is
+either
+  - int8: per-dimension symmetric scale, 1 byte per dimension, or
+  - binary: sign bits (around the per-dimension mean) packed 8 per byte,
+    scored by Hamming distance,
+and the top `k * oversample` candidates are re-ranked exactly against
+float32 vectors kept in a memory-mapped .npy file. Only the candidate rows
+are read from it.
+
+    store = QuantizedVectorStore.from_in_memory(pickled_store, mode="int8")
+    store.save("data/commentary/vector_store_q")
+    store = QuantizedVectorStore.load("data/commentary/vector_store_q")
+
+It is a LangChain VectorStore, and it exposes `.store` / `.embedding` like
+InMemoryVectorStore, so HybridRetriever and DriverContextCache work on it too.
+"""
+import os
+import json
+import pickle
+import uuid
+from collections.abc import Mapping
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# Set bits per byte value, for Hamming distance on packed codes.
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+BLOCK_ROWS = 16384
+OVERSAMPLE = {"int8": 8, "binary": 32, "float32": 1}
+
+
+def _normalise(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def quantiser_scale(mode: str, absmax: np.ndarray, mean: np.ndarray) -> np.ndarray | None:
+    """
+    Per-dimension parameters from column statistics, so they can be accumulated
+    over shards without holding every vector at once.
+    """
+    if mode == "int8":
+        return np.maximum(absmax, 1e-12).astype(np.float32) / 127.0
+    if mode == "binary":
+        # Sentence embeddings aren't zero-centred; take signs around the mean
+        # so each bit splits the corpus roughly in half.
+        return np.asarray(mean, dtype=np.float32)
+    return None
+
+
+def quantise_block(vectors: np.ndarray, mode: str, scale: np.ndarray) -> np.ndarray:
+    if mode == "int8":
+        return np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+    return np.packbits(vectors > scale, axis=1)
+
+
+class _StoreView(Mapping):
+    """Read-only {id: {"id", "text", "metadata"}} view matching InMemoryVectorStore.store."""
+
+    def __init__(self, owner: "QuantizedVectorStore"):
+        self._owner = owner
+
+    def __getitem__(self, doc_id):
+        i = self._owner._index[doc_id]
+        return {"id": doc_id, "text": self._owner.texts[i], "metadata": self._owner.metadatas[i]}
+
+    def __iter__(self):
+        return iter(self._owner.ids)
+
+    def __len__(self):
+        return len(self._owner.ids)
+
+
+class QuantizedVectorStore(VectorStore):
+    def __init__(self, embedding, vectors: np.ndarray, texts: list[str], metadatas: list[dict],
+                 ids: list[str], mode: str = "int8", oversample: int | None = None,
+                 codes: np.ndarray | None = None, scale: np.ndarray | None = None):
+        if mode not in ("int8", "binary", "float32"):
+            raise ValueError(f"Unknown quantisation mode: {mode}")
+        self.embedding = embedding
+        self.mode = mode
+        # Binary codes rank more coarsely, so they need a wider candidate pool.
+        self.oversample = oversample or OVERSAMPLE[mode]
+        self.texts = texts
+        self.metadatas = metadatas
+        self.ids = ids
+        self._index = {doc_id: i for i, doc_id in enumerate(ids)}
+        self.vectors = vectors  # float32, unit length; may be a read-only memmap
+        self.codes, self.scale = codes, scale
+        if codes is None and len(ids):
+            self._quantise()
+
+    # --------------------- Quantisation ---------------------
+    def _quantise(self):
+        if self.mode == "float32":
+            self.scale = self.codes = None
+            return
+        vectors = np.asarray(self.vectors)
+        self.scale = quantiser_scale(self.mode, np.abs(vectors).max(axis=0), vectors.mean(axis=0))
+        self.codes = quantise_block(vectors, self.mode, self.scale)
+
+    def _approx_scores(self, q: np.ndarray) -> np.ndarray:
+        n = len(self.ids)
+        if self.mode == "binary":
+            qbits = np.packbits(q > self.scale)
+            dist = np.empty(n, dtype=np.int32)
+            for start in range(0, n, BLOCK_ROWS):
+                block = self.codes[start:start + BLOCK_ROWS]
+                dist[start:start + len(block)] = POPCOUNT[block ^ qbits].sum(axis=1, dtype=np.int32)
+            return -dist.astype(np.float32)
+        # int8: dot(q, codes * scale) == dot(q * scale, codes); upcast block by block.
+        qs = (q * self.scale).astype(np.float32)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, BLOCK_ROWS):
+            block = self.codes[start:start + BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ qs
+        return scores
+
+    def _search(self, embedding, k: int) -> list[tuple[int, float]]:
+        n = len(self.ids)
+        if n == 0:
+            return []
+        q = _normalise(np.asarray(embedding, dtype=np.float32))
+        k = min(k, n)
+        if self.mode == "float32":
+            candidates = np.arange(n)
+        else:
+            approx = self._approx_scores(q)
+            m = min(n, k * self.oversample)
+            candidates = np.sort(np.argpartition(-approx, m - 1)[:m])
+        # Exact cosine on the candidates only (sorted rows keep memmap reads sequential).
+        exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ q
+        order = np.argsort(-exact, kind="stable")[:k]
+        return [(int(candidates[i]), float(exact[i])) for i in order]
+
+    # --------------------- VectorStore API ---------------------
+    @property
+    def store(self) -> Mapping:
+        return _StoreView(self)
+
+    def _doc(self, i: int) -> Document:
+        return Document(id=self.ids[i], page_content=self.texts[i], metadata=self.metadatas[i])
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, **kwargs):
+        return [(self._doc(i), score) for i, score in self._search(embedding, k)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs) -> list[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        new = _normalise(np.asarray(self.embedding.embed_documents(texts), dtype=np.float32))
+        self.vectors = np.vstack([np.asarray(self.vectors), new]) if len(self.ids) else new
+        self.texts += texts
+        self.metadatas += list(metadatas)
+        for doc_id in ids:
+            self._index[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+        self._quantise()
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, mode: str = "int8", **kwargs):
+        store = cls(embedding, np.zeros((0, 0), dtype=np.float32), [], [], [], mode=mode, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    @classmethod
+    def from_in_memory(cls, store, mode: str = "int8", **kwargs) -> "QuantizedVectorStore":
+        """Convert a (pickled) InMemoryVectorStore without re-embedding anything."""
+        items = list(store.store.values())
+        vectors = _normalise(np.asarray([item["vector"] for item in items], dtype=np.float32))
+        return cls(store.embedding, vectors, [item["text"] for item in items],
+                   [item["metadata"] for item in items], [item["id"] for item in items], mode=mode, **kwargs)
+
+    def to_in_memory(self):
+        """The equivalent InMemoryVectorStore, for code that still expects the pickle."""
+        from langchain_core.vectorstores import InMemoryVectorStore
+
+        store = InMemoryVectorStore(self.embedding)
+        for i, doc_id in enumerate(self.ids):
+            store.store[doc_id] = {"id": doc_id, "vector": np.asarray(self.vectors[i]).tolist(),
+                                   "text": self.texts[i], "metadata": self.metadatas[i]}
+        return store
+
+    # --------------------- Persistence ---------------------
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "vectors.f32.npy"), np.asarray(self.vectors, dtype=np.float32))
+        if self.codes is not None:
+            np.save(os.path.join(directory, f"codes.{self.mode}.npy"), self.codes)
+        if self.scale is not None:
+            np.save(os.path.join(directory, "scale.npy"), self.scale)
+        with open(os.path.join(directory, "docs.json"), "w", encoding="utf-8") as f:
+            json.dump({"mode": self.mode, "oversample": self.oversample, "ids": self.ids,
+                       "texts": self.texts, "metadatas": self.metadatas}, f, ensure_ascii=False)
+        if self.embedding is not None:
+            self.save_embedding(directory, self.embedding)
+
+    @staticmethod
+    def save_embedding(directory: str, embedding):
+        with open(os.path.join(directory, "embedding.pkl"), "wb") as f:
+            pickle.dump(embedding, f)
+
+    @classmethod
+    def load(cls, directory: str, embedding=None, mode: str | None = None) -> "QuantizedVectorStore":
+        """
+        Load the codes into RAM and memory-map the float32 vectors. Asking for another
+        `mode` than the one saved re-quantises (reading every vector once).
+        """
+        with open(os.path.join(directory, "docs.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if embedding is None and os.path.exists(os.path.join(directory, "embedding.pkl")):
+            with open(os.path.join(directory, "embedding.pkl"), "rb") as f:
+                embedding = pickle.load(f)
+        mode = mode or meta["mode"]
+        vectors = np.load(os.path.join(directory, "vectors.f32.npy"), mmap_mode="r")
+        codes = scale = None
+        codes_path = os.path.join(directory, f"codes.{mode}.npy")
+        if mode == meta["mode"] and os.path.exists(codes_path):
+            codes = np.load(codes_path)
+            scale = np.load(os.path.join(directory, "scale.npy"))
+        return cls(embedding, vectors, meta["texts"], meta["metadatas"], meta["ids"],
+                   mode=mode, oversample=meta["oversample"] if mode == meta["mode"] else None,
+                   codes=codes, scale=scale)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in RAM for search (codes + scale), excluding the memory-mapped float32 copy."""
+        total = self.codes.nbytes if self.codes is not None else np.asarray(self.vectors).nbytes
+        return total + (self.scale.nbytes if self.scale is not None else 0)
@@ -0,0 +1,227 @@
+import time
+import heapq
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import wraps
+
+from .tracing import tracer
+
+
+class FairLimiter:
+    """
+    Global cap on in-flight model calls shared by every race in the process.
+
+    When all slots are busy, waiters are queued per race and freed slots are
+    handed out round-robin across races, so one race with a backlog of
+    catch-up buckets can't starve the others.
+    """
+
+    def __init__(self, max_concurrency: int):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.max_concurrency = max_concurrency
+        self._free = max_concurrency
+        self._lock = threading.Lock()
+        self._waiters: "OrderedDict[str, deque[threading.Event]]" = OrderedDict()
+
+    def acquire(self, race_id: str):
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            ready = threading.Event()
+            self._waiters.setdefault(race_id, deque()).append(ready)
+        ready.wait()
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._free += 1
+                return
+            # Hand the slot straight to the next race in line, then move that
+            # race to the back of the rotation.
+            race_id, queue = self._waiters.popitem(last=False)
+            ready = queue.popleft()
+            if queue:
+                self._waiters[race_id] = queue
+        ready.set()
+
+    @contextmanager
+    def slot(self, race_id: str):
+        self.acquire(race_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def wrap(self, fn, race_id: str):
+        """Wrap a LangGraph node (or any callable) so each call holds one slot."""
+        @wraps(fn)
+        def limited(*args, **kwargs):
+            with self.slot(race_id):
+                return fn(*args, **kwargs)
+        return limited
+
+    def stats(self) -> dict:
+        with self._lock:
+            waiting = {race_id: len(q) for race_id, q in self._waiters.items()}
+            return {
+                "in_flight": self.max_concurrency - self._free,
+                "waiting": waiting,
+            }
+
+
+class RateLimiter:
+    """
+    Token bucket shared across threads: at most `rate` calls per second on
+    average, with bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def wrap(self, fn):
+        @wraps(fn)
+        def limited(*args, **kwargs):
+            self.acquire()
+            return fn(*args, **kwargs)
+        return limited
+
+
+class Cancelled(Exception):
+    """The job was preempted by higher-priority work."""
+
+
+class Expired(Exception):
+    """The job's deadline passed before it could start."""
+
+
+class _Job:
+    __slots__ = ("priority", "deadline", "seq", "fn", "label", "future", "cancel", "queued")
+
+    def __init__(self, priority, deadline, seq, fn, label):
+        self.priority = priority
+        self.deadline = deadline
+        self.seq = seq
+        self.fn = fn
+        self.label = label
+        self.future = Future()
+        self.cancel = threading.Event()
+        self.queued = time.monotonic()
+
+    def sort_key(self):
+        # Highest priority first, then earliest deadline, then FIFO.
+        return (-self.priority, self.deadline, self.seq)
+
+
+class PriorityStage:
+    """
+    Worker pool for one pipeline stage (LLM, TTS, playout) ordered by priority.
+
+    `submit(fn, priority, deadline)` queues `fn(cancel)`, where `cancel` is a
+    threading.Event the job should poll (e.g. between stream chunks) and stop on.
+    Jobs still queued at their deadline (time.monotonic() seconds) fail with
+    Expired instead of running. When every worker is busy, a job that outranks
+    the lowest-priority running one by `preempt_margin` sets that job's cancel
+    event. Jobs that stop on it raise Cancelled; a job that still returns keeps its
+    result, unless `discard_cancelled` (for jobs that can't be interrupted, like an
+    LLM call, whose late result is no longer wanted).
+    """
+
+    def __init__(self, name: str, workers: int = 1, preempt_margin: int | None = 20,
+                 discard_cancelled: bool = False):
+        self.name = name
+        self.workers = workers
+        self.preempt_margin = preempt_margin
+        self.discard_cancelled = discard_cancelled
+        self._heap: list = []
+        self._running: set[_Job] = set()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.counts = {"completed": 0, "failed": 0, "expired": 0, "preempted": 0}
+        self._threads = [threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn, priority: int, deadline: float = float("inf"), label: str = "") -> Future:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Stage {self.name} is closed")
+            self._seq += 1
+            job = _Job(priority, deadline, self._seq, fn, label)
+            heapq.heappush(self._heap, (job.sort_key(), job))
+            if self.preempt_margin is not None and len(self._running) >= self.workers:
+                victim = min(self._running, key=lambda j: j.priority, default=None)
+                if victim is not None and not victim.cancel.is_set() \
+                        and priority >= victim.priority + self.preempt_margin:
+                    victim.cancel.set()
+            self._cond.notify()
+        return job.future
+
+    def _next(self) -> _Job | None:
+        with self._cond:
+            while True:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return None
+                _, job = heapq.heappop(self._heap)
+                if time.monotonic() > job.deadline:
+                    self.counts["expired"] += 1
+                    job.future.set_exception(Expired(job.label))
+                    continue
+                self._running.add(job)
+                return job
+
+    def _worker(self):
+        while (job := self._next()) is not None:
+            tracer.observe(f"{self.name}.queue_wait", time.monotonic() - job.queued)
+            outcome = "completed"
+            try:
+                result = job.fn(job.cancel)
+                if self.discard_cancelled and job.cancel.is_set():
+                    raise Cancelled(job.label)
+                job.future.set_result(result)
+            except Cancelled as exc:
+                outcome = "preempted"
+                job.future.set_exception(exc)
+            except BaseException as exc:
+                outcome = "failed"
+                job.future.set_exception(exc)
+            with self._cond:
+                self._running.discard(job)
+                self.counts[outcome] += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self.counts, "queued": len(self._heap), "running": len(self._running)}
+
+    def close(self, wait: bool = True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
@@ -0,0 +1,246 @@
+"""
+Host many independent race commentary pipelines in one process.
+
+    python -m scripts.agents.server races.json --max-concurrency 8
+
+`races.json` is a list of races:
+
+    [
+      {
+        "race_id": "sgp-2024",
+        "meeting": {"meeting_name": "FORMULA 1 SINGAPORE AIRLINES SINGAPORE GRAND PRIX 2024",
+                    "starting_time": "12:00:00"},
+        "events_path": "data/open_f1/events_5s_indexed.json",
+        "drivers_path": "data/open_f1/drivers.json",
+        "output_dir": "data/commentary/races/sgp-2024",
+        "state_dir": "data/commentary/races/sgp-2024/state",
+        "context_path": "data/commentary/context_cache.json",
+        "phrase_units": "data/commentary/phrase_units",
+        "max_buckets": 12,
+        "priority": true,
+        "max_lag": 10.0,
+        "speedup": 1.0,
+        "playout": false
+      }
+    ]
+
+Every race gets its own graph, state journal and output directory, and resumes
+from its journal if it was interrupted. The LLM/TTS clients, the vector store
+(with its embedding model) and a global FairLimiter on TTS/intro calls are
+shared. Commentary LLM calls go through one LLMDispatcher, which adapts its
+concurrency to the endpoint and hedges slow requests.
+
+With `"priority": true` (or `--priority` for every race) a race's buckets go
+through priority.PriorityCommentary instead of one at a time: they arrive on
+the race clock (`speedup`), high-priority ones (overtakes for the lead) jump
+ahead of and preempt filler, and lines later than `max_lag` seconds are dropped.
+`"playout": true` also plays each line (ffplay) and lets preemption stop it.
+Stitched callouts are only rendered on the sequential path.
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from .commentary import (
+    clone_voice_node, intro_bot, F1RacePredictor, load_vector_store,
+)
+from .commentary.context import DriverContextCache, CONTEXT_CACHE_PATH
+from .commentary.tts_cache import TTSCache, TTS_CACHE_DIR
+from .commentary.stitch import PhraseBank, Callouts
+from .commentary.llm import BOSON_API_KEY, BASE_URL, LLM_MODEL, VECTOR_STORE_PATH, DRIVERS_PATH
+from .dispatcher import LLMDispatcher
+from .graph import build_app, load_buckets, load_drivers, run_commentary, EVENTS_PATH, MAX_BUCKETS
+from .journal import CommentaryJournal
+from .priority import PriorityCommentary, run_prioritised, play_wav
+from .race_state import RaceState
+from .scheduling import FairLimiter
+from .tracing import tracer
+
+load_dotenv()
+
+
+class SharedResources:
+    """Clients and indexes shared by all races. Heavy pieces load lazily, once."""
+
+    def __init__(self, max_connections: int = 32, vector_store_path: str = VECTOR_STORE_PATH,
+                 llm_timeout: float | None = None, tts_cache_bytes: int = 0):
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_connections)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+        self.llm = LLMDispatcher(LLM_MODEL, BOSON_API_KEY, BASE_URL, max_concurrency=max_connections)
+        self.llm_timeout = llm_timeout
+        # Synthesized lines are shared across races: stock phrases recur in every one.
+        self.tts_cache = TTSCache(TTS_CACHE_DIR, tts_cache_bytes) if tts_cache_bytes else None
+
+        self.vector_store_path = vector_store_path
+        self._vector_store = None
+        self._drivers = {}
+        self._contexts = {}
+        self._phrase_banks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def vector_store(self):
+        with self._lock:
+            if self._vector_store is None:
+                self._vector_store = load_vector_store(self.vector_store_path)
+            return self._vector_store
+
+    def drivers(self, path: str) -> list[dict]:
+        with self._lock:
+            if path not in self._drivers:
+                self._drivers[path] = load_drivers(path)
+            return self._drivers[path]
+
+    def context(self, path: str) -> DriverContextCache | None:
+        """Precomputed driver background (see commentary/context.py), if it has been built."""
+        with self._lock:
+            if path not in self._contexts:
+                self._contexts[path] = DriverContextCache.load(path) if os.path.exists(path) else None
+            return self._contexts[path]
+
+    def phrase_bank(self, path: str) -> PhraseBank | None:
+        """Pre-synthesized callout units (see commentary/stitch.py), if they have been built."""
+        with self._lock:
+            if path not in self._phrase_banks:
+                exists = os.path.exists(os.path.join(path, "index.json"))
+                self._phrase_banks[path] = PhraseBank.load(path) if exists else None
+            return self._phrase_banks[path]
+
+
+class CommentaryServer:
+    def __init__(self, max_concurrency: int = 4, max_races: int = 16,
+                 resources: SharedResources | None = None, llm_timeout: float | None = None,
+                 tts_cache_bytes: int = 0, priority: bool = False):
+        self.priority = priority
+        self.resources = resources or SharedResources(max_connections=max_concurrency * 2,
+                                                      llm_timeout=llm_timeout, tts_cache_bytes=tts_cache_bytes)
+        self.limiter = FairLimiter(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=max_races, thread_name_prefix="race")
+        self.races: dict[str, Future] = {}
+
+    def submit(self, race: dict) -> Future:
+        race_id = race["race_id"]
+        if race_id in self.races and not self.races[race_id].done():
+            raise ValueError(f"Race {race_id} is already running")
+        future = self.executor.submit(self._run_race, race)
+        self.races[race_id] = future
+        return future
+
+    def _run_race(self, race: dict):
+        race_id = race["race_id"]
+        res = self.resources
+        output_dir = race.get("output_dir", os.path.join("data/commentary/races", race_id))
+        os.makedirs(output_dir, exist_ok=True)
+
+        # The dispatcher does its own (adaptive, per-race fair) admission for LLM calls.
+        predictor = F1RacePredictor(race["meeting"], llm=res.llm.for_key(race_id, res.llm_timeout, max_tokens=256),
+                                    context=res.context(race.get("context_path", CONTEXT_CACHE_PATH)))
+        tts = partial(clone_voice_node, session=res.http, cache=res.tts_cache)
+        # Load shared pieces outside the limiter so slots are only held for model calls.
+        vector_store = res.vector_store
+        drivers = res.drivers(race.get("drivers_path", DRIVERS_PATH))
+        buckets = load_buckets(race.get("events_path", EVENTS_PATH))
+        bank = res.phrase_bank(race["phrase_units"]) if race.get("phrase_units") else None
+
+        journal = CommentaryJournal(race.get("state_dir", os.path.join(output_dir, "state")))
+        start = time.time()
+        with journal:
+            state = journal.recover()
+            if state is None:
+                with self.limiter.slot(race_id):
+                    state = intro_bot(meeting=race["meeting"], vector_store=vector_store,
+                                      drivers=[d["full_name"] for d in drivers],
+                                      llm=res.llm.for_key(race_id), tts=tts, output_dir=output_dir)
+            if race.get("priority", self.priority):
+                self._run_prioritised(race, state, buckets, journal, RaceState(drivers),
+                                      predictor.invoke, self.limiter.wrap(tts, race_id), output_dir)
+            else:
+                state = run_commentary(
+                    build_app(predictor.invoke, self.limiter.wrap(tts, race_id)), state, buckets, journal,
+                    race_state=RaceState(drivers),
+                    output_dir=output_dir,
+                    max_buckets=race.get("max_buckets", MAX_BUCKETS),
+                    label=f"[{race_id}] ",
+                    callouts=Callouts(bank, drivers) if bank is not None else None,
+                )
+        skipped = state.get("llm_failures", 0)
+        print(f"🏁 [{race_id}] finished in {time.time() - start:.2f} seconds"
+              + (f" ({skipped} lines skipped after LLM errors)" if skipped else ""))
+        return state
+
+    def _run_prioritised(self, race: dict, state: dict, buckets, journal, race_state: RaceState,
+                         llm_node, tts_node, output_dir: str):
+        """Buckets through PriorityCommentary on the race clock; a failed bucket loses only its line."""
+        commentary = PriorityCommentary(llm_node, tts_node,
+                                        play=partial(play_wav, realtime=race.get("playout", False)),
+                                        max_lag=race.get("max_lag", 10.0))
+        try:
+            records = run_prioritised(commentary, state, buckets, journal, race_state=race_state,
+                                      output_dir=output_dir, max_buckets=race.get("max_buckets", MAX_BUCKETS),
+                                      speedup=race.get("speedup", 1.0))
+        finally:
+            commentary.close()
+        outcomes = {}
+        for r in records:
+            outcome = r["outcome"].split(":")[0]
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        print(f"📋 [{race['race_id']}] bucket outcomes: {outcomes}")
+
+    def wait(self):
+        """Block until every submitted race is done; returns {race_id: error or None}."""
+        errors = {}
+        for race_id, future in self.races.items():
+            exc = future.exception()
+            errors[race_id] = exc
+            if exc is not None:
+                print(f"❌ [{race_id}] failed: {exc!r}")
+        return errors
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.resources.http.close()
+        self.resources.llm.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run commentary for many races in one process.")
+    ap.add_argument("races", help="JSON file with a list of race configs")
+    ap.add_argument("--max-concurrency", type=int, default=4, help="global limit on in-flight TTS calls")
+    ap.add_argument("--llm-timeout", type=float, help="give up on a commentary LLM call after this many seconds")
+    ap.add_argument("--max-races", type=int, default=16, help="races running at the same time")
+    ap.add_argument("--tts-cache-mb", type=int, default=512, help="size of the synthesized-audio cache (0 = off)")
+    ap.add_argument("--metrics-port", type=int, help="serve per-stage latency metrics on this port")
+    ap.add_argument("--priority", action="store_true",
+                    help="prioritised, deadline-aware pipeline for races that don't set \"priority\"")
+    args = ap.parse_args()
+    if args.metrics_port:
+        tracer.serve(args.metrics_port)
+
+    with open(args.races, "r", encoding="utf-8") as f:
+        races = json.load(f)
+
+    server = CommentaryServer(max_concurrency=args.max_concurrency, max_races=args.max_races,
+                              llm_timeout=args.llm_timeout, tts_cache_bytes=args.tts_cache_mb * 2**20,
+                              priority=args.priority)
+    start = time.time()
+    for race in races:
+        server.submit(race)
+    errors = server.wait()
+    server.shutdown()
+    print(tracer.report())
+    print(f"LLM dispatcher: {server.resources.llm.stats()}")
+    if server.resources.tts_cache is not None:
+        print(f"TTS cache: {server.resources.tts_cache.stats()}")
+    print(f"Execution time: {time.time() - start:.2f} seconds "
+          f"({sum(e is None for e in errors.values())}/{len(errors)} races ok)")
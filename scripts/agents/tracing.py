@@ -0,0 +1,221 @@
+"""
+Lightweight per-stage latency tracing for the commentary pipeline.
+
+    from .tracing import tracer
+
+    with tracer.span("rag.retrieve"):
+        ...
+    tracer.observe("tts.ttfb", seconds)
+
+Durations go into fixed-bucket histograms (no per-sample storage), which can
+be printed with `tracer.report()`, exported as Prometheus text or JSON, or
+served locally with `tracer.serve(port)` at /metrics and /metrics.json.
+
+Set TRACE_PROFILE to a comma-separated list of stage names (or "*") to run
+those spans under cProfile, or pyinstrument when TRACE_PROFILER=pyinstrument.
+Profiles are written to TRACE_PROFILE_DIR (default "profiles/").
+"""
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds: 1 ms .. 60 s, roughly 2x apart, plus +Inf.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 25.0, 60.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lo = BUCKETS[i - 1] if i > 0 else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else self.max
+                est = lo + (hi - lo) * (rank - seen) / c
+                return min(max(est, self.min), self.max)
+            seen += c
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._hists: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        profile = os.getenv("TRACE_PROFILE", "")
+        self.profile_stages = {s.strip() for s in profile.split(",") if s.strip()}
+        self.profiler = os.getenv("TRACE_PROFILER", "cprofile")
+        self.profile_dir = os.getenv("TRACE_PROFILE_DIR", "profiles")
+        self._profile_seq = 0
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._hists.get(name)
+            if hist is None:
+                hist = self._hists[name] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        if name in self.profile_stages or "*" in self.profile_stages:
+            with self._profiled(name):
+                start = time.perf_counter()
+                try:
+                    yield
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def traced(self, name: str):
+        """Decorator form of `span`."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def _profiled(self, name: str):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with self._lock:
+            self._profile_seq += 1
+            seq = self._profile_seq
+        base = os.path.join(self.profile_dir, f"{name}-{seq:05d}")
+        if self.profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                Profiler = None
+            if Profiler is not None:
+                profiler = Profiler()
+                profiler.start()
+                try:
+                    yield
+                finally:
+                    profiler.stop()
+                    with open(base + ".html", "w", encoding="utf-8") as f:
+                        f.write(profiler.output_html())
+                return
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(base + ".prof")
+
+    # --------------------- Export ---------------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: h.to_dict() for name, h in sorted(self._hists.items())}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, metric: str = "commentary_stage_seconds") -> str:
+        lines = [f"# HELP {metric} Latency of commentary pipeline stages.",
+                 f"# TYPE {metric} histogram"]
+        with self._lock:
+            for name, h in sorted(self._hists.items()):
+                cumulative = 0
+                for bound, c in zip(BUCKETS + (float("inf"),), h.counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {h.sum}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> str:
+        rows = [f"{'stage':<22}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"]
+        for name, s in self.snapshot().items():
+            rows.append(f"{name:<22}{s['count']:>7}" + "".join(
+                f"{s[k] * 1e3:>8.1f}ms" for k in ("mean", "p50", "p95", "p99", "max")))
+        return "\n".join(rows)
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, ctype = tracer.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, ctype = tracer.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+        print(f"📈 Metrics at http://{host}:{port}/metrics")
+        return server
+
+
+tracer = Tracer(enabled=os.getenv("TRACE_DISABLED", "") == "")
@@ -1,34 +1,227 @@
-import os, openai
+"""
+Clip analysis with the Omni video model, for a whole race.
+
+    python -m scripts.analyse_video race.mp4 --events data/open_f1/events_5s_indexed.json
+    python -m scripts.analyse_video race.mp4 --events ... --stub   # no API calls
+    python -m scripts.analyse_video --clip clips/clip_00135.mp4
+
+The video is cut into one clip per 5 s event bucket (split_video.split_video_buckets),
+clips are analysed concurrently under a request-rate limit, and each insight
+is appended to its bucket as a "video" event, so it reaches the commentary
+prompt like any other event description. Results are cached on disk by clip
+content hash (plus model and prompt), so re-runs only pay for new clips.
+"""
+import os
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
 from dotenv import load_dotenv
 
+from scripts.agents.scheduling import RateLimiter
+from scripts.agents.tracing import tracer
+from scripts.video_filter import clip_signature, select_clips, keyframe_times, extract_jpegs
+
 load_dotenv(override=True)
 
-client = openai.Client(api_key=os.getenv("BOSON_API_KEY"),
-                       base_url="https://hackathon.boson.ai/v1")
-
-resp = client.chat.completions.create(
-    model="Qwen3-Omni-30B-A3B-Thinking-Hackathon",
-    messages=[
-        {
-            "role": "system",
-            "content": "You are a AI video commentator"
-        },
-        {
-            "role": "user", 
-            "content": [
-                {"type": "text", "text": "Comment on this video"},
-                {"type": "video_url", "video_url": "https://qianwen-res.oss-cn-beijing.aliyuncs.com/Qwen3-Omni/demo/draw.mp4"}
-            ]
-        },
-        {
-            "role": "user", 
-            "content": [
-                {"type": "text", "text": "Summarize what the video shows."},
-                {"type": "video", "video": "/Users/naveent/Desktop/f1-live-commentator/clips/clip_135.mp4"}
-            ]
-        }
-    ],
-    max_tokens=256,
-    temperature=0.2,
-)
-print(resp.choices[0].message.content)
\ No newline at end of file
+BOSON_BASE_URL = "https://hackathon.boson.ai/v1"
+VIDEO_MODEL = "Qwen3-Omni-30B-A3B-Thinking-Hackathon"
+SYSTEM_PROMPT = "You are a AI video commentator"
+CLIP_PROMPT = ("Summarize what this 5 second Formula 1 clip shows in one sentence: "
+               "overtakes, crashes, pit stops, off-track moments or notable driving.")
+CACHE_DIR = "data/video/cache"
+EVENTS_PATH = "data/open_f1/events_5s_indexed.json"
+OUTPUT_PATH = "data/open_f1/events_5s_video.json"
+
+
+def clip_hash(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+
+def clip_messages(path, prompt=CLIP_PROMPT):
+    """Chat messages carrying the clip inline as a base64 data URL."""
+    with open(path, "rb") as f:
+        data = base64.b64encode(f.read()).decode("ascii")
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": [
+            {"type": "text", "text": prompt},
+            {"type": "video_url", "video_url": {"url": f"data:video/mp4;base64,{data}"}},
+        ]},
+    ]
+
+
+def frame_messages(jpegs, prompt=CLIP_PROMPT):
+    """Chat messages carrying a few keyframes of the clip (in order) instead of the video."""
+    images = [{"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + base64.b64encode(j).decode("ascii")}}
+              for j in jpegs]
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": [{"type": "text", "text": prompt}, *images]},
+    ]
+
+
+class StubVideoClient:
+    """
+    Offline stand-in for `openai.Client` that answers chat.completions.create with a
+    deterministic description of the request, after `latency` seconds.
+    """
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, **kwargs):
+        time.sleep(self.latency)
+        digest = hashlib.sha256(json.dumps(messages).encode()).hexdigest()[:8]
+        text = f"[stub {model}] clip {digest}: cars running in close formation."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class ClipAnalyser:
+    """
+    Concurrent, rate-limited, cached clip analysis.
+
+    Args:
+        client: openai.Client (or StubVideoClient); defaults to the Boson endpoint
+        rate (float): max requests per second, with bursts of `burst`
+        max_concurrency (int): requests in flight at once
+        cache_dir (str): one JSON file per (clip hash, model, prompt); None disables caching
+    """
+
+    def __init__(self, client=None, model=VIDEO_MODEL, prompt=CLIP_PROMPT, cache_dir=CACHE_DIR,
+                 rate=2.0, burst=2, max_concurrency=4, max_tokens=256, temperature=0.2):
+        self.client = client or openai.Client(api_key=os.getenv("BOSON_API_KEY"), base_url=BOSON_BASE_URL)
+        self.model = model
+        self.prompt = prompt
+        self.cache_dir = cache_dir
+        self.limiter = RateLimiter(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.params = {"max_tokens": max_tokens, "temperature": temperature}
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "cache_hits": 0, "uploaded_bytes": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, digest, frames=None):
+        key = f"{self.model}\n{self.prompt}\n{digest}" + (f"\n{frames}" if frames else "")
+        key = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    def analyse(self, path, frames=None):
+        """
+        Insight text for one clip, from the cache or the model. With `frames`
+        (timestamps in seconds), only those frames are sent, as JPEGs.
+        """
+        digest = clip_hash(path)
+        cache_path = self._cache_path(digest, frames) if self.cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            self._count("cache_hits")
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)["text"]
+
+        if frames:
+            jpegs = extract_jpegs(path, frames)
+            messages, size = frame_messages(jpegs, self.prompt), sum(len(j) for j in jpegs)
+        else:
+            messages, size = clip_messages(path, self.prompt), os.path.getsize(path)
+        self.limiter.acquire()
+        with tracer.span("video.analyse"):
+            resp = self.client.chat.completions.create(model=self.model, messages=messages, **self.params)
+        self._count("requests")
+        self._count("uploaded_bytes", size)
+        text = resp.choices[0].message.content.strip()
+        if cache_path:
+            tmp = cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"clip_hash": digest, "model": self.model, "text": text}, f, ensure_ascii=False)
+            os.replace(tmp, cache_path)
+        return text
+
+    def analyse_clips(self, clips):
+        """
+        Set clip["insight"] on every clip dict (from split_video_buckets) whose
+        "forward" flag isn't False, sending clip["frames"] when present; returns the clips.
+        """
+        def run(clip):
+            if clip.get("forward", True):
+                clip["insight"] = self.analyse(clip["path"], clip.get("frames"))
+            return clip
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(run, clips))
+
+
+def join_insights(buckets, clips):
+    """Append each clip's insight to its event bucket as a "video" event (in place)."""
+    for clip in clips:
+        if not clip.get("insight") or clip["bucket"] not in buckets:
+            continue
+        buckets[clip["bucket"]].append({
+            "event_type": "video",
+            "date": clip["bucket"],
+            "event_time": clip["bucket"],
+            "clip": os.path.basename(clip["path"]),
+            "event_description": f"Video: {clip['insight']}",
+        })
+    return buckets
+
+
+if __name__ == "__main__":
+    from scripts.split_video import split_video_buckets
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("video_path", nargs="?")
+    ap.add_argument("--clip", help="analyse a single clip and print the result")
+    ap.add_argument("--events", default=EVENTS_PATH)
+    ap.add_argument("--output", default=OUTPUT_PATH)
+    ap.add_argument("--clips-dir", default="clips")
+    ap.add_argument("--video-start", help="ISO time of the first frame (default: first bucket)")
+    ap.add_argument("--split-workers", type=int, default=4)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--rate", type=float, default=2.0, help="max requests per second")
+    ap.add_argument("--stub", action="store_true", help="use the local stub model")
+    ap.add_argument("--filter", action="store_true", help="only forward scene changes / salient clips")
+    ap.add_argument("--keyframes", type=int, default=0, help="send N keyframes per clip instead of the video")
+    args = ap.parse_args()
+
+    analyser = ClipAnalyser(StubVideoClient() if args.stub else None, rate=args.rate,
+                            max_concurrency=args.concurrency)
+    if args.clip:
+        print(analyser.analyse(args.clip))
+    else:
+        with open(args.events, "r", encoding="utf-8") as f:
+            buckets = json.load(f)
+        start = datetime.fromisoformat(args.video_start or next(iter(buckets)))
+        clips = split_video_buckets(args.video_path, list(buckets), start, args.clips_dir,
+                                    workers=args.split_workers)
+        if args.filter or args.keyframes:
+            with tracer.span("video.signatures"), ThreadPoolExecutor(max_workers=args.split_workers) as pool:
+                signatures = list(pool.map(clip_signature, [c["path"] for c in clips]))
+            decisions = select_clips(signatures) if args.filter else [{"forward": True}] * len(clips)
+            for clip, sig, decision in zip(clips, signatures, decisions):
+                clip["forward"] = decision["forward"]
+                if args.keyframes and decision["forward"]:
+                    clip["frames"] = keyframe_times(sig, args.keyframes)
+        join_insights(buckets, analyser.analyse_clips(clips))
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(buckets, f, indent=2)
+        total = sum(os.path.getsize(c["path"]) for c in clips)
+        print(f"{len(clips)} clips ({total / 1e6:.1f} MB), forwarded {sum(c.get('forward', True) for c in clips)}; "
+              f"{analyser.counts}; events written to {args.output}")
+        print(tracer.report())
@@ -0,0 +1,91 @@
+"""
+Size and load time of the binary bucket format (`.evb`, scripts/agents/event_codec.py)
+against `events_5s_indexed.json`.
+
+Usage:
+    python -m scripts.benchmarks.event_codec
+    python -m scripts.benchmarks.event_codec --events data/open_f1/events_5s_indexed.json --repeat 20
+
+For each format it reports the size on disk (raw and gzipped), the time to load
+every bucket, the time until the first bucket is available and the peak memory
+of a full load. The binary file is written to a temporary directory and checked
+to decode back to exactly the JSON.
+"""
+import os
+import gzip
+import json
+import time
+import tempfile
+import argparse
+import tracemalloc
+
+from scripts.agents.event_codec import write_buckets, iter_buckets
+from scripts.agents.graph import EVENTS_PATH
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def peak_mb(fn) -> float:
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return peak
+
+
+def gzip_size(path: str) -> int:
+    with open(path, "rb") as f:
+        return len(gzip.compress(f.read()))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--events", default=EVENTS_PATH)
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    with open(args.events, "r", encoding="utf-8") as f:
+        buckets = json.load(f)
+    n_events = sum(len(v) for v in buckets.values())
+
+    workdir = tempfile.mkdtemp(prefix="event-codec-")
+    evb_path = os.path.join(workdir, "events.evb")
+    t0 = time.perf_counter()
+    with open(evb_path, "wb") as f:
+        write_buckets(buckets, f)
+    encode_s = time.perf_counter() - t0
+
+    def load_json():
+        with open(args.events, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def first_json():
+        return next(iter(load_json().items()))
+
+    def load_evb():
+        with open(evb_path, "rb") as f:
+            return dict(iter_buckets(f))
+
+    def first_evb():
+        with open(evb_path, "rb") as f:
+            return next(iter_buckets(f))
+
+    if json.dumps(load_evb()) != json.dumps(buckets):
+        raise SystemExit("Round trip mismatch")
+
+    print(f"{len(buckets)} buckets, {n_events} events; encoded in {encode_s * 1e3:.0f}ms (round trip exact)\n")
+    print(f"{'format':<8}{'disk kB':>9}{'gzip kB':>9}{'full load':>11}{'first bucket':>14}{'peak RAM':>10}")
+    for name, path, full, first in (("json", args.events, load_json, first_json),
+                                    ("evb", evb_path, load_evb, first_evb)):
+        print(f"{name:<8}{os.path.getsize(path) / 1e3:>9.0f}{gzip_size(path) / 1e3:>9.0f}"
+              f"{best_of(full, args.repeat) * 1e3:>9.1f}ms{best_of(first, args.repeat) * 1e3:>12.2f}ms"
+              f"{peak_mb(full):>8.1f}MB")
+    os.remove(evb_path)
+    os.rmdir(workdir)
@@ -0,0 +1,222 @@
+"""
+Local mock of the Boson OpenAI-compatible API for offline benchmarks.
+
+Serves POST /chat/completions (with or without a /v1 prefix):
+  - audio requests (`"audio"` in `modalities`) stream a recorded SSE audio
+    response, paced like a real synthesis
+  - everything else returns a recorded chat completion
+
+Recorded chat responses default to the commentary lines saved in
+`data/commentary/input/state_store.json`; audio defaults to an SSE body built
+from the reference clip (see `sse_decode.synthesise_recording`). Latencies are
+drawn from configurable distributions:
+
+    const:0.4            always 0.4 s
+    uniform:0.2,0.8      uniform between 0.2 and 0.8 s
+    normal:0.5,0.1       normal, clipped at 0
+    lognormal:0.5,0.4    lognormal with median 0.5 s and sigma 0.4
+
+With `--max-inflight-chat N`, chat calls beyond N concurrent get a 429 with
+Retry-After, to exercise client-side backoff.
+
+Run standalone with `python -m scripts.benchmarks.mock_server --port 8765`.
+"""
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scripts.benchmarks.sse_decode import synthesise_recording
+
+STATE_STORE_PATH = "data/commentary/input/state_store.json"
+
+
+def parse_latency(spec: str, rng: random.Random | None = None):
+    """Turn a latency spec like 'lognormal:0.5,0.4' into a zero-arg sampler (seconds)."""
+    rng = rng or random.Random(0)
+    kind, _, args = spec.partition(":")
+    params = [float(a) for a in args.split(",") if a]
+    if kind == "const":
+        return lambda: params[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        mu = math.log(params[0])
+        return lambda: rng.lognormvariate(mu, params[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def load_chat_fixtures(path: str = STATE_STORE_PATH) -> list[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["commentator_response"]
+
+
+def split_sse_events(body: bytes) -> list[bytes]:
+    """Split a recorded SSE body into its events (each ending in a blank line)."""
+    return [e + b"\n\n" for e in body.split(b"\n\n") if e.strip()]
+
+
+class MockBoson:
+    """Fixtures, latency samplers and counters shared by the request handlers."""
+
+    def __init__(self, chat_responses: list[str], audio_events: list[bytes],
+                 chat_latency: str = "lognormal:0.6,0.3", tts_ttfb: str = "lognormal:0.4,0.3",
+                 audio_realtime_factor: float = 4.0, audio_seconds: float = 4.0,
+                 chunk_seconds: float = 0.04, max_inflight_chat: int = 0, seed: int = 0):
+        rng = random.Random(seed)
+        self.chat_responses = chat_responses
+        self.chat_latency = parse_latency(chat_latency, rng)
+        self.tts_ttfb = parse_latency(tts_ttfb, rng)
+        # Audio is generated `audio_realtime_factor` times faster than it plays.
+        self.chunk_delay = chunk_seconds / audio_realtime_factor if audio_realtime_factor else 0.0
+        n_chunks = max(1, int(audio_seconds / chunk_seconds))
+        done = [e for e in audio_events if b"[DONE]" in e]
+        self.audio_events = [e for e in audio_events if b"[DONE]" not in e][:n_chunks] + done
+        self._lock = threading.Lock()
+        self._next_chat = 0
+        # Concurrent chat requests beyond this get a 429 (0 = unlimited).
+        self.max_inflight_chat = max_inflight_chat
+        self.inflight_chat = 0
+        self.requests = {"chat": 0, "audio": 0, "throttled": 0}
+
+    def next_chat(self) -> str:
+        with self._lock:
+            text = self.chat_responses[self._next_chat % len(self.chat_responses)]
+            self._next_chat += 1
+            self.requests["chat"] += 1
+            return text
+
+    def admit_chat(self) -> bool:
+        with self._lock:
+            if self.max_inflight_chat and self.inflight_chat >= self.max_inflight_chat:
+                self.requests["throttled"] += 1
+                return False
+            self.inflight_chat += 1
+            return True
+
+    def finish_chat(self):
+        with self._lock:
+            self.inflight_chat -= 1
+
+    def count_audio(self):
+        with self._lock:
+            self.requests["audio"] += 1
+
+
+def make_handler(mock: MockBoson):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive for chat, chunked transfer for audio, like the real endpoint.
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            try:
+                if "audio" in (payload.get("modalities") or []):
+                    self._audio(payload)
+                else:
+                    self._chat(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client gave up (timeout or a cancelled hedge).
+                self.close_connection = True
+
+        def _chat(self, payload):
+            if not mock.admit_chat():
+                body = b'{"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}}'
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Retry-After", "0.2")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            try:
+                time.sleep(mock.chat_latency())
+            finally:
+                mock.finish_chat()
+            text = mock.next_chat()
+            body = json.dumps({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(text.split()), "total_tokens": len(text.split())},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _audio(self, payload):
+            mock.count_audio()
+            time.sleep(mock.tts_ttfb())
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for event in mock.audio_events:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                self.wfile.flush()
+                if mock.chunk_delay:
+                    time.sleep(mock.chunk_delay)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_mock_server(mock: MockBoson, port: int = 0, host: str = "127.0.0.1"):
+    """Start the mock in a daemon thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="mock-boson").start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def load_mock(chat_fixtures: str = STATE_STORE_PATH, recording: str | None = None, **kwargs) -> MockBoson:
+    """Mock backed by recorded chat lines and a recorded (or synthesised) audio SSE body."""
+    if chat_fixtures.endswith("state_store.json"):
+        chat = load_chat_fixtures(chat_fixtures)
+    else:
+        with open(chat_fixtures, "r", encoding="utf-8") as f:
+            chat = json.load(f)
+    if recording:
+        with open(recording, "rb") as f:
+            body = f.read()
+    else:
+        body = synthesise_recording()
+    return MockBoson(chat, split_sse_events(body), **kwargs)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--chat-latency", default="lognormal:0.6,0.3")
+    ap.add_argument("--tts-ttfb", default="lognormal:0.4,0.3")
+    ap.add_argument("--audio-seconds", type=float, default=4.0, help="audio streamed per TTS response")
+    ap.add_argument("--realtime-factor", type=float, default=4.0, help="synthesis speed vs playback (0 = no pacing)")
+    ap.add_argument("--chat-fixtures", default=STATE_STORE_PATH, help="JSON list of responses, or a state_store.json")
+    ap.add_argument("--recording", help="raw SSE audio response body (default: synthesised)")
+    ap.add_argument("--max-inflight-chat", type=int, default=0, help="answer 429 beyond this many chat calls")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    mock = load_mock(args.chat_fixtures, args.recording, chat_latency=args.chat_latency, tts_ttfb=args.tts_ttfb,
+                     audio_realtime_factor=args.realtime_factor, audio_seconds=args.audio_seconds,
+                     max_inflight_chat=args.max_inflight_chat, seed=args.seed)
+    server, url = start_mock_server(mock, args.port)
+    print(f"Mock Boson API at {url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,341 @@
+"""
+End-to-end benchmark of the commentary pipeline against a local mock API.
+
+Replays `events_5s_indexed.json` through the full graph (race state -> LLM ->
+TTS -> journal) with the LLM and TTS pointed at `mock_server.py`, which runs in
+a separate process so its CPU and memory are not charged to the pipeline.
+
+Reports:
+  - throughput (buckets/s) and total wall/CPU time
+  - lag behind race time: when the bucket's commentary audio is done versus
+    when the bucket closed on a race clock running `--speedup` times real time
+  - per stage: calls, wall time, thread CPU time and peak traced memory
+  - the tracer histograms (rag/llm/tts/state spans)
+
+Results are written to `bench_results/pipeline-<commit>.json`; pass
+`--compare <file>` (or `--compare latest`) to print deltas against an earlier run.
+
+Usage:
+    python -m scripts.benchmarks.pipeline --buckets 60 --speedup 4
+    python -m scripts.benchmarks.pipeline --chat-latency const:0.3 --compare latest
+    python -m scripts.benchmarks.pipeline --priority --speedup 4    # prioritised stages + preemption
+"""
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import tempfile
+import argparse
+import resource
+import threading
+import subprocess
+import tracemalloc
+from functools import partial
+from datetime import datetime
+
+import requests
+from langchain_openai import ChatOpenAI
+
+from scripts.agents.graph import build_app, load_buckets, load_drivers, run_commentary, EVENTS_PATH
+from scripts.agents.journal import CommentaryJournal
+from scripts.agents.race_state import RaceState
+from scripts.agents.tracing import tracer, Histogram
+from scripts.agents.dispatcher import LLMDispatcher
+from scripts.agents.commentary import clone_voice_node, F1RacePredictor
+from scripts.agents.commentary.tts_cache import TTSCache
+from scripts.agents.priority import PriorityCommentary, run_prioritised, wav_seconds
+from scripts.agents.scheduling import Cancelled
+from scripts.benchmarks.mock_server import STATE_STORE_PATH, load_chat_fixtures
+
+RESULTS_DIR = "bench_results"
+BUCKET_SECONDS = 5.0
+MEETING = {
+    "meeting_name": "FORMULA 1 SINGAPORE AIRLINES SINGAPORE GRAND PRIX 2024",
+    "starting_time": "12:00:00"
+}
+
+
+class StageMeter:
+    """Wall time, CPU time of the calling thread and peak traced memory per stage."""
+
+    def __init__(self, track_memory: bool):
+        self.track_memory = track_memory
+        self.stages: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, name: str, fn):
+        def wrapper(*args, **kwargs):
+            if self.track_memory:
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            wall0, cpu0 = time.perf_counter(), time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                wall, cpu = time.perf_counter() - wall0, time.thread_time() - cpu0
+                peak = tracemalloc.get_traced_memory()[1] - base if self.track_memory else 0
+                self._record(name, wall, cpu, peak)
+        return wrapper
+
+    def _record(self, name, wall, cpu, peak):
+        with self._lock:
+            s = self.stages.setdefault(name, {"wall": Histogram(), "cpu": 0.0, "peak_mem": 0})
+            s["wall"].observe(wall)
+            s["cpu"] += cpu
+            s["peak_mem"] = max(s["peak_mem"], peak)
+
+    def to_dict(self) -> dict:
+        out = {}
+        for name, s in sorted(self.stages.items()):
+            wall = s["wall"].to_dict()
+            out[name] = {
+                "calls": wall["count"],
+                "wall_mean": wall["mean"],
+                "wall_p95": wall["p95"],
+                "cpu_total": s["cpu"],
+                "cpu_mean": s["cpu"] / wall["count"] if wall["count"] else 0.0,
+                "peak_mem_mb": s["peak_mem"] / 1e6,
+            }
+        return out
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_mock(args) -> tuple[subprocess.Popen, str]:
+    cmd = [sys.executable, "-m", "scripts.benchmarks.mock_server", "--port", str(args.port),
+           "--chat-latency", args.chat_latency, "--tts-ttfb", args.tts_ttfb,
+           "--audio-seconds", str(args.audio_seconds), "--realtime-factor", str(args.realtime_factor),
+           "--chat-fixtures", args.chat_fixtures, "--max-inflight-chat", str(args.max_inflight_chat),
+           "--seed", str(args.seed)]
+    if args.recording:
+        cmd += ["--recording", args.recording]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith("Mock Boson API at "):
+        proc.kill()
+        raise RuntimeError(f"Mock server failed to start: {line!r}")
+    return proc, line.rsplit(" ", 1)[-1].strip()
+
+
+def race_seconds(time_stamp: str) -> float:
+    return datetime.fromisoformat(time_stamp).timestamp()
+
+
+def simulated_playout(path: str, cancel: threading.Event, speedup: float):
+    if speedup and cancel.wait(wav_seconds(path) / speedup):
+        raise Cancelled(path)
+
+
+PRIORITY_TIERS = (("high", 80), ("mid", 40), ("low", 0))
+
+
+def priority_report(records: list[dict], stages: dict) -> dict:
+    """Outcomes and audio lag per priority tier for a --priority run."""
+    tiers = {}
+    for name, floor in PRIORITY_TIERS:
+        tiers[name] = {"buckets": 0, "played": 0, "expired": 0, "preempted": 0, "failed": 0, "lag": Histogram()}
+    for r in records:
+        name = next(n for n, floor in PRIORITY_TIERS if r["priority"] >= floor)
+        tier = tiers[name]
+        tier["buckets"] += 1
+        outcome = r["outcome"] if r["outcome"] in ("played", "expired", "preempted") else "failed"
+        tier[outcome] += 1
+        if "audio_ready" in r:
+            tier["lag"].observe(max(r["audio_ready"] - r["ready"], 0.0))
+    for tier in tiers.values():
+        tier["lag"] = tier["lag"].to_dict()
+    return {"tiers": tiers, "stages": stages}
+
+
+def run(args) -> dict:
+    proc, base_url = start_mock(args)
+    dispatcher = tts_cache = priority_stats = None
+    workdir = tempfile.mkdtemp(prefix="commentary-bench-")
+    meter = StageMeter(track_memory=args.memory)
+    tracer.reset()
+    try:
+        session = requests.Session()
+        if args.dispatcher:
+            dispatcher = LLMDispatcher("mock", "mock", base_url)
+            llm = dispatcher.for_key("bench", max_tokens=256)
+        else:
+            llm = ChatOpenAI(model="mock", api_key="mock", base_url=base_url, temperature=0.8, max_tokens=256)
+        predictor = F1RacePredictor(MEETING, llm=llm)
+        tts_cache = (TTSCache(os.path.join(workdir, "tts_cache"), int(args.tts_cache_mb * 2**20))
+                     if args.tts_cache_mb else None)
+        tts = partial(clone_voice_node, session=session, base_url=base_url, cache=tts_cache)
+        app = build_app(meter.wrap("llm", predictor.invoke), meter.wrap("tts", tts))
+
+        buckets = load_buckets(args.events)
+        race_state = RaceState(load_drivers())
+        race_state.apply_many = meter.wrap("race_state", race_state.apply_many)
+        # Recorded opening remarks stand in for intro_bot (which needs the RAG vector store).
+        state = {"commentator_response": load_chat_fixtures(STATE_STORE_PATH)[:1]}
+
+        t0_race = race_seconds(next(iter(buckets)))
+        lags, processed = [], []
+
+        def before_bucket(time_stamp):
+            if args.speedup:
+                # A bucket's events are only complete once its 5 s window has closed.
+                ready = start + (race_seconds(time_stamp) - t0_race + BUCKET_SECONDS) / args.speedup
+                delay = ready - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+        def after_bucket(time_stamp, state):
+            processed.append(time_stamp)
+            if args.speedup:
+                ready = start + (race_seconds(time_stamp) - t0_race + BUCKET_SECONDS) / args.speedup
+                lags.append(time.perf_counter() - ready)
+
+        if args.memory:
+            tracemalloc.start()
+        with CommentaryJournal(os.path.join(workdir, "state")) as journal:
+            journal.record = meter.wrap("journal", journal.record)
+            start, cpu0 = time.perf_counter(), time.process_time()
+            if args.priority:
+                # Playout is simulated on the race clock, so a clip holds the speaker for
+                # its duration divided by the speedup.
+                play = partial(simulated_playout, speedup=args.speedup)
+                prioritised = PriorityCommentary(meter.wrap("llm", predictor.invoke), meter.wrap("tts", tts),
+                                                 play=play, max_lag=args.max_lag)
+                try:
+                    records = run_prioritised(prioritised, state, buckets, journal, race_state=race_state,
+                                              output_dir=os.path.join(workdir, "audio"),
+                                              max_buckets=args.buckets, speedup=args.speedup)
+                finally:
+                    prioritised.close()
+                processed = [r["bucket"] for r in records]
+                lags = [r["audio_ready"] - r["ready"] for r in records if "audio_ready" in r] if args.speedup else []
+                priority_stats = priority_report(records, prioritised.stats())
+            else:
+                run_commentary(app, state, buckets, journal, race_state=race_state,
+                               output_dir=os.path.join(workdir, "audio"), max_buckets=args.buckets,
+                               before_bucket=before_bucket, after_bucket=after_bucket)
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu0
+        if args.memory:
+            tracemalloc.stop()
+    finally:
+        if dispatcher is not None:
+            dispatcher.close()
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    lag_hist = Histogram()
+    for lag in lags:
+        lag_hist.observe(max(lag, 0.0))
+    return {
+        "commit": git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output")},
+        "buckets": len(processed),
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "throughput_bps": len(processed) / wall if wall else 0.0,
+        "lag": lag_hist.to_dict() if lags else None,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": meter.to_dict(),
+        "dispatcher": dispatcher.stats() if dispatcher is not None else None,
+        "tts_cache": tts_cache.stats() if tts_cache is not None else None,
+        "priority": priority_stats,
+        "spans": tracer.snapshot(),
+    }
+
+
+def report(result: dict) -> str:
+    rows = [f"commit {result['commit']}: {result['buckets']} buckets in {result['wall_s']:.2f}s "
+            f"({result['throughput_bps']:.2f} buckets/s, {result['cpu_s']:.2f}s CPU, "
+            f"peak RSS {result['peak_rss_mb']:.0f} MB)"]
+    if result.get("tts_cache"):
+        c = result["tts_cache"]
+        rows.append(f"tts cache: {c['hits']} hits / {c['misses']} misses ({c['hit_rate']:.0%}), {c['bytes'] / 1e6:.1f} MB")
+    if result["lag"]:
+        lag = result["lag"]
+        rows.append(f"lag vs race time: p50 {lag['p50']:.2f}s  p95 {lag['p95']:.2f}s  max {lag['max']:.2f}s")
+    if result.get("priority"):
+        rows.append(f"\n{'priority':<10}{'buckets':>8}{'played':>8}{'expired':>8}{'preempt':>8}{'lag p50':>10}{'lag p95':>10}")
+        for name, t in result["priority"]["tiers"].items():
+            rows.append(f"{name:<10}{t['buckets']:>8}{t['played']:>8}{t['expired']:>8}{t['preempted']:>8}"
+                        f"{t['lag']['p50']:>9.2f}s{t['lag']['p95']:>9.2f}s")
+    rows.append(f"\n{'stage':<14}{'calls':>7}{'wall mean':>12}{'wall p95':>12}{'cpu mean':>12}{'peak mem':>12}")
+    for name, s in result["stages"].items():
+        rows.append(f"{name:<14}{s['calls']:>7}{s['wall_mean'] * 1e3:>10.1f}ms{s['wall_p95'] * 1e3:>10.1f}ms"
+                    f"{s['cpu_mean'] * 1e3:>10.2f}ms{s['peak_mem_mb']:>10.2f}MB")
+    return "\n".join(rows)
+
+
+def compare(result: dict, baseline: dict) -> str:
+    def delta(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    rows = [f"\nvs {baseline['commit']} ({baseline['created']}):"]
+    metrics = [("throughput", result["throughput_bps"], baseline["throughput_bps"]),
+               ("cpu", result["cpu_s"], baseline["cpu_s"]),
+               ("peak rss", result["peak_rss_mb"], baseline["peak_rss_mb"])]
+    if result["lag"] and baseline.get("lag"):
+        metrics.append(("lag p95", result["lag"]["p95"], baseline["lag"]["p95"]))
+    for name in sorted(result["stages"].keys() & baseline["stages"].keys()):
+        new, old = result["stages"][name], baseline["stages"][name]
+        metrics.append((f"{name} wall", new["wall_mean"], old["wall_mean"]))
+        metrics.append((f"{name} cpu", new["cpu_mean"], old["cpu_mean"]))
+    for name, new, old in metrics:
+        rows.append(f"  {name:<18}{old:>12.4f} -> {new:>12.4f}  {delta(new, old)}")
+    return "\n".join(rows)
+
+
+def latest_result(exclude: str) -> str | None:
+    paths = [p for p in glob.glob(os.path.join(RESULTS_DIR, "pipeline-*.json")) if os.path.abspath(p) != exclude]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--events", default=EVENTS_PATH)
+    ap.add_argument("--buckets", type=int, default=60, help="number of 5 s buckets to replay")
+    ap.add_argument("--speedup", type=float, default=4.0, help="race clock vs wall clock (0 = unpaced, no lag)")
+    ap.add_argument("--chat-latency", default="lognormal:0.6,0.3")
+    ap.add_argument("--tts-ttfb", default="lognormal:0.4,0.3")
+    ap.add_argument("--audio-seconds", type=float, default=4.0)
+    ap.add_argument("--realtime-factor", type=float, default=4.0)
+    ap.add_argument("--chat-fixtures", default=STATE_STORE_PATH)
+    ap.add_argument("--recording", help="raw SSE audio response body served by the mock")
+    ap.add_argument("--max-inflight-chat", type=int, default=0, help="mock answers 429 beyond this")
+    ap.add_argument("--dispatcher", action="store_true", help="route LLM calls through LLMDispatcher")
+    ap.add_argument("--tts-cache-mb", type=float, default=0, help="enable a TTS cache of this size (MB)")
+    ap.add_argument("--priority", action="store_true",
+                    help="prioritised LLM/TTS/playout stages with preemption instead of the serial graph")
+    ap.add_argument("--max-lag", type=float, default=10.0, help="--priority: drop work this far behind its bucket")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--port", type=int, default=0, help="mock server port (0 = any free port)")
+    ap.add_argument("--no-memory", dest="memory", action="store_false", help="skip tracemalloc (lower overhead)")
+    ap.add_argument("--output", help=f"result file (default {RESULTS_DIR}/pipeline-<commit>.json)")
+    ap.add_argument("--compare", help="earlier result file to diff against, or 'latest'")
+    args = ap.parse_args()
+
+    result = run(args)
+    print(report(result))
+    print("\n" + tracer.report())
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{result['commit']}.json")
+    baseline_path = latest_result(os.path.abspath(output)) if args.compare == "latest" else args.compare
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            print(compare(result, json.load(f)))
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved {output}")
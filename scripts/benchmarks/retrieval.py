@@ -0,0 +1,102 @@
+"""
+Latency and recall of dense-only vs BM25 vs hybrid (RRF) retrieval.
+
+Runs over the chunks of the RAG vector store. Without a query file, one
+query is generated per named entity in the OpenF1 data (driver surnames, team
+names, circuit / location) and a chunk counts as relevant when it contains
+every token of the entity. That is the failure mode the hybrid retriever
+targets, and the labels are exact rather than judged.
+
+Usage:
+    python -m scripts.benchmarks.retrieval
+    python -m scripts.benchmarks.retrieval --k 4 --queries labelled.json
+
+A query file is a list of {"query": str, "relevant": [chunk ids]}.
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from scripts.agents.commentary.llm import load_vector_store, VECTOR_STORE_PATH, DRIVERS_PATH
+from scripts.agents.rag.hybrid import HybridRetriever, tokenize
+
+MEETINGS_PATH = "data/open_f1/meetings.json"
+TEMPLATES = ("How has {entity} performed recently?", "Tell me about {entity}.")
+
+
+def entity_queries(store, drivers_path: str = DRIVERS_PATH, meetings_path: str = MEETINGS_PATH) -> list[dict]:
+    with open(drivers_path, "r", encoding="utf-8") as f:
+        drivers = json.load(f)
+    with open(meetings_path, "r", encoding="utf-8") as f:
+        meetings = json.load(f)
+    meetings = meetings if isinstance(meetings, list) else [meetings]
+
+    entities = {d["last_name"] for d in drivers} | {d["team_name"] for d in drivers}
+    for m in meetings:
+        entities |= {m["location"], m["circuit_short_name"]}
+
+    chunk_tokens = {doc_id: set(tokenize(item["text"])) for doc_id, item in store.store.items()}
+    queries = []
+    for i, entity in enumerate(sorted(entities)):
+        needed = set(tokenize(entity))
+        relevant = [doc_id for doc_id, toks in chunk_tokens.items() if needed <= toks]
+        if relevant:
+            queries.append({"query": TEMPLATES[i % len(TEMPLATES)].format(entity=entity), "relevant": relevant})
+    return queries
+
+
+def recall_at_k(retrieved: list, relevant: set, k: int) -> float:
+    return len(set(retrieved[:k]) & relevant) / min(k, len(relevant))
+
+
+def run(retriever: HybridRetriever, queries: list[dict], k: int, repeat: int) -> dict:
+    store = retriever.vector_store
+    methods = {
+        "dense": lambda q: [d.id for d in store.similarity_search(q, k=k)],
+        "bm25": lambda q: [retriever.ids[i] for i, _ in retriever.bm25.search(q, k)],
+        "hybrid": lambda q: [d.id for d in retriever.invoke(q)],
+    }
+    results = {}
+    for name, fn in methods.items():
+        latencies, recalls = [], []
+        for q in queries:
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                ids = fn(q["query"])
+                best = min(best, time.perf_counter() - t0)
+            latencies.append(best)
+            recalls.append(recall_at_k(ids, set(q["relevant"]), k))
+        results[name] = {
+            "recall": float(np.mean(recalls)),
+            "p50_ms": float(np.percentile(latencies, 50) * 1e3),
+            "p95_ms": float(np.percentile(latencies, 95) * 1e3),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--vector-store", default=VECTOR_STORE_PATH)
+    ap.add_argument("--queries", help="labelled queries (default: generated entity queries)")
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    store = load_vector_store(args.vector_store)
+    t0 = time.perf_counter()
+    retriever = HybridRetriever.from_vector_store(store, k=args.k)
+    build = time.perf_counter() - t0
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = json.load(f)
+    else:
+        queries = entity_queries(store)
+
+    print(f"{len(store.store)} chunks, BM25 index {retriever.bm25.nbytes / 1e3:.1f} kB "
+          f"({len(retriever.bm25.vocab)} terms) built in {build * 1e3:.1f} ms; {len(queries)} queries, k={args.k}")
+    print(f"{'method':<8}{'recall@k':>10}{'p50':>10}{'p95':>10}")
+    for name, r in run(retriever, queries, args.k, args.repeat).items():
+        print(f"{name:<8}{r['recall']:>10.3f}{r['p50_ms']:>8.2f}ms{r['p95_ms']:>8.2f}ms")
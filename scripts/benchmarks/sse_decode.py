@@ -0,0 +1,140 @@
+"""
+Throughput benchmark for TTS SSE audio decoding.
+
+Compares the original line-by-line decoder from `clone_voice_node`
+(`iter_lines` + `json.loads` + `b64decode` + `writeframes` per chunk) with
+`SSEAudioDecoder` on the same recorded response bodies.
+
+Usage:
+    python -m scripts.benchmarks.sse_decode
+    python -m scripts.benchmarks.sse_decode --recording recorded_tts.sse
+
+A recording is the raw body of a streamed `/chat/completions` audio response,
+e.g. captured with `curl -N ... > recorded_tts.sse`. Without one, a response is
+synthesised from the reference clip in the same chunk layout as Higgs.
+"""
+import io
+import json
+import time
+import wave
+import base64
+import argparse
+
+from scripts.agents.commentary.sse import SSEAudioDecoder
+
+REFERENCE_PATH = "data/commentary/input/david-c-cut-edited.wav"
+# Higgs streams ~40 ms of PCM16 @ 24 kHz per event.
+CHUNK_BYTES = 1920
+# Size of the reads handed out by `iter_content(chunk_size=None)` on a busy socket.
+READ_SIZE = 16 * 1024
+
+
+def synthesise_recording(path: str = REFERENCE_PATH, chunk_bytes: int = CHUNK_BYTES) -> bytes:
+    """Build an SSE body that streams the PCM frames of `path` as audio deltas."""
+    with wave.open(path, "rb") as wf:
+        pcm = wf.readframes(wf.getnframes())
+    lines = []
+    for i in range(0, len(pcm), chunk_bytes):
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "higgs-audio-generation-Hackathon",
+            "choices": [{
+                "index": 0,
+                "delta": {"audio": {"id": "audio-bench", "data": base64.b64encode(pcm[i:i + chunk_bytes]).decode("ascii")}},
+                "finish_reason": None,
+            }],
+        }
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode("utf-8")
+
+
+def split_reads(body: bytes, read_size: int = READ_SIZE):
+    return [body[i:i + read_size] for i in range(0, len(body), read_size)]
+
+
+def open_wave(buf: io.BytesIO):
+    wf = wave.open(buf, "wb")
+    wf.setnchannels(1)
+    wf.setsampwidth(2)
+    wf.setframerate(24000)
+    return wf
+
+
+def decode_legacy(reads) -> bytes:
+    """The decoding loop `clone_voice_node` used before SSEAudioDecoder."""
+    out = io.BytesIO()
+    wf = open_wave(out)
+    # Equivalent of `resp.iter_lines(decode_unicode=True)`
+    pending = ""
+    lines = []
+    for raw in reads:
+        pending += raw.decode("utf-8")
+        *complete, pending = pending.split("\n")
+        lines.extend(complete)
+    for line in lines:
+        if not line or not line.startswith("data: "):
+            continue
+        data_str = line[len("data: "):].strip()
+        if data_str == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data_str)
+            delta = chunk["choices"][0].get("delta", {})
+            audio = delta.get("audio")
+            if audio and "data" in audio:
+                wf.writeframes(base64.b64decode(audio["data"]))
+        except Exception:
+            continue
+    wf.close()
+    return out.getvalue()
+
+
+def decode_fast(reads) -> bytes:
+    out = io.BytesIO()
+    wf = open_wave(out)
+    decoder = SSEAudioDecoder(wf.writeframes)
+    for raw in reads:
+        if not decoder.feed(raw):
+            break
+    decoder.close()
+    wf.close()
+    return out.getvalue()
+
+
+def bench(fn, reads, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(reads)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--recording", action="append", help="raw SSE response body (repeatable)")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.recording:
+        bodies = {}
+        for path in args.recording:
+            with open(path, "rb") as f:
+                bodies[path] = f.read()
+    else:
+        bodies = {f"synthesised from {REFERENCE_PATH}": synthesise_recording()}
+
+    for name, body in bodies.items():
+        reads = split_reads(body)
+        legacy_wav, fast_wav = decode_legacy(reads), decode_fast(reads)
+        assert legacy_wav == fast_wav, f"decoded audio differs for {name}"
+
+        t_legacy = bench(decode_legacy, reads, args.repeat)
+        t_fast = bench(decode_fast, reads, args.repeat)
+        mb = len(body) / 1e6
+        print(f"\n{name}: {mb:.2f} MB SSE -> {len(fast_wav) / 1e6:.2f} MB WAV")
+        print(f"  legacy  {t_legacy * 1e3:8.2f} ms  {mb / t_legacy:8.1f} MB/s")
+        print(f"  decoder {t_fast * 1e3:8.2f} ms  {mb / t_fast:8.1f} MB/s  ({t_legacy / t_fast:.1f}x)")
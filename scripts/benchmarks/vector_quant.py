@@ -0,0 +1,123 @@
+"""
+Index size, load time, query latency and recall of QuantizedVectorStore
+(int8 / binary + float32 re-rank) against the pickled InMemoryVectorStore.
+
+Usage:
+    python -m scripts.benchmarks.vector_quant                      # the RAG store
+    python -m scripts.benchmarks.vector_quant --synthetic 50000    # simulated larger corpus
+
+The synthetic corpus is clustered unit vectors (MiniLM dimension by default),
+queried with noisy copies of random documents. Recall@k is measured against
+the exact float ranking of the original store.
+"""
+import os
+import time
+import pickle
+import shutil
+import tempfile
+import argparse
+import tracemalloc
+
+import numpy as np
+from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from scripts.agents.commentary.llm import VECTOR_STORE_PICKLE
+from scripts.agents.rag.quantized import QuantizedVectorStore
+
+MODES = ("float32", "int8", "binary")
+
+
+def synthetic_store(n: int, dim: int, clusters: int = 200, seed: int = 0) -> InMemoryVectorStore:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    vectors = centres[rng.integers(0, clusters, n)] + 0.8 * rng.standard_normal((n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # The embedding is never called: everything below searches by vector.
+    store = InMemoryVectorStore(DeterministicFakeEmbedding(size=dim))
+    for i, v in enumerate(vectors):
+        store.store[str(i)] = {"id": str(i), "vector": v.tolist(), "text": f"chunk {i}", "metadata": {}}
+    return store
+
+
+def make_queries(store, n: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    items = list(store.store.values())
+    picks = np.asarray([items[i]["vector"] for i in rng.integers(0, len(items), n)])
+    q = picks + 0.05 * rng.standard_normal(picks.shape)
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def timed_load(fn):
+    """(result, seconds, peak traced MB) for a loader; timed without tracemalloc overhead."""
+    t0 = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - t0
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def query_stats(store, queries: np.ndarray, k: int, truth: list[set] | None):
+    latencies, recalls, ids = [], [], []
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        docs = store.similarity_search_by_vector(q.tolist(), k=k)
+        latencies.append(time.perf_counter() - t0)
+        found = [d.id for d in docs]
+        ids.append(set(found))
+        if truth is not None:
+            recalls.append(len(truth[i] & set(found)) / k)
+    return np.median(latencies) * 1e3, np.percentile(latencies, 95) * 1e3, (np.mean(recalls) if recalls else 1.0), ids
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--vector-store", default=VECTOR_STORE_PICKLE)
+    ap.add_argument("--synthetic", type=int, help="use N synthetic vectors instead of the RAG store")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--oversample", type=int, help="candidates per result to re-rank (default: per mode)")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vector-quant-")
+    try:
+        if args.synthetic:
+            source = synthetic_store(args.synthetic, args.dim)
+            pickle_path = os.path.join(workdir, "store.pkl")
+            with open(pickle_path, "wb") as f:
+                pickle.dump(source, f)
+        else:
+            pickle_path = args.vector_store
+
+        def load_pickle():
+            with open(pickle_path, "rb") as f:
+                return pickle.load(f)
+
+        baseline, load_s, load_mb = timed_load(load_pickle)
+        queries = make_queries(baseline, args.queries)
+        n = len(baseline.store)
+        print(f"{n} vectors x {len(queries[0])} dims, {len(queries)} queries, k={args.k}, "
+              f"oversample={args.oversample or 'per mode'}\n")
+        print(f"{'store':<16}{'disk MB':>9}{'load':>10}{'load RAM':>10}{'search RAM':>12}{'p50':>9}{'p95':>9}{'recall':>8}")
+
+        p50, p95, _, truth = query_stats(baseline, queries, args.k, None)
+        print(f"{'InMemory pickle':<16}{os.path.getsize(pickle_path) / 1e6:>9.1f}{load_s * 1e3:>8.0f}ms"
+              f"{load_mb:>8.1f}MB{'-':>12}{p50:>7.2f}ms{p95:>7.2f}ms{1.0:>8.3f}")
+
+        for mode in MODES:
+            path = os.path.join(workdir, mode)
+            QuantizedVectorStore.from_in_memory(baseline, mode=mode, oversample=args.oversample).save(path)
+            store, load_s, load_mb = timed_load(lambda: QuantizedVectorStore.load(path))
+            p50, p95, recall, _ = query_stats(store, queries, args.k, truth)
+            print(f"{mode:<16}{dir_size(path) / 1e6:>9.1f}{load_s * 1e3:>8.0f}ms{load_mb:>8.1f}MB"
+                  f"{store.nbytes / 1e6:>10.1f}MB{p50:>7.2f}ms{p95:>7.2f}ms{recall:>8.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,300 @@
+"""
+Batch preprocessing for every session of one or more seasons.
+
+The single-race scripts (open_f1/fetch_*.py, generate_event_buckets.py) pick the
+race out of data/sessions.json. This driver enumerates sessions from
+meetings.json + sessions.json and runs, per session and in a process pool:
+
+    fetch   OpenF1 drivers / positions / laps / pit / overtakes / intervals -> raw/*.json
+    bucket  merge into one timeline and bucket every 5 s (F1RaceSimulator)
+            -> events_5s_indexed.json and .evb
+
+Outputs are partitioned by season and session:
+
+    data/archive/2024/1246-singapore-grand-prix/9606-race/
+        raw/positions.json ...
+        events_5s_indexed.json
+        events_5s_indexed.evb
+        manifest.json          input hashes + code version of the last build
+
+The catalogue (data/archive/meetings.json, sessions.json) is written by
+`--refresh-catalogue`; `--meetings` / `--sessions` read another one, e.g. the
+single-race files in data/open_f1.
+
+A session is skipped when its raw files exist (finished sessions don't change;
+`--refetch` forces it) and the bucket step is skipped when the hashes of its
+raw inputs and of the code that builds it match the manifest.
+`data/archive/index.json` lists every session with its paths and last status.
+
+    python -m scripts.preprocess.batch --years 2023 2024 --refresh-catalogue
+    python -m scripts.preprocess.batch --session-types Race Qualifying --workers 6
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import requests
+
+OPENF1 = "https://api.openf1.org/v1"
+ARCHIVE_DIR = "data/archive"
+# The archive keeps its own catalogue: data/open_f1/meetings.json / sessions.json
+# describe the single race the simulator and build.py work on.
+MEETINGS_PATH = os.path.join(ARCHIVE_DIR, "meetings.json")
+SESSIONS_PATH = os.path.join(ARCHIVE_DIR, "sessions.json")
+INTERVAL_SEC = 5
+
+# raw file -> (endpoint, time filter field); mirrors open_f1/fetch_*.py
+ENDPOINTS = {
+    "drivers": ("drivers", None),
+    "positions": ("position", "date"),
+    "laps": ("laps", "date_start"),
+    "pit_stops": ("pit", "date"),
+    "overtakes": ("overtakes", "date"),
+    "intervals": ("intervals", "date"),
+}
+# F1RaceSimulator label -> raw file
+EVENT_SOURCES = {"position": "positions", "lap": "laps", "pit": "pit_stops",
+                 "overtake": "overtakes", "interval": "intervals"}
+# Raw files bucketing can do without (intervals only feed the race state's gaps).
+OPTIONAL_SOURCES = ("intervals",)
+# Code the bucket step's outputs depend on; editing any of these rebuilds every session.
+BUCKET_CODE = ("scripts/preprocess/generate_event_buckets.py", "scripts/preprocess/positions.py",
+               "scripts/agents/event_records.py", "scripts/agents/event_codec.py")
+
+
+def slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-")
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def code_version(paths=BUCKET_CODE) -> str:
+    return hashlib.sha256("".join(file_hash(p) for p in paths).encode()).hexdigest()[:16]
+
+
+def openf1_get(endpoint: str, retries: int = 4, **params) -> list:
+    """
+    GET an OpenF1 endpoint, backing off on 429/5xx. An error body (a dict such as
+    {"detail": ...}) raises, so it fails the session instead of being saved as an empty file.
+    """
+    for attempt in range(retries):
+        r = requests.get(f"{OPENF1}/{endpoint}", params=params, timeout=60)
+        if r.status_code == 429 or r.status_code >= 500:
+            time.sleep(float(r.headers.get("Retry-After", 2 ** attempt)))
+            continue
+        r.raise_for_status()
+        data = r.json()
+        if not isinstance(data, list):
+            raise ValueError(f"OpenF1 {endpoint} {params}: {data}")
+        return data
+    r.raise_for_status()
+    raise RuntimeError(f"OpenF1 {endpoint} {params}: no response after {retries} attempts")
+
+
+def refresh_catalogue(years: list[int], meetings_path: str = MEETINGS_PATH, sessions_path: str = SESSIONS_PATH):
+    """Fetch every meeting and session of `years` into meetings.json / sessions.json."""
+    meetings, sessions = [], []
+    for year in years:
+        meetings += openf1_get("meetings", year=year)
+        sessions += openf1_get("sessions", year=year)
+    for path, data in ((meetings_path, meetings), (sessions_path, sessions)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+    print(f"Saved {len(meetings)} meetings and {len(sessions)} sessions")
+
+
+def load_sessions(meetings_path: str = MEETINGS_PATH, sessions_path: str = SESSIONS_PATH,
+                  years=None, session_types=("Race",)) -> list[dict]:
+    """Sessions joined with their meeting, filtered by year and session type, oldest first."""
+    with open(meetings_path, "r", encoding="utf-8") as f:
+        meetings = {m["meeting_key"]: m for m in json.load(f)}
+    with open(sessions_path, "r", encoding="utf-8") as f:
+        sessions = json.load(f)
+    out = []
+    for s in sessions:
+        if years and s.get("year") not in years:
+            continue
+        if session_types and s.get("session_type") not in session_types and s.get("session_name") not in session_types:
+            continue
+        meeting = meetings.get(s["meeting_key"], {})
+        out.append({**s, "meeting_name": meeting.get("meeting_name") or s.get("circuit_short_name"),
+                    "meeting_official_name": meeting.get("meeting_official_name")})
+    return sorted(out, key=lambda s: s["date_start"])
+
+
+def session_dir(session: dict, root: str = ARCHIVE_DIR) -> str:
+    return os.path.join(root, str(session["year"]),
+                        f"{session['meeting_key']}-{slug(session['meeting_name'])}",
+                        f"{session['session_key']}-{slug(session['session_name'])}")
+
+
+def fetch_session(session: dict, raw_dir: str, refetch: bool = False, names=None) -> bool:
+    """
+    Fetch any missing raw files (of `names`, default all ENDPOINTS) for one session.
+    Returns True if anything was downloaded.
+    """
+    os.makedirs(raw_dir, exist_ok=True)
+    fetched = False
+    for name, (endpoint, date_field) in ENDPOINTS.items():
+        if names is not None and name not in names:
+            continue
+        path = os.path.join(raw_dir, f"{name}.json")
+        if os.path.exists(path) and not refetch:
+            continue
+        params = {"meeting_key": session["meeting_key"], "session_key": session["session_key"]}
+        if date_field:
+            params[f"{date_field}>"] = session["date_start"]
+        data = openf1_get(endpoint, **params)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+        fetched = True
+    return fetched
+
+
+def bucket_session(raw_dir: str, out_dir: str, interval_sec: int = INTERVAL_SEC,
+                   compact_positions: bool = False) -> int:
+    """
+    Merge the raw endpoints into one timeline and write JSON + binary buckets. Returns the bucket count.
+    `compact_positions` replaces the position rows with order changes (see positions.py).
+    """
+    from scripts.preprocess.generate_event_buckets import F1RaceSimulator
+
+    data_paths = {label: os.path.join(raw_dir, f"{name}.json") for label, name in EVENT_SOURCES.items()
+                  if name not in OPTIONAL_SOURCES or os.path.exists(os.path.join(raw_dir, f"{name}.json"))}
+    simulator = F1RaceSimulator(data_paths, os.path.join(raw_dir, "drivers.json"), compact_positions)
+    simulator.load_drivers()
+    simulator.load_all_data()
+    json_path = os.path.join(out_dir, "events_5s_indexed.json")
+    evb_path = os.path.join(out_dir, "events_5s_indexed.evb")
+    for path in (json_path, evb_path):
+        if os.path.exists(path):
+            os.remove(path)
+    simulator.stream_indexed(output_file=json_path, interval_sec=interval_sec)
+    if not os.path.exists(json_path):  # no events at all
+        return 0
+    with open(json_path, "r", encoding="utf-8") as f:
+        buckets = json.load(f)
+    from scripts.agents.event_codec import write_buckets
+    with open(evb_path, "wb") as f:
+        write_buckets(buckets, f)
+    return len(buckets)
+
+
+def process_session(session: dict, root: str = ARCHIVE_DIR, refetch: bool = False,
+                    force: bool = False, compact_positions: bool = False) -> dict:
+    """Fetch and bucket one session, skipping steps whose inputs are unchanged. Runs in a pool worker."""
+    out_dir = session_dir(session, root)
+    raw_dir = os.path.join(out_dir, "raw")
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    result = {"session_key": session["session_key"], "path": out_dir, "fetched": False,
+              "bucketed": False, "buckets": None}
+    if datetime.fromisoformat(session["date_end"]) > datetime.now(timezone.utc):
+        return {**result, "status": "pending"}
+
+    t0 = time.perf_counter()
+    try:
+        result["fetched"] = fetch_session(session, raw_dir, refetch)
+        inputs = {name: file_hash(os.path.join(raw_dir, f"{name}.json")) for name in ENDPOINTS}
+        key = {"inputs": inputs, "code": code_version(), "interval_sec": INTERVAL_SEC,
+               "compact_positions": compact_positions}
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        up_to_date = (manifest.get("bucket", {}).get("key") == key
+                      and os.path.exists(os.path.join(out_dir, "events_5s_indexed.evb")))
+        if force or not up_to_date:
+            result["buckets"] = bucket_session(raw_dir, out_dir, compact_positions=compact_positions)
+            result["bucketed"] = True
+            manifest["session"] = session
+            manifest["bucket"] = {"key": key, "buckets": result["buckets"],
+                                  "built": datetime.now(timezone.utc).isoformat()}
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+        else:
+            result["buckets"] = manifest["bucket"]["buckets"]
+        status = "built" if result["bucketed"] else "unchanged"
+    except Exception as e:
+        status = f"failed: {e!r}"
+    return {**result, "status": status, "seconds": round(time.perf_counter() - t0, 2)}
+
+
+def write_index(results: list[dict], sessions: list[dict], root: str = ARCHIVE_DIR):
+    """Merge this run's results into <root>/index.json."""
+    path = os.path.join(root, "index.json")
+    index = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            index = {str(e["session_key"]): e for e in json.load(f)}
+    by_key = {s["session_key"]: s for s in sessions}
+    for r in results:
+        s = by_key[r["session_key"]]
+        index[str(r["session_key"])] = {
+            "session_key": s["session_key"], "meeting_key": s["meeting_key"], "year": s["year"],
+            "meeting_name": s["meeting_name"], "session_name": s["session_name"], "date_start": s["date_start"],
+            "path": r["path"], "buckets": r["buckets"], "status": r["status"],
+        }
+    os.makedirs(root, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(sorted(index.values(), key=lambda e: e["date_start"]), f, indent=2)
+
+
+def run_batch(sessions: list[dict], root: str = ARCHIVE_DIR, workers: int = 4, refetch: bool = False,
+              force: bool = False, compact_positions: bool = False) -> list[dict]:
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_session, s, root, refetch, force, compact_positions) for s in sessions]
+        for future in as_completed(futures):
+            r = future.result()
+            results.append(r)
+            buckets = f" ({r['buckets']} buckets)" if r["buckets"] is not None else ""
+            print(f"[{len(results)}/{len(sessions)}] {r['path']}: {r['status']}{buckets}")
+    write_index(results, sessions, root)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fetch and bucket every matching session into a partitioned archive.")
+    ap.add_argument("--meetings", default=MEETINGS_PATH)
+    ap.add_argument("--sessions", default=SESSIONS_PATH)
+    ap.add_argument("--years", type=int, nargs="*")
+    ap.add_argument("--session-types", nargs="*", default=["Race"],
+                    help="session_type or session_name values, e.g. Race Qualifying 'Sprint'")
+    ap.add_argument("--refresh-catalogue", action="store_true",
+                    help="first fetch meetings/sessions for --years from OpenF1")
+    ap.add_argument("--output", default=ARCHIVE_DIR)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--refetch", action="store_true", help="download raw files even if present")
+    ap.add_argument("--force", action="store_true", help="rebuild buckets even if inputs are unchanged")
+    ap.add_argument("--compact-positions", action="store_true",
+                    help="bucket order changes instead of every position row (positions.py)")
+    args = ap.parse_args()
+
+    if args.refresh_catalogue:
+        if not args.years:
+            raise SystemExit("--refresh-catalogue needs --years")
+        refresh_catalogue(args.years, args.meetings, args.sessions)
+    elif not (os.path.exists(args.meetings) and os.path.exists(args.sessions)):
+        raise SystemExit(f"No catalogue at {args.meetings} / {args.sessions}: "
+                         f"run with --refresh-catalogue --years ... or pass --meetings / --sessions")
+    sessions = load_sessions(args.meetings, args.sessions, args.years, args.session_types)
+    start = time.time()
+    results = run_batch(sessions, args.output, args.workers, args.refetch, args.force, args.compact_positions)
+    counts = {}
+    for r in results:
+        counts[r["status"].split(":")[0]] = counts.get(r["status"].split(":")[0], 0) + 1
+    print(f"{len(results)} sessions in {time.time() - start:.1f}s: {counts}")
@@ -0,0 +1,314 @@
+"""
+Content-hash build cache for the preprocessing steps.
+
+    fetch   data/open_f1/sessions.json          -> missing raw OpenF1 endpoints (positions.json, laps.json, ...)
+    bucket  raw endpoints + drivers.json        -> events_5s_indexed.json / .evb
+    index   drivers_history.json                -> data/commentary/vector_store_q
+
+Each `Step` declares its input and output paths and the source files it runs.
+Its key is the sha256 of its name, params, the content hashes of its inputs
+and the hashes of its code. A step is
+
+    fresh      when the last build had the same key and its outputs are untouched,
+    restored   when an earlier build with this key is in the cache (outputs copied back),
+    built      otherwise: it runs and its outputs are stored under the key.
+
+Steps run in declaration order, so a change only rebuilds the steps downstream
+of it, and only if it changed what they read. Rebucketing after a code change
+that leaves the events identical does not re-embed anything. File hashes are
+remembered by (size, mtime), so checking a fresh DAG only stats its files.
+
+    python -m scripts.preprocess.build                  # everything that is stale
+    python -m scripts.preprocess.build bucket           # bucket (and anything stale it reads)
+    python -m scripts.preprocess.build --dry-run        # report what would run
+    python -m scripts.preprocess.build index --force    # rebuild index regardless of the cache
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+
+BUILD_DIR = "data/.build"
+DATA_DIR = "data/open_f1"
+VECTOR_STORE_DIR = "data/commentary/vector_store_q"
+
+
+class Step:
+    """One node of the DAG: `run()` must write every path in `outputs`."""
+
+    def __init__(self, name: str, run, inputs=(), outputs=(), code=(), params: dict | None = None):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.code = tuple(code)
+        self.params = params or {}
+
+
+class BuildCache:
+    """Step records, memoised file hashes and stored outputs under `directory`."""
+
+    def __init__(self, directory: str = BUILD_DIR, keep: int = 3):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(os.path.join(directory, "steps"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self._stamps_path = os.path.join(directory, "stamps.json")
+        self._stamps = {}
+        if os.path.exists(self._stamps_path):
+            with open(self._stamps_path, "r", encoding="utf-8") as f:
+                self._stamps = json.load(f)
+
+    # --------------------- Hashing ---------------------
+    def file_hash(self, path: str) -> str:
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        cached = self._stamps.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        self._stamps[path] = [stamp, h.hexdigest()]
+        return h.hexdigest()
+
+    def path_hash(self, path: str) -> str | None:
+        """Content hash of a file or a directory tree; None if it doesn't exist."""
+        if os.path.isfile(path):
+            return self.file_hash(path)
+        if not os.path.isdir(path):
+            return None
+        h = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                full = os.path.join(dirpath, name)
+                h.update(f"{os.path.relpath(full, path)}\0{self.file_hash(full)}\0".encode())
+        return h.hexdigest()
+
+    def step_key(self, step: Step) -> str:
+        missing = [p for p in step.inputs if self.path_hash(p) is None]
+        if missing:
+            raise FileNotFoundError(f"Step '{step.name}' is missing inputs: {', '.join(missing)}")
+        spec = {
+            "step": step.name,
+            "params": step.params,
+            "inputs": {p: self.path_hash(p) for p in step.inputs},
+            "code": {p: self.path_hash(p) for p in step.code},
+        }
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    def save_stamps(self):
+        tmp = self._stamps_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._stamps, f)
+        os.replace(tmp, self._stamps_path)
+
+    # --------------------- Records and objects ---------------------
+    def _record_path(self, name: str) -> str:
+        return os.path.join(self.directory, "steps", f"{name}.json")
+
+    def record(self, name: str) -> dict:
+        path = self._record_path(name)
+        if not os.path.exists(path):
+            return {"history": []}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def object_dir(self, key: str) -> str:
+        return os.path.join(self.directory, "objects", key)
+
+    def is_fresh(self, step: Step, key: str) -> bool:
+        rec = self.record(step.name)
+        return rec.get("key") == key and all(self.path_hash(p) == h for p, h in rec.get("outputs", {}).items())
+
+    def restore(self, step: Step, key: str) -> bool:
+        obj = self.object_dir(key)
+        if not os.path.isdir(obj):
+            return False
+        for i, path in enumerate(step.outputs):
+            _copy(os.path.join(obj, str(i)), path)
+        return True
+
+    def store(self, step: Step, key: str, seconds: float):
+        missing = [p for p in step.outputs if not os.path.exists(p)]
+        if missing:
+            raise FileNotFoundError(f"Step '{step.name}' did not write: {', '.join(missing)}")
+        obj = self.object_dir(key)
+        tmp = obj + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        for i, path in enumerate(step.outputs):
+            _copy(path, os.path.join(tmp, str(i)))
+        shutil.rmtree(obj, ignore_errors=True)
+        os.replace(tmp, obj)
+        self.commit(step, key, seconds)
+
+    def commit(self, step: Step, key: str, seconds: float | None = None):
+        rec = self.record(step.name)
+        history = [k for k in rec.get("history", []) if k != key] + [key]
+        for old in history[:-self.keep]:
+            shutil.rmtree(self.object_dir(old), ignore_errors=True)
+        rec = {"key": key, "outputs": {p: self.path_hash(p) for p in step.outputs},
+               "seconds": seconds if seconds is not None else rec.get("seconds"),
+               "history": history[-self.keep:]}
+        with open(self._record_path(step.name), "w") as f:
+            json.dump(rec, f, indent=2)
+
+
+def _copy(src: str, dst: str):
+    """
+    Copy a file or directory over `dst`. Copies rather than hard links, since
+    steps may rewrite their outputs in place.
+    """
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        shutil.rmtree(dst)
+    elif os.path.exists(dst):
+        os.remove(dst)
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    if os.path.isdir(src):
+        shutil.copytree(src, dst)
+    else:
+        shutil.copy2(src, dst)
+
+
+class Pipeline:
+    """Steps in dependency order; a step's inputs may be outputs of earlier steps only."""
+
+    def __init__(self, steps: list[Step], cache: BuildCache | None = None):
+        self.steps = steps
+        self.cache = cache or BuildCache()
+        self.producer = {p: s.name for s in steps for p in s.outputs}
+        order = {s.name: i for i, s in enumerate(steps)}
+        for i, step in enumerate(steps):
+            for path in step.inputs:
+                if path in self.producer and order[self.producer[path]] >= i:
+                    raise ValueError(f"Step '{step.name}' reads {path}, produced by a later step")
+
+    def upstream(self, targets) -> list[Step]:
+        """`targets` plus every step they (transitively) read from, in order."""
+        by_name = {s.name: s for s in self.steps}
+        unknown = set(targets) - set(by_name)
+        if unknown:
+            raise ValueError(f"Unknown steps: {', '.join(sorted(unknown))}")
+        wanted, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name in wanted:
+                continue
+            wanted.add(name)
+            todo += [self.producer[p] for p in by_name[name].inputs if p in self.producer]
+        return [s for s in self.steps if s.name in wanted]
+
+    def run(self, targets=None, force=(), dry_run: bool = False) -> dict:
+        """
+        Bring `targets` (default: all steps) up to date. `force` names steps to rebuild
+        even when fresh. With `dry_run`, report statuses without running anything
+        (steps downstream of a stale one are reported as "stale?", since their key
+        depends on outputs that don't exist yet).
+        """
+        steps = self.upstream(targets) if targets else self.steps
+        statuses = {}
+        dirty = set()
+        try:
+            for step in steps:
+                t0 = time.perf_counter()
+                if dry_run and any(self.producer.get(p) in dirty for p in step.inputs):
+                    statuses[step.name] = "stale?"
+                    dirty.add(step.name)
+                    print(f"{step.name:<8} {'stale?':<10}")
+                    continue
+                key = self.cache.step_key(step)
+                if step.name not in force and self.cache.is_fresh(step, key):
+                    status = "fresh"
+                elif dry_run:
+                    status = "restorable" if os.path.isdir(self.cache.object_dir(key)) else "stale"
+                    dirty.add(step.name)
+                elif step.name not in force and self.cache.restore(step, key):
+                    self.cache.commit(step, key)
+                    status = "restored"
+                else:
+                    step.run()
+                    self.cache.store(step, key, time.perf_counter() - t0)
+                    status = "built"
+                statuses[step.name] = status
+                print(f"{step.name:<8} {status:<10} {time.perf_counter() - t0:>7.2f}s")
+        finally:
+            self.cache.save_stamps()
+        return statuses
+
+
+# --------------------- The preprocessing DAG ---------------------
+def race_session(sessions_path: str) -> dict:
+    with open(sessions_path, "r", encoding="utf-8") as f:
+        sessions = json.load(f)
+    race = next((s for s in sessions if s.get("session_type") == "Race"), None)
+    if race is None:
+        raise ValueError(f"No Race session in {sessions_path}")
+    return race
+
+
+def default_steps(data_dir: str = DATA_DIR, vector_store_dir: str = VECTOR_STORE_DIR,
+                  mode: str = "int8", compact_positions: bool = False, refetch: bool = False) -> list[Step]:
+    """
+    The fetch step downloads only missing raw files (so the committed snapshot is kept),
+    or all of them with `refetch`. Optional raw files (intervals) are not fetched here,
+    and feed the bucket step only when present.
+    """
+    from scripts.preprocess import batch
+
+    sessions_path = os.path.join(data_dir, "sessions.json")
+    names = [name for name in batch.ENDPOINTS if name not in batch.OPTIONAL_SOURCES]
+    raw = [os.path.join(data_dir, f"{name}.json") for name in names]
+    optional = [os.path.join(data_dir, f"{name}.json") for name in batch.OPTIONAL_SOURCES]
+    history = os.path.join(data_dir, "drivers_history.json")
+
+    def fetch():
+        batch.fetch_session(race_session(sessions_path), data_dir, refetch=refetch, names=names)
+
+    def bucket():
+        batch.bucket_session(data_dir, data_dir, compact_positions=compact_positions)
+
+    def index():
+        from pathlib import Path
+        from scripts.agents.rag.build_index import build_index
+        from scripts.agents.rag.create_vector_store import HFEmbeddings, CHUNK_SIZE, CHUNK_OVERLAP
+
+        build_index(Path(history), vector_store_dir, HFEmbeddings(), chunk_size=CHUNK_SIZE,
+                    chunk_overlap=CHUNK_OVERLAP, mode=mode)
+
+    return [
+        Step("fetch", fetch, inputs=[sessions_path], outputs=raw,
+             code=["scripts/preprocess/batch.py"]),
+        Step("bucket", bucket, inputs=raw + [p for p in optional if os.path.exists(p)],
+             outputs=[os.path.join(data_dir, "events_5s_indexed.json"),
+                      os.path.join(data_dir, "events_5s_indexed.evb")],
+             code=["scripts/preprocess/batch.py", *batch.BUCKET_CODE],
+             params={"interval_sec": batch.INTERVAL_SEC, "compact_positions": compact_positions}),
+        Step("index", index, inputs=[history], outputs=[vector_store_dir],
+             code=["scripts/agents/rag/build_index.py", "scripts/agents/rag/quantized.py",
+                   "scripts/agents/rag/create_vector_store.py"],
+             params={"mode": mode}),
+    ]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Rebuild the stale preprocessing steps.")
+    ap.add_argument("targets", nargs="*", help="steps to bring up to date (default: all)")
+    ap.add_argument("--data", default=DATA_DIR)
+    ap.add_argument("--vector-store", default=VECTOR_STORE_DIR)
+    ap.add_argument("--mode", default="int8", choices=["int8", "binary", "float32"])
+    ap.add_argument("--compact-positions", action="store_true", help="bucket order changes (positions.py)")
+    ap.add_argument("--cache", default=BUILD_DIR)
+    ap.add_argument("--keep", type=int, default=3, help="cached builds kept per step")
+    ap.add_argument("--force", action="store_true", help="rebuild the targets regardless of the cache (fetch re-downloads every raw file)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    steps = default_steps(args.data, args.vector_store, args.mode, args.compact_positions,
+                          refetch=args.force and (not args.targets or "fetch" in args.targets))
+    pipeline = Pipeline(steps, BuildCache(args.cache, args.keep))
+    force = set(args.targets or [s.name for s in pipeline.steps]) if args.force else set()
+    pipeline.run(args.targets or None, force=force, dry_run=args.dry_run)
@@ -2,10 +2,16 @@ import json
 from datetime import datetime, timedelta
 from dateutil import parser
 
+# Run from the repository root: python -m scripts.preprocess.generate_event_buckets
+from scripts.agents.event_codec import write_buckets
+from scripts.agents.event_records import DriverTable, EventRecord
+from scripts.preprocess.positions import compact_positions
+
 class F1RaceSimulator:
-    def __init__(self, data_paths, driver_path):
+    def __init__(self, data_paths, driver_path, compact_positions=False):
         self.data_paths = data_paths
         self.driver_path = driver_path
+        self.compact_positions = compact_positions
         self.data = []
         self.driver_map = {}
 
@@ -34,17 +40,32 @@ class F1RaceSimulator:
         with open(self.driver_path, "r") as f:
             drivers = json.load(f)
         self.driver_map = {d["driver_number"]: d["full_name"] for d in drivers}
+        self.drivers = DriverTable(drivers)
 
     def load_all_data(self):
         for label, path in self.data_paths.items():
             self.data += self.load_and_label(path, label)
+        if self.compact_positions:
+            self.data = self.compact_position_rows(self.data)
         self.data.sort(key=lambda x: x['event_time'])
         print(f"Total events loaded: {len(self.data)}")
 
-    def stream_indexed(self, output_file="events_indexed.json", interval_sec=5):
+    def compact_position_rows(self, data):
+        """Replace per-driver position rows with order changes and snapshots (positions.py)."""
+        positions = [d for d in data if d['event_type'] == "position"]
+        overtakes = [d for d in data if d['event_type'] == "overtake"]
+        events = compact_positions(positions, overtakes)
+        for e in events:
+            e['event_time'] = parser.parse(e['date'])
+        print(f"Compacted {len(positions)} position rows into {len(events)} events")
+        return [d for d in data if d['event_type'] != "position"] + events
+
+    def stream_indexed(self, output_file="events_indexed.json", interval_sec=5, describe=True):
         """
         Aggregate events in fixed time intervals (default 5 seconds) 
-        and write to JSON.
+        and write to JSON (or the binary bucket format for a .evb output_file).
+        With describe=False the driver names and descriptions are left out; consumers
+        render them on demand (scripts/agents/event_records.event_descriptions).
         """
         if not self.data:
             print("No data loaded.")
@@ -55,42 +76,30 @@ class F1RaceSimulator:
         end_time = self.data[-1]['event_time']
         current_time = start_time
 
-        indexed_events = {}
-
+        # Rows stay as loaded; each bucket holds slotted records pointing at them
+        table = self.drivers
+        records = [EventRecord.from_row(row, table) for row in self.data]
+        buckets = []
+        i = 0
         while current_time <= end_time:
             next_time = current_time + timedelta(seconds=interval_sec)
             # Find events in this interval
-            events_in_interval = []
-            while self.data and self.data[0]['event_time'] < next_time:
-                event = self.data.pop(0)
-                driver_name = self.driver_map.get(event.get('driver_number'), "Unknown Driver")
-                event_copy = event.copy()
-                
-                if event['event_type'] == "lap":
-                    event_copy['driver_name'] = driver_name
-                    event_copy['event_description'] = f"Lap event: {driver_name} completed a lap in {event_copy['lap_duration']} seconds"
-                elif event['event_type'] == "position":
-                    event_copy['driver_name'] = driver_name
-                    event_copy['event_description'] = f"Position update: {driver_name} is now P{event['position']}"
-                elif event['event_type'] == "pit_stop":
-                    event_copy['driver_name'] = driver_name
-                    event_copy['event_description'] = f"Pit stop: {driver_name}"
-                elif event['event_type'] == "overtake":
-                    overtaking_driver_name = self.driver_map.get(event.get('overtaking_driver_number'), "Unknown Driver")
-                    overtaken_driver_name = self.driver_map.get(event.get('overtaken_driver_number'), "Unknown Driver")
-                    event_copy['overtaking_driver_name'] = overtaking_driver_name
-                    event_copy['overtaken_driver_name'] = overtaken_driver_name
-                    event_copy['event_description'] = f"Overtake event: {overtaking_driver_name} overtook {overtaken_driver_name}"
-                
-                # Remove datetime object before JSON serialization
-                event_copy['event_time'] = event_copy['event_time'].isoformat()
-                events_in_interval.append(event_copy)
-            indexed_events[current_time.isoformat()] = events_in_interval
+            start = i
+            while i < len(records) and records[i].time < next_time:
+                i += 1
+            buckets.append((current_time.isoformat(), records[start:i]))
             current_time = next_time
 
-        # Write to JSON
-        with open(output_file, "w") as f:
-            json.dump(indexed_events, f, indent=2)
+        indexed_events = {key: [r.to_dict(table, describe) for r in bucket] for key, bucket in buckets}
+
+        if output_file.endswith(".evb"):
+            # Compact binary buckets (scripts/agents/event_codec.py)
+            with open(output_file, "wb") as f:
+                write_buckets(indexed_events, f)
+        else:
+            # Write to JSON
+            with open(output_file, "w") as f:
+                json.dump(indexed_events, f, indent=2)
 
         print(f"Events written to {output_file}")
 
@@ -102,7 +111,8 @@ if __name__ == "__main__":
         "position": "data/positions.json",
         "lap": "data/laps.json",
         "pit": "data/pit_stops.json",
-        "overtake": "data/overtakes.json"
+        "overtake": "data/overtakes.json",
+        "interval": "data/intervals.json"
     }
     driver_path = "data/drivers.json"
 
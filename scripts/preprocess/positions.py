@@ -0,0 +1,225 @@
+"""
+Position-feed compaction.
+
+OpenF1 `position` rows come one per driver per update: a single pass is two
+rows, a pit stop a dozen, and each used to become its own "Position update"
+line. `compact_positions` groups rows by timestamp and applies them to a
+running classification held in arrays (position -> driver, driver -> position).
+Each group that actually changes the order becomes one `position_change` event:
+
+    {"event_type": "position_change", "date": ..., "driver_number": 16, "position": 8,
+     "changes": [[16, 9, 8, [22], true]],      # driver, from (0 = unknown), to, passed / passed by, linked
+     "moves": [16, 8, 22, 9]}                  # the raw (driver, position) rows, for exact replay
+
+Only the drivers that moved on their own account are listed: in a pass the
+driver who gained, and in a pit stop the driver who dropped (not the cars that
+each moved up one). A change is `linked` when the overtakes feed has the same
+pass within `link_window` seconds. Linked changes get no description, since the
+overtake event already says it, so prompts carry one line per pass instead of three.
+
+Every `snapshot_every` seconds a `classification` event stores the full order
+(driver numbers from P1, 0 = unknown), and `PositionLog.order_at(t)` rebuilds
+the order at any time from the latest snapshot plus the moves after it.
+
+    python -m scripts.preprocess.positions data/open_f1/positions.json \\
+        --overtakes data/open_f1/overtakes.json --output data/open_f1/position_changes.json
+"""
+import json
+import bisect
+import argparse
+from array import array
+from datetime import datetime
+
+SNAPSHOT_EVERY = 60.0
+LINK_WINDOW = 5.0
+MAX_POSITION = 30
+
+
+def _ts(date: str) -> float:
+    return datetime.fromisoformat(date).timestamp()
+
+
+class Classification:
+    """Running order in two arrays over dense driver slots (position 0 = unknown)."""
+
+    def __init__(self, numbers, max_position: int = MAX_POSITION):
+        self.numbers = sorted(set(numbers))
+        self.slot = {n: i for i, n in enumerate(self.numbers)}
+        self.position = array("h", [0] * len(self.numbers))
+        self.order = array("h", [-1] * (max_position + 1))  # position -> slot
+
+    def set(self, number: int, pos: int) -> int:
+        """Move one driver (same rule as RaceState._on_position); returns the old position."""
+        i = self.slot[number]
+        old = self.position[i]
+        if old and self.order[old] == i:
+            self.order[old] = -1
+        self.position[i] = pos
+        self.order[pos] = i
+        return old
+
+    def snapshot(self) -> list[int]:
+        out = [self.numbers[i] if i >= 0 else 0 for i in self.order[1:]]
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def restore(self, order: list[int]):
+        self.position = array("h", [0] * len(self.numbers))
+        self.order = array("h", [-1] * len(self.order))
+        for pos, number in enumerate(order, start=1):
+            if number:
+                i = self.slot[number]
+                self.position[i] = pos
+                self.order[pos] = i
+
+    def running_order(self) -> list[int]:
+        return [self.numbers[i] for i in self.order[1:] if i >= 0]
+
+
+def _changes(moved: dict) -> list[list]:
+    """
+    [driver, from, to, others] for the drivers that moved on their own account:
+    the side (gainers or losers) with fewer drivers, each with the drivers they
+    crossed. Drivers seen for the first time (from = 0) are listed on their own.
+    """
+    known = {d: (a, b) for d, (a, b) in moved.items() if a}
+    ups = [d for d, (a, b) in known.items() if b < a]
+    downs = [d for d, (a, b) in known.items() if b > a]
+    out = []
+    if ups and (not downs or len(ups) <= len(downs)):
+        for u in ups:
+            a, b = known[u]
+            out.append([u, a, b, [d for d in downs if b <= known[d][0] < a]])
+    else:
+        for d in downs:
+            a, b = known[d]
+            out.append([d, a, b, [u for u in ups if a < known[u][0] <= b]])
+    out += [[d, 0, b, []] for d, (a, b) in moved.items() if not a]
+    return sorted(out, key=lambda c: c[2])
+
+
+class _Overtakes:
+    """Overtakes feed indexed by time for linking."""
+
+    def __init__(self, overtakes: list[dict]):
+        rows = sorted(overtakes, key=lambda o: o["date"])
+        self.times = [_ts(o["date"]) for o in rows]
+        self.rows = rows
+
+    def near(self, t: float, window: float):
+        lo = bisect.bisect_left(self.times, t - window)
+        hi = bisect.bisect_right(self.times, t + window)
+        return self.rows[lo:hi]
+
+    def linked(self, change: list, t: float, window: float) -> bool:
+        driver, frm, to, others = change
+        near = self.near(t, window)
+        pairs = {(o["overtaking_driver_number"], o["overtaken_driver_number"]) for o in near}
+        if not frm:
+            return any(driver in pair for pair in pairs)
+        gained = to < frm
+        if not others:
+            # Crossed only drivers without a known position yet: any pass in the right direction.
+            return any(pair[0 if gained else 1] == driver for pair in pairs)
+        if gained:
+            return all((driver, o) in pairs for o in others)
+        return all((o, driver) in pairs for o in others)
+
+
+def compact_positions(rows: list[dict], overtakes: list[dict] | None = None,
+                      snapshot_every: float = SNAPSHOT_EVERY, link_window: float = LINK_WINDOW) -> list[dict]:
+    """`position_change` and `classification` events (in time order) from raw position rows."""
+    rows = sorted(rows, key=lambda r: r["date"])
+    if not rows:
+        return []
+    cls = Classification((r["driver_number"] for r in rows),
+                         max(MAX_POSITION, max(r["position"] for r in rows)))
+    links = _Overtakes(overtakes or [])
+    common = {k: rows[0][k] for k in ("session_key", "meeting_key") if k in rows[0]}
+    events = []
+    last_snapshot = None
+    i = 0
+    while i < len(rows):
+        date = rows[i]["date"]
+        group = []
+        while i < len(rows) and rows[i]["date"] == date:
+            group.append(rows[i])
+            i += 1
+        moved, moves = {}, []
+        for r in group:
+            old = cls.set(r["driver_number"], r["position"])
+            first = moved.get(r["driver_number"], (old, None))[0]
+            moved[r["driver_number"]] = (first, r["position"])
+            moves += [r["driver_number"], r["position"]]
+        moved = {d: (a, b) for d, (a, b) in moved.items() if a != b}
+        t = _ts(date)
+        if moved:
+            changes = [c + [links.linked(c, t, link_window)] for c in _changes(moved)]
+            events.append({"date": date, **common, "event_type": "position_change",
+                           "driver_number": changes[0][0], "position": changes[0][2],
+                           "changes": changes, "moves": moves})
+        if last_snapshot is None or t - last_snapshot >= snapshot_every:
+            events.append({"date": date, **common, "event_type": "classification", "order": cls.snapshot()})
+            last_snapshot = t
+    return events
+
+
+class PositionLog:
+    """Rebuilds the classification at any time from compacted events."""
+
+    def __init__(self, events: list[dict]):
+        numbers = set()
+        for e in events:
+            numbers.update(e.get("order", ()))
+            numbers.update(e.get("moves", ())[::2])
+        numbers.discard(0)
+        self.max_position = max([MAX_POSITION] + [len(e["order"]) for e in events if "order" in e]
+                                + [p for e in events for p in e.get("moves", ())[1::2]])
+        self.numbers = numbers
+        self.events = sorted(events, key=lambda e: e["date"])
+        self.times = [_ts(e["date"]) for e in self.events]
+        self.snapshots = [k for k, e in enumerate(self.events) if e["event_type"] == "classification"]
+
+    def order_at(self, when) -> list[int]:
+        """Driver numbers in position order after every update up to and including `when` (ISO or epoch s)."""
+        t = _ts(when) if isinstance(when, str) else when
+        end = bisect.bisect_right(self.times, t)
+        cls = Classification(self.numbers, self.max_position)
+        start = 0
+        k = bisect.bisect_right(self.snapshots, end - 1) - 1
+        if k >= 0:
+            snap = self.snapshots[k]
+            cls.restore(self.events[snap]["order"])
+            start = snap + 1
+        for e in self.events[start:end]:
+            moves = e.get("moves", ())
+            for d, p in zip(moves[::2], moves[1::2]):
+                cls.set(d, p)
+        return cls.running_order()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compact the position feed into order changes and snapshots.")
+    ap.add_argument("positions")
+    ap.add_argument("--overtakes")
+    ap.add_argument("--output", default="data/open_f1/position_changes.json")
+    ap.add_argument("--snapshot-every", type=float, default=SNAPSHOT_EVERY)
+    ap.add_argument("--link-window", type=float, default=LINK_WINDOW)
+    args = ap.parse_args()
+
+    with open(args.positions, "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    overtakes = []
+    if args.overtakes:
+        with open(args.overtakes, "r", encoding="utf-8") as f:
+            overtakes = json.load(f)
+    events = compact_positions(rows, overtakes, args.snapshot_every, args.link_window)
+    with open(args.output, "w") as f:
+        json.dump(events, f, indent=2)
+
+    changes = [e for e in events if e["event_type"] == "position_change"]
+    described = sum(1 for e in changes for c in e["changes"] if not c[4])
+    print(f"{len(rows)} position rows -> {len(changes)} order changes "
+          f"({described} described, the rest linked to overtakes) + "
+          f"{len(events) - len(changes)} snapshots -> {args.output}")
@@ -3,6 +3,9 @@ from datetime import datetime
 from dateutil import parser
 import time
 
+# Run from the repository root: python -m scripts.preprocess.stream_events
+from scripts.agents.event_records import DriverTable, KINDS, KIND_OTHER, KIND_LAP
+
 class F1RaceSimulator:
     def __init__(self, data_paths, driver_path, time_scale=1):
         """
@@ -44,6 +47,7 @@ class F1RaceSimulator:
         with open(self.driver_path, "r") as f:
             drivers = json.load(f)
         self.driver_map = {d["driver_number"]: d["full_name"] for d in drivers}
+        self.drivers = DriverTable(drivers)
 
     def load_all_data(self):
         """Load and merge all endpoints into a unified, sorted timeline"""
@@ -54,21 +58,17 @@ class F1RaceSimulator:
 
     def stream(self):
         """Simulate the race events in chronological order"""
+        table = self.drivers
         for i in range(len(self.data)):
             event = self.data[i]
-            driver_name = self.driver_map.get(event.get('driver_number'), "Unknown Driver")
-            
+            kind = KINDS.get(event['event_type'], KIND_OTHER)
+
             # Display event
-            if event['event_type'] == "lap":
-                print(f"Lap event: {driver_name} completed a lap at {event['event_time']}")
-            elif event['event_type'] == "position":
-                print(f"Position update: {driver_name} is now P{event['position']} at {event['event_time']}")
-            elif event['event_type'] == "pit_stop":
-                print(f"Pit stop: {driver_name} at {event['event_time']}")
-            elif event['event_type'] == "overtake":
-                overtaking_driver_name = self.driver_map.get(event.get('overtaking_driver_number'), "Unknown Driver")
-                overtaken_driver_name = self.driver_map.get(event.get('overtaken_driver_number'), "Unknown Driver")
-                print(f"Overtake event: {overtaking_driver_name} overtook {overtaken_driver_name} at {event['event_time']}")
+            if kind == KIND_LAP:
+                print(f"Lap event: {table.name(event.get('driver_number'))} completed a lap at {event['event_time']}")
+            elif kind != KIND_OTHER:
+                # Position, pit and overtake lines share the bucket descriptions
+                print(f"{table.describe(event)} at {event['event_time']}")
             
             # Compute wait time until next event
             if i < len(self.data) - 1:
@@ -83,7 +83,8 @@ if __name__ == "__main__":
         "position": "data/positions.json",
         "lap": "data/laps.json",
         "pit": "data/pit_stops.json",
-        "overtake": "data/overtakes.json"
+        "overtake": "data/overtakes.json",
+        "interval": "data/intervals.json"
     }
     driver_path = "data/drivers.json"
 
@@ -1,5 +1,10 @@
 import os
+import json
+import bisect
+import argparse
 import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 def split_video_ffmpeg(video_path, output_dir="clips", clip_duration=5):
     """
@@ -35,6 +40,133 @@ def split_video_ffmpeg(video_path, output_dir="clips", clip_duration=5):
     print(f"✅ Done! Clips saved in '{output_dir}'.")
 
 
+def probe_duration(video_path):
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", video_path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return float(out.strip())
+
+
+def probe_keyframes(video_path):
+    """Keyframe timestamps (seconds) of the first video stream; only keyframes are decoded."""
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+         "-show_entries", "frame=pts_time", "-of", "csv=p=0", video_path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return sorted(float(line.split(",")[0]) for line in out.split() if line.strip())
+
+
+def plan_clips(bucket_keys, video_start, duration, clip_duration=5, keyframes=None):
+    """
+    One clip per event bucket that falls inside the video.
+
+    Args:
+        bucket_keys (list[str]): ISO timestamps keying events_5s_indexed.json
+        video_start (datetime): wall-clock time of the first video frame
+        duration (float): video length in seconds
+        keyframes (list[float]): if given, each clip also gets the last keyframe at
+            or before its start as `seek`, so it can be cut without re-encoding
+
+    Returns:
+        list[dict]: {"index", "bucket", "start", "end", "seek"} in video seconds
+    """
+    clips = []
+    for index, key in enumerate(bucket_keys):
+        start = (datetime.fromisoformat(key) - video_start).total_seconds()
+        if start < 0 or start >= duration:
+            continue
+        seek = start
+        if keyframes:
+            i = bisect.bisect_right(keyframes, start) - 1
+            seek = keyframes[i] if i >= 0 else 0.0
+        clips.append({"index": index, "bucket": key, "start": start,
+                      "end": min(start + clip_duration, duration), "seek": seek})
+    return clips
+
+
+def extract_clip(video_path, clip, output_path, reencode=False):
+    """
+    Cut one clip with an input-side seek, so each ffmpeg only reads its own part of the file.
+
+    Stream copy starts at the keyframe in clip["seek"] (a little before the bucket,
+    since copied segments can only start on a keyframe); re-encoding starts
+    exactly at clip["start"].
+    """
+    if reencode:
+        codec = ["-ss", f"{clip['start']:.3f}", "-i", video_path, "-t", f"{clip['end'] - clip['start']:.3f}",
+                 "-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-an"]
+    else:
+        codec = ["-ss", f"{clip['seek']:.3f}", "-i", video_path, "-t", f"{clip['end'] - clip['seek']:.3f}",
+                 "-c", "copy", "-map", "0", "-avoid_negative_ts", "make_zero"]
+    tmp = output_path + ".part.mp4"
+    subprocess.run(["ffmpeg", "-v", "error", "-y", *codec, tmp], check=True)
+    os.replace(tmp, output_path)
+    return output_path
+
+
+def clip_source(video_path, clip, reencode=False):
+    """What a clip file was cut from: the video (path, size, mtime) and the cut itself."""
+    st = os.stat(video_path)
+    return {"video": os.path.abspath(video_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "start": clip["start"], "end": clip["end"], "seek": clip["seek"], "reencode": reencode}
+
+
+def _read_source(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def split_video_buckets(video_path, bucket_keys, video_start, output_dir="clips", clip_duration=5,
+                        workers=4, reencode=False):
+    """
+    Extract one clip per event bucket, `workers` ffmpeg processes at a time.
+    Each clip has a sidecar (clip_00000.json) recording its clip_source; a clip whose
+    sidecar matches is kept, so an interrupted run resumes, and any other clip in
+    `output_dir` (another video, start or cut mode) is extracted again.
+
+    Returns:
+        list[dict]: the planned clips, each with its "path"
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    keyframes = None if reencode else probe_keyframes(video_path)
+    clips = plan_clips(bucket_keys, video_start, probe_duration(video_path), clip_duration, keyframes)
+
+    def run(clip):
+        clip["path"] = os.path.join(output_dir, f"clip_{clip['index']:05d}.mp4")
+        sidecar = os.path.join(output_dir, f"clip_{clip['index']:05d}.json")
+        source = clip_source(video_path, clip, reencode)
+        if not os.path.exists(clip["path"]) or _read_source(sidecar) != source:
+            extract_clip(video_path, clip, clip["path"], reencode)
+            with open(sidecar + ".tmp", "w") as f:
+                json.dump(source, f)
+            os.replace(sidecar + ".tmp", sidecar)
+        return clip
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        clips = list(pool.map(run, clips))
+    print(f"✅ {len(clips)} clips saved in '{output_dir}'.")
+    return clips
+
+
 if __name__ == "__main__":
-    video_path = "/Users/naveent/Desktop/singapore_race_without_audio.mp4"
-    split_video_ffmpeg(video_path)
+    ap = argparse.ArgumentParser(description="Split a race video into clips.")
+    ap.add_argument("video_path")
+    ap.add_argument("--output-dir", default="clips")
+    ap.add_argument("--events", help="events_5s_indexed.json: cut one clip per bucket, in parallel")
+    ap.add_argument("--video-start", help="ISO time of the first frame (default: first bucket)")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--reencode", action="store_true", help="frame-accurate cuts instead of keyframe-aligned copies")
+    args = ap.parse_args()
+
+    if args.events:
+        with open(args.events, "r", encoding="utf-8") as f:
+            keys = list(json.load(f))
+        start = datetime.fromisoformat(args.video_start or keys[0])
+        split_video_buckets(args.video_path, keys, start, args.output_dir, workers=args.workers, reencode=args.reencode)
+    else:
+        split_video_ffmpeg(args.video_path, args.output_dir)
@@ -0,0 +1,125 @@
+"""
+Cheap local pre-filter deciding which clips are worth sending to the video model.
+
+Most 5 s clips of a race are near-identical onboard or tracking shots. Each
+clip is decoded at a low frame rate into tiny grayscale frames (ffmpeg does
+the decoding and scaling), and every frame gets two signatures:
+  - a 16-bin intensity histogram, compared by L1 distance (0..1), and
+  - a 64-bit difference hash (dHash), compared by Hamming distance (0..64).
+
+A clip is forwarded when
+  - scene_change: it differs from the last *forwarded* clip (a camera cut,
+    replay or new car in shot), or
+  - motion: frames within it change sharply (a crash, spin or close battle), or
+  - heartbeat: `max_gap` clips went by without forwarding anything.
+
+Instead of the whole clip, `keyframe_times` picks the few frames where the
+picture changes most, so a request can carry a handful of JPEGs.
+
+    python -m scripts.analyse_video race.mp4 --filter --keyframes 3
+"""
+import subprocess
+
+import numpy as np
+
+FPS = 2
+# 36x16 frames: area-averaged down to 9x8 for the dHash.
+WIDTH, HEIGHT = 36, 16
+HIST_BINS = 16
+
+
+def decode_frames(path, fps=FPS, width=WIDTH, height=HEIGHT):
+    """Grayscale frames as a (n, height, width) uint8 array, sampled at `fps`."""
+    out = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path, "-vf", f"fps={fps},scale={width}:{height},format=gray",
+         "-f", "rawvideo", "-"],
+        check=True, capture_output=True,
+    ).stdout
+    return np.frombuffer(out, dtype=np.uint8).reshape(-1, height, width)
+
+
+def frame_signatures(frames):
+    """{"hist": (n, HIST_BINS) float32 summing to 1, "hash": (n, 64) bool} for (n, 16, 36) frames."""
+    n = len(frames)
+    if n == 0:
+        # Nothing decoded (empty or unreadable clip): select_clips never forwards it.
+        return {"hist": np.zeros((0, HIST_BINS), dtype=np.float32), "hash": np.zeros((0, 64), dtype=bool)}
+    flat = frames.reshape(n, -1)
+    bins = (flat >> 4).astype(np.int64) + HIST_BINS * np.arange(n)[:, None]  # 256 levels -> 16 bins per frame
+    hist = np.bincount(bins.ravel(), minlength=n * HIST_BINS).reshape(n, HIST_BINS).astype(np.float32)
+    hist /= flat.shape[1]
+    small = frames.reshape(n, 8, HEIGHT // 8, 9, WIDTH // 9).mean(axis=(2, 4))
+    dhash = (small[:, :, 1:] > small[:, :, :-1]).reshape(n, 64)
+    return {"hist": hist, "hash": dhash}
+
+
+def clip_signature(path, fps=FPS):
+    return frame_signatures(decode_frames(path, fps))
+
+
+def _hist_distance(a, b):
+    return 0.5 * float(np.abs(a - b).sum())
+
+
+def _frame_changes(sig):
+    """Per-step change between consecutive frames, combining both signatures on a 0..1 scale."""
+    if len(sig["hist"]) < 2:
+        return np.zeros(0, dtype=np.float32)
+    hist = 0.5 * np.abs(np.diff(sig["hist"], axis=0)).sum(axis=1)
+    bits = (sig["hash"][1:] != sig["hash"][:-1]).sum(axis=1) / 64
+    return np.maximum(hist, bits)
+
+
+def select_clips(signatures, scene_threshold=0.25, motion_threshold=0.3, max_gap=12):
+    """
+    Decide which clips to forward, in clip order.
+
+    Returns:
+        list[dict]: per clip {"forward": bool, "reason": str | None, "scene": float, "motion": float}
+    """
+    decisions, last, gap = [], None, 0
+    for sig in signatures:
+        if not len(sig["hist"]):
+            decisions.append({"forward": False, "reason": None, "scene": 0.0, "motion": 0.0})
+            continue
+        mean_hist = sig["hist"].mean(axis=0)
+        if last is None:
+            scene = 1.0
+        else:
+            bits = float((sig["hash"][0] != last["hash"]).mean())
+            scene = max(_hist_distance(mean_hist, last["hist"]), bits)
+        changes = _frame_changes(sig)
+        motion = float(changes.max()) if len(changes) else 0.0
+
+        reason = ("scene_change" if scene >= scene_threshold else
+                  "motion" if motion >= motion_threshold else
+                  "heartbeat" if gap + 1 >= max_gap else None)
+        decisions.append({"forward": reason is not None, "reason": reason, "scene": scene, "motion": motion})
+        if reason:
+            last, gap = {"hist": mean_hist, "hash": sig["hash"][-1]}, 0
+        else:
+            gap += 1
+    return decisions
+
+
+def keyframe_times(sig, count=3, fps=FPS):
+    """Timestamps (s) of the first frame plus the `count - 1` frames that change most."""
+    changes = _frame_changes(sig)
+    picks = {0}
+    for i in np.argsort(-changes, kind="stable"):
+        if len(picks) >= min(count, len(sig["hist"])):
+            break
+        picks.add(int(i) + 1)
+    return [i / fps for i in sorted(picks)]
+
+
+def extract_jpegs(path, times, width=640):
+    """JPEG bytes of the frames at `times` seconds, scaled to `width`."""
+    frames = []
+    for t in times:
+        frames.append(subprocess.run(
+            ["ffmpeg", "-v", "error", "-ss", f"{t:.3f}", "-i", path, "-frames:v", "1",
+             "-vf", f"scale={width}:-2", "-f", "image2pipe", "-vcodec", "mjpeg", "-q:v", "5", "-"],
+            check=True, capture_output=True,
+        ).stdout)
+    return frames
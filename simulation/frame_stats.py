@@ -0,0 +1,56 @@
+import sys
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class FrameStats:
+    """Rolling frame-interval and draw-time statistics for the visualiser."""
+
+    def __init__(self, window: int = 600):
+        self.intervals = deque(maxlen=window)
+        self.draw_times = deque(maxlen=window)
+        self._last_frame = None
+        self._draw_start = None
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self.intervals.append(now - self._last_frame)
+        self._last_frame = now
+        self._draw_start = now
+
+    def end_frame(self):
+        self.draw_times.append(time.perf_counter() - self._draw_start)
+
+    def summary(self) -> dict:
+        if not self.intervals:
+            return {}
+        intervals = sorted(self.intervals)
+        mean = sum(intervals) / len(intervals)
+        return {
+            "fps": 1 / mean if mean else 0.0,
+            "frame_ms_mean": mean * 1e3,
+            "frame_ms_p99": intervals[min(len(intervals) - 1, int(len(intervals) * 0.99))] * 1e3,
+            "draw_ms_mean": sum(self.draw_times) / len(self.draw_times) * 1e3,
+            "max_rss_mb": max_rss_mb(),
+        }
+
+    def format(self) -> str:
+        s = self.summary()
+        if not s:
+            return ""
+        return (f"{s['fps']:.0f} FPS  frame {s['frame_ms_mean']:.2f} ms (p99 {s['frame_ms_p99']:.2f})  "
+                f"draw {s['draw_ms_mean']:.2f} ms  rss {s['max_rss_mb']:.0f} MB")
+
+
+def max_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return rss / 1e6 if sys.platform == "darwin" else rss / 1e3
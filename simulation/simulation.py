@@ -3,12 +3,25 @@ import json
 from datetime import datetime
 from pyglet import shapes, text
 from pyglet.gl import glClearColor
+from pyglet.window import key
+
+from positions import PositionEngine, Playback
+from frame_stats import FrameStats
+from track_model import load_or_build_track_model
+
+# Target render rate; vsync off so a 60 Hz display doesn't cap it
+FRAME_RATE = 120
 
 # Create application window with the given width and height
-window = pyglet.window.Window(1400, 800)
+WINDOW_WIDTH, WINDOW_HEIGHT = 1400, 800
+window = pyglet.window.Window(WINDOW_WIDTH, WINDOW_HEIGHT, vsync=False)
 
-# Create a batch group for optimized rendering
+# Create a batch group for optimized rendering. Everything is created once and
+# drawn retained-mode; groups keep the track under the cars under the labels.
 batch = pyglet.graphics.Batch()
+track_group = pyglet.graphics.Group(order=0)
+car_group = pyglet.graphics.Group(order=1)
+label_group = pyglet.graphics.Group(order=2)
 
 # Set background colour
 glClearColor(255, 255, 255, 1)
@@ -42,73 +55,98 @@ for ld in locations_data:
 # Sort location data by time, and then driver
 locations_data.sort(key=lambda x: (x["time"], x["driver_number"]))
 
-# Sample points along the track for rendering
-track_location_data = [x for x in locations_data if x["driver_number"] == 1][:800][::4]
-
 # Determine starting index for the simulation
 starting_index = 17500
 
-# Resize and position the race within the application window
-alpha = 0.08
-initial_x = locations_data[starting_index]["x"] * alpha
-initial_y = locations_data[starting_index]["y"] * alpha
-for ld in locations_data:
-    # Rescale x and y coordinates
-    ld["x"] = ld["x"] * alpha
-    ld["y"] = ld["y"] * alpha
+# Track centreline and spatial index, cached per circuit
+with open('../data/open_f1/meetings.json', 'r') as file:
+    circuit = json.load(file)[0]["circuit_short_name"]
+track = load_or_build_track_model(locations_data, circuit)
 
-    # Add translational offset
-    ld["x"] -= initial_x
-    ld["y"] -= initial_y
+# Vectorised per-driver position engine, scaled to fit the window
+engine = PositionEngine.from_locations(locations_data)
+scale, offset_x, offset_y = track.fit(WINDOW_WIDTH, WINDOW_HEIGHT)
+engine.transform(scale, offset_x, offset_y)
 
-    ld["x"] += 1250
-    ld["y"] += 475
+# Sample points along the track for rendering
+track_location_data = [{"x": x * scale + offset_x, "y": y * scale + offset_y} for x, y in track.outline(200)]
+track_location_data.append(track_location_data[0])
 
 # Set up the initial state for the simulation
 class SimulationState:
-    def __init__(self, drivers, start_time):
-        self.time = start_time
-        self.location_index = 0
+    def __init__(self, drivers, start_time, speed=2.5):
+        self.playback = Playback(engine.t_min, engine.t_max, start=start_time, speed=speed)
         self.drivers = drivers
+        # Rows of engine.positions_at() in driver order
+        self.driver_rows = [(engine.index[n], drivers[n]) for n in engine.driver_numbers if n in drivers]
+
+    @property
+    def time(self):
+        return self.playback.time
 
 start_time = datetime.timestamp(datetime.fromisoformat(locations_data[starting_index]["date"]))
 state = SimulationState(drivers, start_time)
 
+# Static track geometry, built once
+track_joints = tuple(shapes.Circle(x=track_point["x"], y=track_point["y"], radius=4, color=(0,0,0), batch=batch, group=track_group) for track_point in track_location_data)
+
+track_lines = tuple(shapes.Line(x=track_location_data[i]["x"], y=track_location_data[i]["y"], x2=track_location_data[i+1]["x"], y2=track_location_data[i+1]["y"], thickness=7, color=(0,0,0), batch=batch, group=track_group) for i in range(len(track_location_data)-1))
+
+# Persistent driver icons and labels, moved in place every frame
+for _, driver in drivers.items():
+    driver["icon"] = shapes.Circle(x=driver["x"], y=driver["y"], radius=24, color=driver["team_colour_rgb"], batch=batch, group=car_group)
+    driver["label"] = text.Label(driver["name_acronym"], x=driver["x"], y=driver["y"], anchor_x="center", anchor_y="center", batch=batch, group=label_group)
+
+# Frame-time stats, shown on screen and printed periodically
+stats = FrameStats(window=FRAME_RATE * 5)
+stats_label = text.Label("", x=10, y=10, font_size=10, color=(0,0,0,255), batch=batch, group=label_group)
+
 ## Functions which are ran periodically to create the simulation
 def update(dt):
-    # Increment elapsed time
-    time_acceleration = 2.5
-    state.time += time_acceleration * dt
-
-    # "Catch up" on passed events by updating driver positions
-    while locations_data[state.location_index]["time"] < state.time:
-        ld = locations_data[state.location_index]
-        driver = state.drivers[ld["driver_number"]]
-        driver["x"] = ld["x"]
-        driver["y"] = ld["y"]
-        state.location_index += 1
+    # Advance the replay clock (speed may be negative when rewinding)
+    state.playback.advance(dt)
+
+    # Interpolate every driver's position for this frame in one pass
+    positions = engine.positions_at(state.time)
+    for row, driver in state.driver_rows:
+        x, y = float(positions[row, 0]), float(positions[row, 1])
+        driver["x"] = x
+        driver["y"] = y
+        driver["icon"].position = (x, y)
+        driver["label"].position = (x, y, 0)
+
+def report_stats(dt):
+    summary = stats.format()
+    stats_label.text = summary
+    print(summary)
+
+@window.event
+def on_key_press(symbol, modifiers):
+    # Playback controls: arrows seek / change speed, R reverses, space pauses
+    playback = state.playback
+    if symbol == key.RIGHT:
+        playback.skip(10)
+    elif symbol == key.LEFT:
+        playback.skip(-10)
+    elif symbol == key.UP:
+        playback.speed *= 2
+    elif symbol == key.DOWN:
+        playback.speed /= 2
+    elif symbol == key.R:
+        playback.speed = -playback.speed
+    elif symbol == key.SPACE:
+        playback.paused = not playback.paused
 
 @window.event
 def on_draw():
-    # Clear background
+    stats.begin_frame()
     window.clear()
-
-    # Draw track and Formula 1 logo
-    track_joints = tuple(shapes.Circle(x=track_point["x"], y=track_point["y"], radius=4, color=(0,0,0), batch=batch) for track_point in track_location_data)
-
-    track_lines = tuple(shapes.Line(x=track_location_data[i]["x"], y=track_location_data[i]["y"], x2=track_location_data[i+1]["x"], y2=track_location_data[i+1]["y"], thickness=7, color=(0,0,0), batch=batch) for i in range(len(track_location_data)-1))
-
     batch.draw()
-
-    # Draw drivers
-    for index, driver in state.drivers.items():
-        driver_icon = shapes.Circle(x=driver["x"], y=driver["y"], radius=24, color=driver["team_colour_rgb"])
-        driver_name = text.Label(driver["name_acronym"], x=driver["x"], y=driver["y"], anchor_x="center", anchor_y="center")
-        driver_icon.draw()
-        driver_name.draw()
+    stats.end_frame()
 
 # Schedule periodic updating of racer locations
-pyglet.clock.schedule_interval(update, 1/120)
+pyglet.clock.schedule_interval(update, 1/FRAME_RATE)
+pyglet.clock.schedule_interval(report_stats, 5)
 
 # Load Formula 1 logo
 f1_logo = pyglet.image.load("formula-1-logo-0.png")
@@ -121,6 +159,6 @@ commentary.play()
 
 # Start the application
 try:
-    pyglet.app.run()
+    pyglet.app.run(1/FRAME_RATE)
 except KeyboardInterrupt:
     print()
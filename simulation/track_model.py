@@ -0,0 +1,203 @@
+import os
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "track_models")
+
+
+class TrackModel:
+    """
+    Closed track centreline with cumulative arc length and a uniform-grid
+    spatial index over its segments.
+
+    `project(x, y)` maps any point to its distance along the lap by checking
+    only the segments in the surrounding grid cells, so lookups don't scan
+    the whole centreline.
+    """
+
+    def __init__(self, points: np.ndarray, cell_size: float | None = None):
+        self.points = np.asarray(points, dtype=np.float64)
+        nxt = np.roll(self.points, -1, axis=0)
+        self._seg_vec = nxt - self.points
+        self._seg_len = np.hypot(self._seg_vec[:, 0], self._seg_vec[:, 1])
+        self.s = np.concatenate(([0.0], np.cumsum(self._seg_len)[:-1]))
+        self.length = float(self._seg_len.sum())
+        self.cell_size = cell_size or float(np.median(self._seg_len)) * 4
+        self._build_grid()
+
+    # --------------------- Spatial index ---------------------
+    def _cell(self, x, y):
+        return (int(np.floor((x - self._origin[0]) / self.cell_size)),
+                int(np.floor((y - self._origin[1]) / self.cell_size)))
+
+    def _build_grid(self):
+        self._origin = self.points.min(axis=0)
+        self._grid: dict[tuple[int, int], list[int]] = {}
+        nxt = np.roll(self.points, -1, axis=0)
+        lo = np.minimum(self.points, nxt)
+        hi = np.maximum(self.points, nxt)
+        for i in range(len(self.points)):
+            cx0, cy0 = self._cell(*lo[i])
+            cx1, cy1 = self._cell(*hi[i])
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    self._grid.setdefault((cx, cy), []).append(i)
+        cells = np.array(list(self._grid))
+        # Beyond this many rings a brute-force scan is cheaper than the grid.
+        self._ring_limit = int(cells.max()) + 1
+
+    def _ring(self, cx: int, cy: int, r: int) -> list[int]:
+        if r == 0:
+            return list(self._grid.get((cx, cy), ()))
+        segs = []
+        for d in range(-r, r + 1):
+            for cell in ((cx + d, cy - r), (cx + d, cy + r)):
+                segs.extend(self._grid.get(cell, ()))
+        for d in range(-r + 1, r):
+            for cell in ((cx - r, cy + d), (cx + r, cy + d)):
+                segs.extend(self._grid.get(cell, ()))
+        return segs
+
+    def _nearest(self, x: float, y: float, idx: np.ndarray):
+        a = self.points[idx]
+        v = self._seg_vec[idx]
+        l2 = np.maximum(self._seg_len[idx] ** 2, 1e-12)
+        t = np.clip(((x - a[:, 0]) * v[:, 0] + (y - a[:, 1]) * v[:, 1]) / l2, 0.0, 1.0)
+        d = np.hypot(a[:, 0] + t * v[:, 0] - x, a[:, 1] + t * v[:, 1] - y)
+        k = int(np.argmin(d))
+        return float(self.s[idx[k]] + t[k] * self._seg_len[idx[k]]), float(d[k])
+
+    def project(self, x: float, y: float) -> tuple[float, float]:
+        """Return (distance along the lap, distance from the centreline) for a point."""
+        cx, cy = self._cell(x, y)
+        segs, r = [], 0
+        while not segs:
+            if r > self._ring_limit:
+                return self._nearest(x, y, np.arange(len(self.points)))
+            segs.extend(self._ring(cx, cy, r))
+            r += 1
+        best = self._nearest(x, y, np.unique(segs))
+        # A closer segment can sit in a cell up to `best distance` further out.
+        reach = int(np.ceil(best[1] / self.cell_size))
+        if reach >= r:
+            for extra in range(r, reach + 1):
+                segs.extend(self._ring(cx, cy, extra))
+            best = self._nearest(x, y, np.unique(segs))
+        return best
+
+    def project_many(self, xy: np.ndarray) -> np.ndarray:
+        """Distance along the lap for an (n, 2) array of points."""
+        return np.array([self.project(x, y)[0] for x, y in np.asarray(xy)], dtype=np.float64)
+
+    def gap(self, s_ahead: float, s_behind: float) -> float:
+        """Along-track distance from `s_behind` forward to `s_ahead`, wrapping at the line."""
+        return (s_ahead - s_behind) % self.length
+
+    # --------------------- Window fitting ---------------------
+    def fit(self, width: float, height: float, margin: float = 40.0) -> tuple[float, float, float]:
+        """Scale and offset (scale, dx, dy) that fit the track inside a width x height window."""
+        lo = self.points.min(axis=0)
+        hi = self.points.max(axis=0)
+        extent = np.maximum(hi - lo, 1e-9)
+        scale = float(min((width - 2 * margin) / extent[0], (height - 2 * margin) / extent[1]))
+        centre = (lo + hi) / 2
+        return scale, float(width / 2 - centre[0] * scale), float(height / 2 - centre[1] * scale)
+
+    def outline(self, n: int = 200) -> np.ndarray:
+        """About `n` evenly spaced centreline points for drawing."""
+        step = max(1, len(self.points) // n)
+        return self.points[::step]
+
+    # --------------------- Persistence ---------------------
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(path, points=self.points, cell_size=self.cell_size)
+
+    @classmethod
+    def load(cls, path: str) -> "TrackModel":
+        with np.load(path) as data:
+            return cls(data["points"], float(data["cell_size"]))
+
+
+def _resample(points: np.ndarray, n: int) -> np.ndarray:
+    """Resample a closed polyline to n points evenly spaced by arc length."""
+    closed = np.vstack([points, points[:1]])
+    seg = np.hypot(*np.diff(closed, axis=0).T)
+    s = np.concatenate(([0.0], np.cumsum(seg)))
+    target = np.linspace(0.0, s[-1], n, endpoint=False)
+    return np.column_stack([np.interp(target, s, closed[:, 0]), np.interp(target, s, closed[:, 1])])
+
+
+def _smooth(points: np.ndarray, window: int) -> np.ndarray:
+    """Circular moving average."""
+    if window <= 1:
+        return points
+    kernel = np.ones(window) / window
+    pad = window // 2
+    wrapped = np.vstack([points[-pad:], points, points[:pad]])
+    return np.column_stack([np.convolve(wrapped[:, i], kernel, mode="valid")[:len(points)] for i in range(2)])
+
+
+def _reference_lap(xy: np.ndarray) -> np.ndarray:
+    """First closed lap in one driver's samples (time-ordered)."""
+    steps = np.hypot(*np.diff(xy, axis=0).T)
+    travelled = np.concatenate(([0.0], np.cumsum(steps)))
+    extent = xy.max(axis=0) - xy.min(axis=0)
+    # A lap is at least twice the longer side of its bounding box.
+    min_lap = 2 * float(extent.max())
+    tol = 3 * float(np.percentile(steps[steps > 0], 95)) if (steps > 0).any() else 1.0
+    dist_to_start = np.hypot(*(xy - xy[0]).T)
+    closing = np.nonzero((travelled > min_lap) & (dist_to_start < tol))[0]
+    if len(closing) == 0:
+        return xy
+    return xy[:closing[0]]
+
+
+def build_track_model(locations_data, n_points: int = 1000, smooth_window: int = 7,
+                      refine_iterations: int = 2) -> TrackModel:
+    """
+    Derive a smoothed centreline from every driver's location samples.
+
+    One closed lap from the best-sampled driver seeds the shape. Each refinement
+    pass snaps every sample from every driver to its nearest centreline point and
+    moves that point to the mean of its nearby samples, then smooths the loop.
+    """
+    per_driver = {}
+    for ld in locations_data:
+        if ld["x"] == 0 and ld["y"] == 0:
+            continue  # car not on track yet
+        per_driver.setdefault(ld["driver_number"], []).append((ld["time"], ld["x"], ld["y"]))
+    if not per_driver:
+        raise ValueError("No location samples to build a track from")
+
+    samples = {n: np.array(sorted(v), dtype=np.float64)[:, 1:] for n, v in per_driver.items()}
+    seed = max(samples.values(), key=len)
+    centre = _smooth(_resample(_reference_lap(seed), n_points), smooth_window)
+
+    all_xy = np.vstack(list(samples.values()))
+    for _ in range(refine_iterations):
+        spacing = float(np.median(np.hypot(*np.diff(centre, axis=0).T)))
+        radius2 = (4 * spacing) ** 2
+        sums = np.zeros_like(centre)
+        counts = np.zeros(len(centre))
+        for chunk in np.array_split(all_xy, max(1, len(all_xy) // 2000)):
+            d2 = ((chunk[:, None, :] - centre[None, :, :]) ** 2).sum(axis=2)
+            nearest = d2.argmin(axis=1)
+            near = d2[np.arange(len(chunk)), nearest] < radius2
+            np.add.at(sums, nearest[near], chunk[near])
+            np.add.at(counts, nearest[near], 1)
+        hit = counts > 0
+        centre[hit] = sums[hit] / counts[hit, None]
+        centre = _smooth(_resample(centre, n_points), smooth_window)
+
+    return TrackModel(centre)
+
+
+def load_or_build_track_model(locations_data, circuit: str, cache_dir: str = CACHE_DIR,
+                              rebuild: bool = False, **build_kwargs) -> TrackModel:
+    """Load the cached model for `circuit`, building and caching it on a miss."""
+    path = os.path.join(cache_dir, f"{circuit}.npz")
+    if not rebuild and os.path.exists(path):
+        return TrackModel.load(path)
+    model = build_track_model(locations_data, **build_kwargs)
+    model.save(path)
+    return model